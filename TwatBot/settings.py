@@ -25,6 +25,8 @@ TWITTER_API_KEY = ls.TWITTER_API_KEY or ''
 TWITTER_API_SECRET = ls.TWITTER_API_SECRET or ''
 TWITTER_ACCESS_TOKEN = ls.TWITTER_ACCESS_TOKEN or ''
 TWITTER_ACCESS_TOKEN_SECRET = ls.TWITTER_ACCESS_TOKEN_SECRET or ''
+# Use in-memory fake Twitter client instead of the real one, see tweets.web.twitter.
+TWITTER_FAKE = False
 
 FLICKR_API_KEY = ls.FLICKR_API_KEY
 FLICKR_API_SECRET = ls.FLICKR_API_SECRET
@@ -32,11 +34,8 @@ FLICKR_API_SECRET = ls.FLICKR_API_SECRET
 UCLASSIFY_API_READ = ls.UCLASSIFY_API_READ or ''
 UCLASSIFY_API_WRITE = ls.UCLASSIFY_API_WRITE or ''
 
+# Word2Vec model is loaded on first use, see tweets.registry.
 WORD2VEC_MODEL_PATH = '/Users/pihatonttu/nltk_data/gensim/googlenews_gensim_v2w.model'
-WORD2VEC_MODEL = None
-if len(WORD2VEC_MODEL_PATH) > 0:
-    import gensim
-    WORD2VEC_MODEL = gensim.models.Word2Vec.load(WORD2VEC_MODEL_PATH)
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
@@ -48,6 +47,57 @@ ALLOWED_HOSTS = []
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
+# Directory for precomputed tables and caches created by the app.
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+
+# Precomputed rgb -> Lab lookup table, created with 'manage.py build_lab_table'.
+# Colors are converted on demand if the table does not exist.
+LAB_TABLE_PATH = os.path.join(CACHE_DIR, 'rgb2lab.npy')
+
+# Memory-mapped Word2Vec vectors (without file suffixes), exported from 
+# WORD2VEC_MODEL_PATH with 'manage.py export_word2vec'. The gensim model is 
+# loaded instead if the vectors have not been exported.
+WORD2VEC_VECTORS_PATH = os.path.join(CACHE_DIR, 'word2vec')
+
+# Cache for Thesaurus Rex responses. Failed queries are cached for 
+# THEREX_NEGATIVE_TTL seconds.
+THEREX_CACHE_PATH = os.path.join(CACHE_DIR, 'therex.sqlite')
+THEREX_CACHE_TTL = 30 * 24 * 3600
+THEREX_NEGATIVE_TTL = 3600
+
+# Cache for uClassify classifications, keyed by text hash and classifier.
+UCLASSIFY_CACHE_PATH = os.path.join(CACHE_DIR, 'uclassify.sqlite')
+UCLASSIFY_CACHE_TTL = 90 * 24 * 3600
+
+# Maximum amount of cached WordNet lookups (tweets.wordnet). If 
+# WORDNET_PRECOMPUTE_COLORS is True, all color synsets are collected when 
+# WordNet is first used, which makes checking whether words are colors faster.
+WORDNET_CACHE_SIZE = 8192
+WORDNET_PRECOMPUTE_COLORS = True
+
+# Slot words' synsets for new age wisdoms, created with 'manage.py 
+# build_wisdom_pool'. The pool is built on demand if the file does not exist.
+WISDOM_POOL_PATH = os.path.join(CACHE_DIR, 'wisdom_pool.pkl')
+
+# Cache for RSS feeds' entries. Entries older than RSS_FEED_MAX_AGE seconds are 
+# refreshed when read, tweets.cron.RSSFeedRefresher refreshes them more often.
+RSS_CACHE_PATH = os.path.join(CACHE_DIR, 'rss.sqlite')
+RSS_CACHE_TTL = 7 * 24 * 3600
+RSS_FEED_MAX_AGE = 60 * 60
+
+# Amount of candidate tweets tweets.cron.NewAgeTweeter builds before publishing
+# the best one, and the amount of processes building them (None = CPU count).
+TWEET_CANDIDATES = 20
+TWEET_WORKERS = None
+
+# Seconds between the queries for tweets saved by other processes into the
+# tweeted color names index (tweets.memory.TweetedNames), seconds between
+# reloading all the names, and the capacity of the Bloom filter storing the 
+# names (None = store the names in a set).
+TWEETED_NAMES_REFRESH_INTERVAL = 60
+TWEETED_NAMES_RELOAD_INTERVAL = 24 * 3600
+TWEETED_NAMES_BLOOM_CAPACITY = None
+
 TEMPLATE_LOADERS = (
     'django.template.loaders.filesystem.Loader',
     'django.template.loaders.app_directories.Loader',
@@ -131,7 +181,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static/')
 CRON_CLASSES = [
     "tweets.cron.TwitterAccountListener",
     "tweets.cron.NewAgeTweeter",
-    "tweets.cron.HomeTimelineCleaner"
+    "tweets.cron.HomeTimelineCleaner",
+    "tweets.cron.RSSFeedRefresher"
 ]
 
 ORIGINAL_IMAGE_UPLOAD_PATH = os.path.join('images', 'original')
@@ -13,7 +13,11 @@ import os
 import operator
 import random
 import re
+import time
+import hashlib
 import logging
+import tempfile
+import cPickle as pickle
 from collections import OrderedDict
 
 from tweets.utils import color as cu
@@ -21,13 +25,22 @@ from tweets.utils import color as cu
 if 'DJANGO_SETTINGS_MODULE' not in os.environ:
     sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
     os.environ['DJANGO_SETTINGS_MODULE'] = 'TwatBot.settings'
+from django.conf import settings
 
 from tweets.models import ColorMap, UnbracketedColorBigram
 from tweets.models import ColorUnigramSplit, ColorUnigram, PluralColorBigram
-from tweets.models import Color, Tweet
+from tweets.models import Color
+from tweets import registry, memory
 
 logger = logging.getLogger('tweets.default')
 
+#: Version of the blended unigram cache's format. Increase when blending changes
+#: so that old caches are not used.
+BLEND_CACHE_VERSION = 1
+
+#: Amounts of head color used when blending unigram splits.
+BLEND_A_HEADS = (0.35, 0.5, 0.65)
+
 class ColorSemantics():
     """Master class for semantic informed color manipulations.
     
@@ -38,10 +51,13 @@ class ColorSemantics():
         You should not instantiate this class by yourself, instead use the automatically
         loaded class instance available at ``tweets.core.COLOR_SEMANTICS``.
     """ 
+    #: Seed for choosing the blended colors when color names have many color codes.
+    blend_seed = 0
+    
     def __init__(self):
-        from nltk.corpus import wordnet as wn
+        self.blend_cache_path = os.path.join(settings.CACHE_DIR, 'blended_unigrams.pickle')
         self.reload_resources()
-        self.wn = wn
+        self.wn = registry.lazy('wordnet_cache')
         self.memory_length = 15
         self.color_threshold = 40
         
@@ -88,17 +104,116 @@ class ColorSemantics():
         for u in ugs:
             self.unigram_splits.append((u.w1, u.w2))
             
-        self.blended_unigram_splits = {}
-        for a_head in (0.35, 0.5, 0.65):
-            ret = self.blend_all_unigram_splits(frmt = 'html', a_head = a_head)
-            for u in ret:
-                blend_color = u[1][2]
-                self.blended_unigram_splits[blend_color] = u[0]    
+        self.blended_unigram_splits = self._load_blended_unigram_splits()
          
         self.bigrams = {}
         bigs = UnbracketedColorBigram.objects.all()
         for b in bigs:
             self.bigrams[(b.w1, b.w2)] = b.f 
+            
+        self._build_indices()
+            
+            
+    def _load_blended_unigram_splits(self):
+        """Blend all unigram splits with each of the ``BLEND_A_HEADS``.
+        
+        The blends are cached on disk. Each cached blend is keyed by the unigram
+        split, amount of head color and the color codes available for the 
+        split's words, and the whole cache by a hash of all of them and the 
+        ``blend_seed``. Only blends whose keys have changed are recomputed. 
+        Amounts of reused and recomputed blends are stored in 
+        ``blend_cache_stats``.
+        
+        **Returns:**
+            Dictionary, where keys are blended colors in html-format and values
+            unigram splits as (w1, w2)-tuples.
+        """
+        start = time.time()
+        signatures = OrderedDict()
+        for w1, w2 in self.unigram_splits:
+            chead = self.get_color_code(w1)
+            cmodifier = self.get_color_code(w2)
+            if chead is None or cmodifier is None:
+                logger.debug("Could not blend {} and {}".format(w1, w2))
+                continue
+            signatures[(w1, w2)] = (tuple(sorted(chead)), tuple(sorted(cmodifier)))
+        
+        content_hash = hashlib.md5(repr((BLEND_CACHE_VERSION, self.blend_seed, signatures.items()))).hexdigest()
+        cache = self._read_blend_cache()
+        self.blend_cache_stats = {'hits': len(cache.get('entries', {})), 'misses': 0}
+        if cache.get('hash') != content_hash:
+            entries = cache.get('entries', {})
+            misses = []
+            for u, sig in signatures.items():
+                for a_head in BLEND_A_HEADS:
+                    key = (u[0], u[1], a_head)
+                    if key not in entries or entries[key][0] != sig:
+                        rand = random.Random(self._blend_seed(key))
+                        misses.append((key, sig, rand.choice(sig[0]), rand.choice(sig[1])))
+            
+            if len(misses) > 0:
+                a_lab = [(m[0][2],) * 3 for m in misses]
+                blends = cu.blend_many([m[2] for m in misses], [m[3] for m in misses], a_lab = a_lab)
+                for m, b in zip(misses, blends):
+                    entries[m[0]] = (m[1], (m[2], m[3], cu.rgb2html((int(b[0]), int(b[1]), int(b[2])))))
+            # Drop blends of removed unigram splits and color codes.
+            entries = dict((k, v) for k, v in entries.items() if (k[0], k[1]) in signatures and v[0] == signatures[(k[0], k[1])])
+            cache = {'version': BLEND_CACHE_VERSION, 'hash': content_hash, 'entries': entries}
+            self.blend_cache_stats = {'hits': len(entries) - len(misses), 'misses': len(misses)}
+            self._write_blend_cache(cache)
+            logger.info("ColorSemantics blended {} unigram splits ({} cached).".format(len(misses), len(entries) - len(misses)))
+            
+        entries = cache['entries']
+        blended = {}
+        for a_head in BLEND_A_HEADS:
+            for u in signatures:
+                blended[entries[(u[0], u[1], a_head)][1][2]] = u
+        logger.info("ColorSemantics loaded {} blended unigram splits in {:.2f} seconds.".format(len(blended), time.time() - start))
+        return blended
+    
+    
+    def _blend_seed(self, key):
+        """Seed for a blend, so that blends do not depend on each other."""
+        return int(hashlib.md5(repr((self.blend_seed, key))).hexdigest()[:16], 16)
+    
+    
+    def _read_blend_cache(self):
+        try:
+            with open(self.blend_cache_path, 'rb') as f:
+                cache = pickle.load(f)
+            if cache.get('version') == BLEND_CACHE_VERSION:
+                return cache
+        except Exception:
+            logger.info("Could not read blended unigram cache from {}".format(self.blend_cache_path))
+        return {}
+    
+    
+    def _write_blend_cache(self, cache):
+        # Each writer uses its own temporary file, so that processes loading
+        # the resources at the same time do not overwrite each other's files.
+        tmp_path = None
+        try:
+            folder = os.path.dirname(self.blend_cache_path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            fd, tmp_path = tempfile.mkstemp(dir = folder, suffix = '.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(cache, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self.blend_cache_path)
+        except Exception:
+            logger.error("Could not write blended unigram cache to {}".format(self.blend_cache_path))
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    
+    def _build_indices(self):
+        """Build nearest neighbour indices for loaded colors and blended unigrams."""
+        html = self.colors_html.keys()
+        self.colors_html_index = cu.LabIndex(html, [self.colors_html[c][1] for c in html])
+        rgb = self.colors_rgb.keys()
+        self.colors_rgb_index = cu.LabIndex(rgb, [self.colors_rgb[c][1] for c in rgb])
+        blends = self.blended_unigram_splits.keys()
+        self.blended_unigrams_index = cu.LabIndex(blends, cu.to_lab_array(blends))
     
 
     def get_color_code(self, color_name, frmt = 'html'):
@@ -147,9 +262,8 @@ class ColorSemantics():
     def get_knn(self, color_code, k = 1, frmt = 'html'):
         """Retrieve k-nearest color codes for given color code from resources.
         
-        .. note:: 
-            This function is not optimalized in anyway and thus may take quite
-            some time while it parses through all the available colors.
+        The colors are queried from the Lab color space index built in 
+        :py:func:`reload_resources`.
             
         **Args:**
             | color_code:  Color code in any supported format. See supported formats from ``color_utils``-module.
@@ -157,50 +271,48 @@ class ColorSemantics():
             | frmt (str): Format for returned colors, currently ``html`` and ``rgb`` are supported.
             
         **Returns:**
-            List of tuples, (color code, distance) k-nearest colors from resources,
+            List of tuples, (distance, color code) k-nearest colors from resources,
             where color code is an unicode string in specified format and distance
             is non-negative float.    
         """
         #TODO: remove asserts and replace with type error.
         assert(type(k) is int)
         assert(k > 0)
-        color_dict = self.colors_html if frmt == 'html' else self.colors_rgb
-        dists =  sorted(map(lambda c: (cu.ed(color_code, c), c), color_dict.keys()))
-        return dists[:k]
+        index = self.colors_html_index if frmt == 'html' else self.colors_rgb_index
+        return index.knn(color_code, k = k)
     
     
-    def get_knn_blended_unigrams(self, color_code, k = 1):
+    def get_knn_blended_unigrams(self, color_code, k = 1, mem = None):
         """Retrieve k-nearest color names based on color codes from 
         blended unigram colors. 
         
         Excludes names that are already tweeted or which have part of the name 
         tweeted recently.
         
-        .. note:: 
-            This function is not optimalized in anyway and thus may take quite
-            some time while it parses through all the available colors.
+        Blended unigrams are traversed lazily from the closest one onwards, and 
+        the names are modified and approved only until k names are found.
             
         **Args:**
             | color_code:  Color code in any supported format. See supported formats from ``color_utils``-module.
             | k (int): Amount of nearest neighbors to return.
+            | mem (Memory): Memory of the recent tweets, see :py:mod:`memory`. Loaded if not given.
             
         **Returns:**
-            List of tuples, (color code, distance, color name) k-nearest colors from resources,
+            List of tuples, (distance, color code, color name) k-nearest colors from resources,
             where color code is an unicode string in html-format, distance
             is non-negative float and color name is the... name of the color.   
         """
         if type(k) is not int or k < 1:
             raise ValueError('k should be positive integer.')
-        tweets = Tweet.objects.all()
+        if mem is None: mem = memory.current()
         # Color atoms (words) in remembered (recently tweeted) color names
-        color_atoms = set()
-        map(lambda t: map(lambda x: color_atoms.add(x), t.color_name.split(" ")) ,tweets[:self.memory_length])
+        color_atoms = mem.color_atoms(self.memory_length)
         color_dict = self.blended_unigram_splits
-        dists =  sorted(map(lambda c: (cu.ed(color_code, c), c, self._modify_name(color_dict[c][0] + " " + color_dict[c][1])), color_dict.keys()))
         ret = []
-        for i in range(len(dists)):
-            if self._approve_color_name(dists[i][2], color_atoms, tweets):
-                ret.append(dists[i])
+        for dist, c in self.blended_unigrams_index.nearest(color_code, batch = max(k, 8)):
+            name = self._modify_name(color_dict[c][0] + " " + color_dict[c][1])
+            if self._approve_color_name(name, color_atoms, mem.tweeted_names):
+                ret.append((dist, c, name))
             if len(ret) == k:
                 break
         return ret
@@ -269,16 +381,13 @@ class ColorSemantics():
     def _modify_name(self, color_name):
         """Modify color name based on wordnet lemma names. Only the parts that
         have synset of 'color' in their hypernym-closures are altered."""
-        hyper = lambda s: s.hypernyms()
-        sscolor = self.wn.synsets('color')[0]
         color_split = color_name.split()
         modified_color_name = []
         for c in color_split:
             # Only modify color name with lemmas if the color name has 'color'
             # synset as its parent.
-            ss = self.wn.synsets(c)                           
-            if ss and sscolor in list(ss[0].closure(hyper)):    
-                lemmas = [l for l in ss[0].lemma_names() if len(l.split("_")) == 1 and l[-3:] != 'ess']              
+            if self.wn.is_color(c):
+                lemmas = [l for l in self.wn.synsets(c)[0].lemma_names() if len(l.split("_")) == 1 and l[-3:] != 'ess']              
                 choice = random.choice(lemmas)
             else:
                 choice = c
@@ -318,7 +427,7 @@ class ColorSemantics():
         """
         if type(k) is not int or k < 1:
             raise ValueError('k should be positive integer.')
-        ret = self.get_knn_blended_unigrams(reasoning.color_code, k = k)
+        ret = self.get_knn_blended_unigrams(reasoning.color_code, k = k, mem = memory.of(reasoning))
         names = []
         for r in ret: 
             if r[0] <= self.color_threshold:
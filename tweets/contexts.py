@@ -26,10 +26,11 @@ if 'DJANGO_SETTINGS_MODULE' not in os.environ:
 from django.conf import settings
 
 from tweets.web import flickr, tinyurl
-from tweets.models import Tweet, FlickrTweetImage, URLTweetImage
+from tweets.models import FlickrTweetImage, URLTweetImage
 from tweets.utils import text, image, color as cu
 from tweets.sentence import generate_text
 from tweets.new_age import get_closest_mood_color
+from tweets import registry, memory
 import interjections
 
 
@@ -53,6 +54,19 @@ class ABCContext():
         """
         return "%s %s" % (color_code, color_name)
     
+    # NLTK resources are loaded from the registry on first use.
+    @property
+    def tokenizer(self):
+        return registry.get('word_tokenize')
+    
+    @property
+    def pos_tag(self):
+        return registry.get('pos_tag')
+    
+    @property
+    def wordnet(self):
+        return registry.get('wordnet_cache')
+    
     
 class TextContext(ABCContext):
     """Basic text context. Nothing fancy here, yet."""
@@ -86,12 +100,7 @@ class DCContext(ABCContext):
     
     def __init__(self):
         from bs4 import BeautifulSoup as bs
-        from nltk import word_tokenize, pos_tag
-        from nltk.corpus import wordnet
         self.bs = bs
-        self.tokenizer = word_tokenize
-        self.pos_tag = pos_tag
-        self.wordnet = wordnet
        
         
     def build_tweet(self, color_name, wisdom_count = 5, **kwargs):
@@ -168,28 +177,17 @@ class DCContext(ABCContext):
         if len(place_candidates) == 0: 
             return None   
         
+        wn = self.wordnet
         color_split = color_name.split()  
         color_synsets = []   
         for c in color_split:
-            cs = self.wordnet.synsets(c)
-            if len(cs) > 0:
-                for synset in cs:
-                    color_synsets.append(synset)
-           
-        if len(color_synsets) == None:
-            return None
+            color_synsets += wn.synsets(c)
                   
         place_fits = {}
         for place in place_candidates:
-            place_fits[place] = 0.0
-            pos = self.wordnet.ADJ if tagged_wisdom[place][1][:2] == 'JJ' else self.wordnet.NOUN
-            place_synsets = self.wordnet.synsets(tagged_wisdom[place][0], pos = pos)
-            if len(place_synsets) > 0:
-                for place_synset in place_synsets:
-                    for csynset in color_synsets:
-                        sim = place_synset.path_similarity(csynset)
-                        if sim > place_fits[place]:
-                            place_fits[place] = sim
+            pos = wn.ADJ if tagged_wisdom[place][1][:2] == 'JJ' else wn.NOUN
+            place_synsets = wn.synsets(tagged_wisdom[place][0], pos = pos)
+            place_fits[place] = wn.max_similarity(place_synsets, color_synsets)
         
         sorted_sim = sorted(place_fits.items(), key = operator.itemgetter(1), reverse = True)
         
@@ -217,12 +215,7 @@ class NewAgeContext(ABCContext):
     """
     def __init__(self):
         from bs4 import BeautifulSoup as bs
-        from nltk import word_tokenize, pos_tag
-        from nltk.corpus import wordnet
         self.bs = bs
-        self.tokenizer = word_tokenize
-        self.pos_tag = pos_tag
-        self.wordnet = wordnet
         self.tweet_similarity_threshold = 3
         self.memory_length = 15
         
@@ -238,7 +231,7 @@ class NewAgeContext(ABCContext):
             str, tweet for the color code-name pair. If no tweet can be constructed, returns False.
         """
         color_name = reasoning.color_name
-        wisdoms = self._get_wisdoms(color_name, wisdom_count = 10)
+        wisdoms = self._get_wisdoms(color_name, wisdom_count = 10, mem = memory.of(reasoning))
         if not wisdoms: 
             return None 
         tweets = []
@@ -264,21 +257,24 @@ class NewAgeContext(ABCContext):
         return True
                
             
-    def _get_wisdoms(self, color_name, wisdom_count = 3):
-        """Get wisdoms from sentence module"""
+    def _get_wisdoms(self, color_name, wisdom_count = 3, mem = None):
+        """Get wisdoms from sentence module, which are not too similar to
+        the recent tweets in the memory."""
         if type(wisdom_count) is not int or wisdom_count < 1:
             raise ValueError("wisdom_count must be positive integer.")
         
-        last_tweets = Tweet.objects.all()[:self.memory_length]
+        if mem is None: mem = memory.current()
+        last_tweets = zip(mem.recent(self.memory_length), mem.word_sets(self.memory_length))
         wisdoms = []
         
         try:
-            while len(wisdoms) < wisdom_count:
-                wisdom = generate_text(1).strip()
+            for wisdom in generate_text():
                 logger.debug("Generated wisdom: {}".format(wisdom))
                 # Filter wisdoms too similar to latest tweets out
                 if self._approve_wisdom(wisdom, last_tweets): 
-                    wisdoms.append(wisdom.strip())
+                    wisdoms.append(wisdom)
+                    if len(wisdoms) == wisdom_count:
+                        break
         except:
             return None
             
@@ -306,25 +302,15 @@ class NewAgeContext(ABCContext):
         
     def _evaluate_color_places(self, color_name, place_candidates, tagged_wisdom): 
         color_split = color_name.split()  
-        color_synsets = []   
-        for c in color_split:
-            cs = self.wordnet.synsets(c)
-            if len(cs) > 0:
-                color_synsets.append(cs[0])
-           
-        if len(color_synsets) == None:
-            return None
+        pool = registry.get('wisdom_pool')
                   
         place_fits = {}
         for place in place_candidates:
             place_fits[place] = 0.0
-            place_synsets = self.wordnet.synsets(tagged_wisdom[place])
-            if len(place_synsets) > 0:
-                for place_synset in place_synsets:
-                    for csynset in color_synsets:
-                        sim = place_synset.path_similarity(csynset)
-                        if sim > place_fits[place]:
-                            place_fits[place] = sim
+            for c in color_split:
+                sim = pool.similarity(tagged_wisdom[place], c)
+                if sim > place_fits[place]:
+                    place_fits[place] = sim
         
         sorted_sim = sorted(place_fits.items(), key = operator.itemgetter(1), reverse = True)
         
@@ -334,8 +320,9 @@ class NewAgeContext(ABCContext):
             return sorted_sim[0]
         
     def _approve_wisdom(self, wisdom, last_tweets):
-        for t in last_tweets:
-            sw = text.same_words(wisdom, t.message)
+        words = text.word_set(wisdom)
+        for t, tweet_words in last_tweets:
+            sw = len(words & tweet_words)
             if sw > self.tweet_similarity_threshold:
                 logger.debug("Discarding wisdom, because it was too similar ({}) with recent tweet: {}".format(sw, t.message))
                 return False
@@ -357,7 +344,7 @@ class MonkeyImageContext(ABCContext):
     def build_tweet(self, reasoning):
         emotion = reasoning.reaction
         print emotion
-        ret = interjections.get(emotion, settings.WORD2VEC_MODEL)
+        ret = interjections.get(emotion, registry.get('word2vec'))
         if ret is None: return False
         interjection, base = ret
         url = tinyurl.get(reasoning.article['url'])
@@ -370,7 +357,8 @@ class MonkeyImageContext(ABCContext):
                 photo = self.download_url_photo(photo_url)
         if not photo: return False
         
-        color = get_closest_mood_color(emotion, settings.WORD2VEC_MODEL)
+        color = get_closest_mood_color(emotion, registry.get('word2vec'))
+        if color is None: return False
         color = cu.add_noise(color)
         color = list(color)
         color.append(192)
@@ -11,27 +11,95 @@ tweeted, if the stars are right and everything is well in the kingdom.
 import os
 import sys
 import math
+import random
 import logging
 import operator
 import traceback
+import cPickle as pickle
+import multiprocessing
+import numpy as np
 
 # In case we are not running these through Django, let module know
 # the correct twitter app settings from TwatBot's settings file.
 if 'DJANGO_SETTINGS_MODULE' not in os.environ:
     sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
     os.environ['DJANGO_SETTINGS_MODULE'] = 'TwatBot.settings'
-from django.conf import settings
-import tweepy
+from django.db import connection
 
 from muses import EveryColorBotMuse
 from contexts import NewAgeContext
 from color_semantics import ColorSemantics
+from tweets.web import twitter
+from tweets import memory
+import registry
 
-COLOR_SEMANTICS = ColorSemantics()
+registry.register('color_semantics', ColorSemantics)
+#: Lazily loaded :py:class:`ColorSemantics` instance, built on first use.
+COLOR_SEMANTICS = registry.lazy('color_semantics')
 logger = logging.getLogger('tweets.default')
 
 DEBUG = False
 
+#: Registry resources used by the default muse, context and color semantics.
+RESOURCES = ('color_semantics', 'wordnet', 'wordnet_cache', 'wisdom_pool')
+
+# Core used by the worker processes of TweetCore.tweet_many, set before forking.
+_batch_core = None
+
+
+def _init_worker():
+    # Forked workers inherit the parent's random state and would generate
+    # identical candidates.
+    random.seed()
+    np.random.seed()
+    
+
+def _generate_candidate(i, core = None):
+    core = core or _batch_core
+    try:
+        reasoning = core.tweet(send_to_twitter = False)
+    except Exception:
+        e = traceback.format_exc()
+        logger.error("Could not generate candidate tweet {}. Error: {}".format(i, e))
+        return None
+    if reasoning.tweet == "":
+        return None
+    return _detach(reasoning)
+
+
+def _detach(reasoning):
+    """Make candidate reasoning picklable, so that it can be returned from a 
+    worker process. 
+    
+    References to muse, context, color semantics and memory are dropped (the 
+    class names are kept), temporary media file is kept on disk and replaced with 
+    its path, and other unpicklable attributes are dropped.
+    """
+    for attr in ('muse', 'context', 'color_semantics', 'memory'):
+        setattr(reasoning, attr, None)
+    media = reasoning.media
+    if hasattr(media, 'delete') and hasattr(media, 'name'):
+        # NamedTemporaryFile, which would be removed when the worker exits.
+        media.delete = False
+        media.close()
+        reasoning.media = media.name
+        reasoning.temporary_media = True
+    for k, v in reasoning.__dict__.items():
+        try:
+            pickle.dumps(v, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            logger.debug("Dropping unpicklable attribute '{}' from candidate tweet.".format(k))
+            setattr(reasoning, k, None)
+    return reasoning
+
+
+def remove_media(candidates):
+    """Remove temporary media files of candidates returned by :py:meth:`TweetCore.tweet_many`."""
+    for c in candidates:
+        if getattr(c, 'temporary_media', False) and os.path.isfile(c.media):
+            os.remove(c.media)
+        
+
 class TweetCore():
     """Core of the color tweets.
     
@@ -40,15 +108,19 @@ class TweetCore():
     .. note::
         At the moment class is quite deterministic. It should not be somewhere 
         in the future.
+        
+    :param resources: Names of the registry resources the muse, context and color semantics use, preloaded before :py:meth:`tweet_many` forks its workers. Defaults to :py:data:`RESOURCES`.
+    :type resources: list
     """
-    def __init__(self, color_semantics = COLOR_SEMANTICS, muse = EveryColorBotMuse(), context = NewAgeContext()):      
-        self.tak = settings.TWITTER_API_KEY
-        self.tas = settings.TWITTER_API_SECRET
-        self.tat = settings.TWITTER_ACCESS_TOKEN
-        self.tats = settings.TWITTER_ACCESS_TOKEN_SECRET
+    def __init__(self, color_semantics = None, muse = None, context = None, resources = None):
+        if color_semantics is None: color_semantics = COLOR_SEMANTICS
+        if muse is None: muse = EveryColorBotMuse()
+        if context is None: context = NewAgeContext()
+        if resources is None: resources = RESOURCES
         self.color_semantics = color_semantics
         self.muse = muse
         self.context = context
+        self.resources = list(resources)
         self.threshold = 0.55
     
     
@@ -109,14 +181,12 @@ class TweetCore():
             return (True, tweet)
             
         try:
-            auth = tweepy.OAuthHandler(self.tak, self.tas)
-            auth.set_access_token(self.tat, self.tats)
-            api = tweepy.API(auth)
+            client = twitter.get_client()
             if img_name:
-                ret = api.update_with_media(filename = img_name,status = tweet)
+                ret = client.update_with_media(img_name, tweet)
                 tweet = ret.text
             else:
-                api.update_status(status = tweet)
+                client.update_status(tweet)
         except Exception:
             e = traceback.format_exc()
             logger.error("Could not tweet to Twitter. Error: {}".format(e))
@@ -142,19 +212,109 @@ class TweetCore():
         if not ret:
             return reasoning
         logger.info('Built tweet: "{}" with value: {}'.format(reasoning.tweet, reasoning.appreciation))
-        tweeted = False
-        if reasoning.appreciation < self.threshold and send_to_twitter:
-            logger.info("Value of the tweet was below threshold ({}). Trying to tweet it.".format(self.threshold))     
-            tweeted, tweet = self._tweet(reasoning.tweet, img_name = reasoning.media.name)
-            reasoning.set_attr('tweet', tweet)
-            reasoning.set_attr('tweeted', tweeted)
-            if tweeted:
-                reasoning.save()
+        if send_to_twitter:
+            self.publish(reasoning)
                 
         return reasoning
+    
+    
+    def publish(self, reasoning):
+        """Send built tweet to Twitter and store it to bot's memory, if its 
+        appreciation is below the threshold.
+        
+        :param reasoning: Reasoning of a successfully built tweet, e.g. from :py:meth:`tweet_many`.
+        :type reasoning: :py:class:`tweets.Reasoning`
+        :returns: bool -- True if the tweet was sent.
+        """
+        if reasoning.appreciation >= self.threshold:
+            return False
+        logger.info("Value of the tweet was below threshold ({}). Trying to tweet it.".format(self.threshold))
+        media = reasoning.media
+        img_name = getattr(media, 'name', media)
+        tweeted, tweet = self._tweet(reasoning.tweet, img_name = img_name)
+        reasoning.set_attr('tweet', tweet)
+        reasoning.set_attr('tweeted', tweeted)
+        if tweeted:
+            reasoning.save()
+        return tweeted
+    
+    
+    def tweet_many(self, n, workers = None):
+        """Build n candidate tweets in parallel without sending them.
+        
+        Candidates are built by a pool of forked worker processes, which 
+        inherit the core's :py:attr:`resources` (see :py:mod:`registry`) 
+        read-only from this process. Recent tweets are read once for the whole
+        batch, see :py:func:`memory.snapshot`.
+        
+        Forking closes the database connection, which would break an ongoing
+        transaction. Inside a transaction (e.g. ``ATOMIC_REQUESTS`` or a test 
+        case) the candidates are therefore built in this process. Web views 
+        should use one worker in any case.
+        
+        Returned candidates do not reference muse, context or color semantics
+        objects, and temporary media files are replaced with their paths. The 
+        files should be removed with :py:func:`remove_media` when the 
+        candidates are no longer needed.
+        
+        :param n: Amount of candidates to build
+        :type n: int
+        :param workers: Amount of worker processes, defaults to the amount of CPUs. With one worker, candidates are built in this process.
+        :type workers: int
+        :returns: list -- Successfully built :py:class:`tweets.Reasoning` objects, best (lowest appreciation) first.
+        """
+        global _batch_core
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        workers = max(1, min(workers, n))
+        if workers > 1 and connection.in_atomic_block:
+            logger.warning("Building candidate tweets in one process, because forking would break the ongoing transaction.")
+            workers = 1
+        
+        with memory.snapshot():
+            if workers == 1:
+                candidates = [_generate_candidate(i, self) for i in xrange(n)]
+            else:
+                for name in self.resources:
+                    registry.get(name)
+                _batch_core = self
+                # Workers must not share this process's database connection.
+                connection.close()
+                pool = multiprocessing.Pool(workers, initializer = _init_worker)
+                try:
+                    candidates = pool.map(_generate_candidate, xrange(n), chunksize = 1)
+                finally:
+                    pool.terminate()
+                    _batch_core = None
+        
+        candidates = [c for c in candidates if c is not None]
+        candidates.sort(key = operator.attrgetter('appreciation'))
+        logger.info("Built {} candidate tweets out of {} tries.".format(len(candidates), n))
+        return candidates
+    
+    
+    def tweet_best(self, n, workers = None, send_to_twitter = False):
+        """Build n candidate tweets with :py:meth:`tweet_many` and publish the best one.
+        
+        Temporary media files of the candidates are removed before returning.
+        
+        :returns: :py:class:`tweets.Reasoning` -- Best candidate, or None if no candidates could be built.
+        """
+        candidates = self.tweet_many(n, workers = workers)
+        try:
+            if len(candidates) == 0:
+                return None
+            best = candidates[0]
+            if send_to_twitter:
+                self.publish(best)
+            return best
+        finally:
+            remove_media(candidates)
 
 
     
-TWEET_CORE = TweetCore()
+registry.register('tweet_core', TweetCore)
+#: Lazily loaded :py:class:`TweetCore` instance, built on first use.
+TWEET_CORE = registry.lazy('tweet_core')
         
         
\ No newline at end of file
@@ -10,66 +10,120 @@ if 'DJANGO_SETTINGS_MODULE' not in os.environ:
 import logging
 import traceback
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
 from django_cron import CronJobBase, Schedule
-import tweepy
 
 from core import TWEET_CORE
-from models import EveryColorBotTweet, Color, Tweet
+from models import EveryColorBotTweet, Tweet
 from tweets.utils import color as cu
+from tweets.utils import resources
+from tweets.web import rss, twitter
 
 logger = logging.getLogger('django.cron')
 
 class TwitterAccountListener(CronJobBase):
+    '''Store new colors tweeted by :py:attr:`screen_name` into the database.
+
+    Only tweets newer than the newest stored tweet are requested from Twitter
+    (``since_id``). If there are more of them than fit on one timeline page,
+    e.g. after downtime, older pages are requested with ``max_id`` until the
+    gap is filled or :py:attr:`max_pages` is reached.
+    '''
     RUN_EVERY_MINS = 30
     RETRY_AFTER_FAILURE_MINS = 5
     screen_name = "everycolorbot"
-    _tak = settings.TWITTER_API_KEY
-    _tas = settings.TWITTER_API_SECRET
-    _tat = settings.TWITTER_ACCESS_TOKEN
-    _tats = settings.TWITTER_ACCESS_TOKEN_SECRET
+    #: Tweets requested per timeline page, maximum allowed by Twitter is 200.
+    page_size = 200
+    #: Maximum amount of timeline pages requested in one run.
+    max_pages = 16
     
     schedule = Schedule(run_every_mins=RUN_EVERY_MINS, retry_after_failure_mins=RETRY_AFTER_FAILURE_MINS)
     code = "tweets.TwitterAccountListener"
      
     def do(self): 
         logger.info("Initiating cronjob: {}".format(self.code)) 
+        since_id = self.last_tweet_id()
         try:
-            auth = tweepy.OAuthHandler(self._tak, self._tas)
-            auth.set_access_token(self._tat, self._tats)
-            api = tweepy.API(auth)
-            user_timeline = api.user_timeline(screen_name = self.screen_name)
+            statuses = self.get_new_statuses(since_id)
         except Exception:
             e = traceback.format_exc()
             logger.error("Could not get timeline for user {}. Error: {}".format(self.screen_name, e))
             return False
         
-        not_seen = []
-        for t in user_timeline:
-            if t.author.screen_name == self.screen_name:
-                chex, url = t.text.split() 
-                tweet_id = t.id_str
-                if EveryColorBotTweet.objects.get_or_none(url = url) is None:
-                    R, G, B = cu.hex2rgb(chex)
-                    html = cu.rgb2html((R, G, B))
-                    l, a, b = (cu._2lab((R, G, B))).get_value_tuple()
-                    color_inst = Color.objects.get_or_none(html = html)                                                   
-                    if color_inst is None:
-                        color_inst = Color(html = html, hex = chex, rgb_r = R, rgb_g = G, rgb_b = B, l = l, a = a, b = b)
-                        color_inst.save()
+        added = self.store(statuses)
+        logger.info("Got {} new tweets from {}, added {} into EveryColorBotTweet-table.".format(len(statuses), self.screen_name, added))
+        
+    def last_tweet_id(self):
+        '''Highest stored tweet id, or None if no tweets have been stored.'''
+        num = EveryColorBotTweet.objects.aggregate(Max('tweet_num'))['tweet_num__max']
+        return str(num) if num is not None else None
     
-                    not_seen.append({'color_code': chex, 'everycolorbot_url': url})
-                    logger.info("Adding {} {} into EveryColorBotTweet-table".format(chex, url))
-                    instance = EveryColorBotTweet(color = color_inst, url = url, tweeted = False, tweet_id = tweet_id)
-                    instance.save()
+    def get_new_statuses(self, since_id = None):
+        '''Get user's statuses newer than ``since_id``, newest first.
+        
+        If ``since_id`` is None, only the latest page is requested.
+        '''
+        client = twitter.get_client()
+        statuses = []
+        max_id = None
+        for _ in xrange(self.max_pages):
+            kwargs = {'count': self.page_size}
+            if since_id is not None:
+                kwargs['since_id'] = since_id
+            if max_id is not None:
+                kwargs['max_id'] = max_id
+            page = client.user_timeline(screen_name = self.screen_name, **kwargs)
+            if len(page) == 0:
+                break
+            statuses.extend(page)
+            if since_id is None:
+                break
+            max_id = str(min(t.id for t in page) - 1)
+        return statuses
+        
+    def store(self, statuses):
+        '''Store colors and URLs of the statuses, which are not yet in the database.
+        
+        Known URLs and colors are resolved with one query each and the new 
+        rows are inserted with ``bulk_create``. Colors are matched by their 
+        rgb-values, see :py:func:`resources.get_or_create_colors`.
+        
+        :returns: int -- Amount of added EveryColorBotTweet-rows.
+        '''
+        new = {}
+        for t in statuses:
+            if t.author.screen_name != self.screen_name:
+                continue
+            parts = t.text.split()
+            if len(parts) != 2:
+                logger.warning("Skipping tweet {} with unexpected text: {}".format(t.id_str, t.text))
+                continue
+            chex, url = parts
+            new[url] = (t.id, t.id_str, chex)
+        if len(new) == 0:
+            return 0
+        
+        known = set(EveryColorBotTweet.objects.filter(url__in = new.keys()).values_list('url', flat = True))
+        rows = sorted(v + (url,) for url, v in new.items() if url not in known)
+        if len(rows) == 0:
+            return 0
+        
+        with transaction.atomic():
+            colors = resources.get_or_create_colors(cu.hex2rgb(chex) for _, _, chex, _ in rows)
+            tweets = []
+            for tweet_num, tweet_id, chex, url in rows:
+                logger.info("Adding {} {} into EveryColorBotTweet-table".format(chex, url))
+                tweets.append(EveryColorBotTweet(color_id = colors[cu.hex2rgb(chex)], url = url, tweeted = False, 
+                                                 tweet_id = tweet_id, tweet_num = tweet_num))
+            EveryColorBotTweet.objects.bulk_create(tweets)
+        return len(tweets)
                     
 
 class NewAgeTweeter(CronJobBase):
+    '''Build a batch of candidate tweets and publish the best one.'''
     RUN_EVERY_MINS = 60
     RETRY_AFTER_FAILURE_MINS = 5
-    _tak = settings.TWITTER_API_KEY
-    _tas = settings.TWITTER_API_SECRET
-    _tat = settings.TWITTER_ACCESS_TOKEN
-    _tats = settings.TWITTER_ACCESS_TOKEN_SECRET
     
     schedule = Schedule(run_every_mins=RUN_EVERY_MINS, retry_after_failure_mins=RETRY_AFTER_FAILURE_MINS)
     code = "tweets.NewAgeTweeter"
@@ -78,7 +132,7 @@ class NewAgeTweeter(CronJobBase):
         logger.info("Initiating cronjob: {}".format(self.code)) 
            
         try:
-            TWEET_CORE.tweet(send_to_twitter = True)
+            TWEET_CORE.tweet_best(settings.TWEET_CANDIDATES, workers = settings.TWEET_WORKERS, send_to_twitter = True)
         except Exception:
             e = traceback.format_exc()
             logger.error("NewAgeTweeter cronjob crashed because of error: {}".format(e))
@@ -90,10 +144,6 @@ class NewAgeTweeter(CronJobBase):
 class HomeTimelineCleaner(CronJobBase):
     RUN_EVERY_MINS = 60
     RETRY_AFTER_FAILURE_MINS = 5
-    _tak = settings.TWITTER_API_KEY
-    _tas = settings.TWITTER_API_SECRET
-    _tat = settings.TWITTER_ACCESS_TOKEN
-    _tats = settings.TWITTER_ACCESS_TOKEN_SECRET
     
     schedule = Schedule(run_every_mins=RUN_EVERY_MINS, retry_after_failure_mins=RETRY_AFTER_FAILURE_MINS)
     code = "tweets.HomeTimelineCleaner"
@@ -101,11 +151,9 @@ class HomeTimelineCleaner(CronJobBase):
     def do(self):
         logger.info("Initiating cronjob: {}".format(self.code)) 
         try:
-            auth = tweepy.OAuthHandler(self._tak, self._tas)
-            auth.set_access_token(self._tat, self._tats)
-            api = tweepy.API(auth)
-            screen_name = api.me().screen_name
-            timeline = api.home_timeline()
+            client = twitter.get_client()
+            screen_name = client.me().screen_name
+            timeline = client.home_timeline()
         except Exception:
             e = traceback.format_exc()
             logger.error("Could not get home timeline. Error: {}".format(self.screen_name, e))
@@ -125,6 +173,25 @@ class HomeTimelineCleaner(CronJobBase):
                     logger.info('Cronjob encountered unsaved tweet: "{}" Saving it to database.'.format(msg))
                     inst = Tweet(color_code = chex, message = msg) 
                     inst.save()
-                
-            
-                
\ No newline at end of file
+
+
+class RSSFeedRefresher(CronJobBase):
+    '''Refresh RSS feeds' entries in the feed cache, so that muses reading 
+    them do not need to wait for the web requests.'''
+    RUN_EVERY_MINS = 20
+    RETRY_AFTER_FAILURE_MINS = 5
+    
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS, retry_after_failure_mins=RETRY_AFTER_FAILURE_MINS)
+    code = "tweets.RSSFeedRefresher"
+    
+    def do(self):
+        logger.info("Initiating cronjob: {}".format(self.code))
+        try:
+            ret = rss.refresh_feeds()
+        except Exception:
+            e = traceback.format_exc()
+            logger.error("RSSFeedRefresher cronjob crashed because of error: {}".format(e))
+            return False
+        for url, count in ret.items():
+            logger.info("RSS feed {} has {} entries.".format(url, count))
+        return True
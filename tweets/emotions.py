@@ -5,7 +5,12 @@
   
 Thesaurus Rex words in negative:emotion and positive:emotion categories mapped 
 on the surface of the unit circle residing inside the Lövheim cube of emotion.  
+
+The emotions' names and points are also available as :py:data:`EMOTION_NAMES`
+and :py:data:`EMOTION_POINTS` (N x 3 NumPy array) in the same order, and 
+:py:data:`EMOTION_INDEX` maps names to their indices.
 '''
+import numpy as np
 
 
 EMOTIONS = (
@@ -194,13 +199,22 @@ EMOTIONS = (
 )
 
 
+#: Names of the emotions in the same order as in EMOTIONS.
+EMOTION_NAMES = [e[0] for e in EMOTIONS]
+#: Points of the emotions as N x 3 array, in the same order as in EMOTIONS.
+EMOTION_POINTS = np.array([e[1] for e in EMOTIONS])
+#: Emotion name -> index in EMOTIONS.
+EMOTION_INDEX = {}
+for i, e in enumerate(EMOTION_NAMES):
+    EMOTION_INDEX.setdefault(e, i)
+
+
 def get_point(emotion):
     '''Get point mapped for the emotion, or None if emotion does not exist.'''
-    for e in EMOTIONS:
-        s,p = e
-        if s == emotion:
-            return p
-    return None
+    i = EMOTION_INDEX.get(emotion)
+    if i is None:
+        return None
+    return EMOTIONS[i][1]
 
 
 def plot_emotions(plot_labels = True):
@@ -18,6 +18,9 @@ Intended usage follows roughly this scheme::
 
 '''
 from random import randint, choice
+import numpy as np
+
+from tweets import word2vec
 
 #: Threshold for filtering interjections if model is given. Only interjections 
 #: that score higher than threshold for similarity can be accepted.
@@ -116,19 +119,12 @@ def __weight(stimulation, model = None):
     '''
     mood_interjections = []
     if model: 
-        for i in interjections:
-            cur_score = 0
-            ems = []
-            for em in i[3]:
-                try:
-                    sim = model.similarity(stimulation, em)
-                except:
-                    continue  
-                ems.append(em)
-                if sim > cur_score:
-                    cur_score = sim
-            cur_score = model.n_similarity([stimulation], ems)
-            mood_interjections.append((cur_score, i))
+        # Interjections' emotions are compared to the stimulation all at once.
+        index = word2vec.similarity_index(model, 'interjections', [i[3] for i in interjections])
+        sims = index.similarities(stimulation)
+        for score, i in zip(sims, interjections):
+            if not np.isnan(score):
+                mood_interjections.append((float(score), i))
         return sorted(mood_interjections, key = lambda x: x[0], reverse = True)
     else:
         for i in interjections:
@@ -18,11 +18,10 @@ Each emotion is placed on a surface of a unit sphere with has the same center as
 the cube. User of the module can then query for emotions closest to the certain
 point or vector using py:func:`get_closest`.
 '''
-import itertools
 import numpy as np 
-import sys
 from random import choice
 import emotions
+from tweets import word2vec
 
 AXIS = ((0, 'serotonin'), (1, 'noradrenaline'), (2, 'dopamine'))
 
@@ -102,27 +101,23 @@ def map_stimulation(stimulation, model):
 """
 
 
+# Base emotions' corners and words in fixed order for the similarity index.
+_BASE_KEYS = BASE_EMOTION_MAP.keys()
+_BASE_WORDS = [(k, emotion) for k in _BASE_KEYS for emotion in BASE_EMOTION_MAP[k]]
+_BASE_GROUPS = [[i for i, (key, w) in enumerate(_BASE_WORDS) if key == k] for k in _BASE_KEYS]
+_BASE_VECTORS = np.array([VECTORS[k] for k in _BASE_KEYS])
+
+
 def map_stimulation(stimulation, model):
     '''Map stimulation into the unit sphere inside the Lövheim cube.
     '''
-    sims = {}
-    for k,v in BASE_EMOTION_MAP.items():
-        s = []
-        for emotion in v:
-            s.append(model.similarity(stimulation, emotion))
-        sims[k] = max(s)
-              
-    keys = BASE_EMOTION_MAP.keys()
-    v = np.array((0, 0, 0))
-    for t1, t2 in itertools.combinations(keys, 2):
-        v1 = VECTORS[t1]
-        v2 = VECTORS[t2]
-        s1 = sims[t1]**3
-        s2 = sims[t2]**3
-        sa = s1 + s2
-        sa1 = s1 / sa
-        sa2 = s2 / sa
-        v = v + (v1*s1 + v2*s2) 
+    index = word2vec.similarity_index(model, 'loevheim_cube', [(w,) for k, w in _BASE_WORDS])
+    word_sims = index.similarities(stimulation)
+    sims = np.array([np.nanmax(word_sims[g]) for g in _BASE_GROUPS])
+    
+    # Each corner appears in len(keys) - 1 corner pairs, summing the pairs' 
+    # weighted vectors equals to weighting each corner once by that amount.
+    v = np.dot(sims**3, _BASE_VECTORS) * (len(_BASE_KEYS) - 1)
     return _normalize(v)
 
 
@@ -139,21 +134,32 @@ def get_closest(point, vector = True):
     :type vector: bool
     :returns: tuple -- (emotion, point)
     '''
-    mind = sys.maxint
-    closest = []
+    return get_closest_many([point], vector = vector)[0]
+
+
+def get_closest_many(points, vector = True):
+    '''Get emotions closest to each of the points, see :py:func:`get_closest`.
+    
+    As all the emotions are on the surface of the unit sphere, the closest 
+    emotion to a point is the one with the largest dot product with it, and 
+    all points are compared to all emotions with one matrix product.
+    
+    :param points: Points in 3D space
+    :type points: N x 3 array-like
+    :param vector: Are points considered as vectors originating from the Origo.
+    :type vector: bool
+    :returns: list -- (emotion, point)-tuples in the same order as points.
+    '''
+    points = np.asarray(points, dtype = float).reshape(-1, 3)
     if vector:
-        point = _normalize(point)
-    for em, p in EMOTIONS:
-        curd = _ed(p, point)
-        if curd <= mind:
-            if curd == mind:
-                closest.append(em)
-            else:
-                closest = [em]
-            mind = curd
-    em = choice(closest)
-    p = emotions.get_point(em)
-    return em, p
+        points = points / np.sqrt((points**2).sum(axis = 1))[:, np.newaxis]
+    dots = np.dot(points, emotions.EMOTION_POINTS.T)
+    ret = []
+    for row in dots:
+        closest = np.flatnonzero(row == row.max())
+        em = emotions.EMOTION_NAMES[choice(closest)]
+        ret.append((em, emotions.get_point(em)))
+    return ret
     
     
 def _normalize(v):
@@ -0,0 +1,40 @@
+'''
+.. py:module:: build_lab_table
+    :platform: Unix
+    
+Management command to precompute rgb -> Lab lookup table for 
+:py:mod:`color_utils`. Usage::
+
+    $> python manage.py build_lab_table [--path=/path/to/table.npy] [--float16]
+'''
+import os
+import time
+from optparse import make_option
+import numpy as np
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tweets.utils import color as cu
+
+
+class Command(BaseCommand):
+    help = "Precompute Lab-values for all rgb-colors into a memory-mappable lookup table."
+    option_list = BaseCommand.option_list + (
+        make_option('--path', dest = 'path', default = None,
+                    help = 'Path to the created table, defaults to settings.LAB_TABLE_PATH.'),
+        make_option('--float16', action = 'store_true', dest = 'float16', default = False,
+                    help = 'Store values as float16 instead of float32 (half the size, less accurate).'),
+    )
+    
+    def handle(self, *args, **options):
+        path = options['path'] or settings.LAB_TABLE_PATH
+        dtype = np.float16 if options['float16'] else np.float32
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+            
+        self.stdout.write("Building rgb -> Lab table into {}".format(path))
+        start = time.time()
+        cu.build_lab_table(path, dtype = dtype)
+        self.stdout.write("Done in {:.1f} seconds.".format(time.time() - start))
@@ -0,0 +1,34 @@
+'''
+.. py:module:: build_wisdom_pool
+    :platform: Unix
+
+Management command to build the slot words' synsets for new age wisdoms, see
+:py:mod:`wisdom_pool`. Usage::
+
+    $> python manage.py build_wisdom_pool [--path=/path/to/pool.pkl]
+'''
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tweets.wisdom_pool import WisdomPool
+from tweets.vocab import templates
+
+
+class Command(BaseCommand):
+    help = "Resolve WordNet synsets of the words in new age wisdoms' color name slots."
+    option_list = BaseCommand.option_list + (
+        make_option('--path', dest = 'path', default = None,
+                    help = 'Path to the created pool, defaults to settings.WISDOM_POOL_PATH.'),
+    )
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.WISDOM_POOL_PATH
+        self.stdout.write("Building wisdom pool into {}".format(path))
+        start = time.time()
+        pool = WisdomPool.build()
+        pool.save(path)
+        self.stdout.write("Resolved synsets of {} slot words for {} templates in {:.1f} seconds.".format(
+                          len(pool.synsets), len(templates), time.time() - start))
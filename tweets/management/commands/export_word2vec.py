@@ -0,0 +1,44 @@
+'''
+.. py:module:: export_word2vec
+    :platform: Unix
+    
+Management command to export gensim Word2Vec model's normalized vectors into 
+memory-mappable files used by :py:mod:`word2vec`. Usage::
+
+    $> python manage.py export_word2vec [--model=/path/to/gensim.model] [--path=/path/to/vectors]
+'''
+import os
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tweets import word2vec
+
+
+class Command(BaseCommand):
+    help = "Export Word2Vec model's normalized vectors into memory-mappable files."
+    option_list = BaseCommand.option_list + (
+        make_option('--model', dest = 'model', default = None,
+                    help = 'Path to the gensim model, defaults to settings.WORD2VEC_MODEL_PATH.'),
+        make_option('--path', dest = 'path', default = None,
+                    help = 'Path to the exported vectors without suffixes, defaults to settings.WORD2VEC_VECTORS_PATH.'),
+    )
+    
+    def handle(self, *args, **options):
+        import gensim
+        model_path = options['model'] or settings.WORD2VEC_MODEL_PATH
+        path = options['path'] or settings.WORD2VEC_VECTORS_PATH
+        if not os.path.isfile(model_path):
+            raise CommandError("Word2Vec model {} does not exist.".format(model_path))
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        
+        self.stdout.write("Loading Word2Vec model from {}".format(model_path))
+        start = time.time()
+        model = gensim.models.Word2Vec.load(model_path)
+        self.stdout.write("Exporting {} vectors into {}".format(len(model.index2word), path))
+        word2vec.export_gensim(model, path)
+        self.stdout.write("Done in {:.1f} seconds.".format(time.time() - start))
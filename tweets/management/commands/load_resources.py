@@ -0,0 +1,59 @@
+'''
+.. py:module:: load_resources
+    :platform: Unix
+    
+Management command to load the resource files into the database with 
+:py:mod:`resources_utils`. Reports the loading speed of each resource. Usage::
+
+    $> python manage.py load_resources [--path=/path/to/resources] [--split-unigrams] [resource ...]
+    
+Resources are loaded in the order of :py:data:`resources_utils.RESOURCES`,
+all of them if none are given. With ``--split-unigrams`` the color unigrams 
+are split into ``ColorUnigramSplit``-model afterwards, see 
+:py:func:`resources_utils.split_unigrams`.
+'''
+import os
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tweets.utils import resources
+
+
+class Command(BaseCommand):
+    args = '[resource ...]'
+    help = "Load (or update) resource files into the database and report rows/sec for each of them."
+    option_list = BaseCommand.option_list + (
+        make_option('--path', dest = 'path', default = None,
+                    help = 'Folder with the resource files, defaults to resources/ in the project root.'),
+        make_option('--split-unigrams', action = 'store_true', dest = 'split_unigrams', default = False,
+                    help = 'Split the color unigrams into color names after loading.'),
+    )
+    
+    def handle(self, *args, **options):
+        folder = options['path'] or os.path.join(settings.BASE_DIR, 'resources')
+        names = args or resources.RESOURCES.keys()
+        for name in names:
+            if name not in resources.RESOURCES:
+                raise CommandError("Unknown resource '{}'. Choices are: {}".format(name, ", ".join(resources.RESOURCES.keys())))
+            
+        total_rows = 0
+        total_start = time.time()
+        for name in names:
+            populate, filename = resources.RESOURCES[name]
+            start = time.time()
+            stats = populate(os.path.join(folder, filename))
+            elapsed = time.time() - start
+            total_rows += stats['read']
+            self.stdout.write("{:<28}{:>7} rows {:>7} created {:>7} updated in {:6.2f}s ({:.0f} rows/sec)".format(
+                              name, stats['read'], stats['created'], stats['updated'], elapsed, stats['read'] / max(elapsed, 1e-6)))
+            
+        elapsed = time.time() - total_start
+        self.stdout.write("Loaded {} rows in {:.2f}s ({:.0f} rows/sec)".format(total_rows, elapsed, total_rows / max(elapsed, 1e-6)))
+        
+        if options['split_unigrams']:
+            start = time.time()
+            saved = resources.split_unigrams()
+            self.stdout.write("Saved {} new unigram splits in {:.2f}s".format(saved, time.time() - start))
@@ -0,0 +1,30 @@
+'''
+.. py:module:: resource_report
+    :platform: Unix
+    
+Management command to load the app's heavy resources and report how long 
+loading each of them took. Usage::
+
+    $> python manage.py resource_report [resource_name ...]
+    
+Without arguments all registered resources are loaded.
+'''
+from django.core.management.base import BaseCommand, CommandError
+
+from tweets import registry
+# Registers the core resources.
+from tweets import core
+
+
+class Command(BaseCommand):
+    args = '[resource_name ...]'
+    help = "Load the app's heavy resources and report their loading times."
+    
+    def handle(self, *args, **options):
+        names = args or [r[0] for r in registry.report()]
+        for name in names:
+            try:
+                registry.get(name)
+            except KeyError:
+                raise CommandError("No resource named '{}' registered.".format(name))
+        self.stdout.write(registry.format_report())
@@ -0,0 +1,262 @@
+'''
+.. py:module:: memory
+    :platform: Unix
+
+Bot's memory of its recent tweets.
+
+Muses, contexts and color semantics check their creations against the latest
+tweets, e.g. so that too similar colors, color names or wisdoms are not tweeted
+repeatedly. Instead of querying the tweets separately, they all read the same
+:py:class:`Memory` attached to the tweet's :py:class:`~tweets.reasoning.Reasoning`,
+see :py:func:`of`. The memory is loaded with one query for the recent tweets,
+and the derived data (color name atoms, Lab-values and word sets of the tweets)
+is computed once, when first needed.
+
+All the tweeted color names are kept in a process wide :py:class:`TweetedNames`
+index, see :py:func:`tweeted_names_index`, so checking whether a name has been
+tweeted takes constant time regardless of the amount of tweets.
+
+Inside :py:func:`snapshot` all reasonings of the thread share the same 
+memory, e.g. when :py:meth:`TweetCore.tweet_many` generates a batch of tweets.
+Processes forked inside the snapshot inherit it.
+'''
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from tweets.models import Tweet
+from tweets.utils.cache import BloomFilter
+
+logger = logging.getLogger('tweets.default')
+
+#: Amount of recent tweets loaded into a memory.
+SNAPSHOT_SIZE = 50
+
+# Snapshot of each thread, see snapshot().
+_local = threading.local()
+_tweeted_names = None
+_tweeted_names_lock = threading.Lock()
+
+
+class TweetedNames():
+    '''Index of all tweeted color names.
+    
+    Names are loaded from the database on first use. After that the index is
+    updated when this process saves tweets (``post_save`` signal), and the
+    tweets saved by other processes are queried incrementally, at most once
+    per ``refresh_interval`` seconds. Transactions of other processes may 
+    commit tweets with lower primary keys than the ones already seen, so the 
+    incremental queries start ``pk_window`` primary keys below the highest 
+    seen one, and all the names are reloaded every ``reload_interval`` seconds.
+    
+    For very large histories the names can be stored in a
+    :py:class:`~tweets.utils.cache.BloomFilter`, in which case a small share 
+    of the untweeted names are reported as tweeted. A warning is logged when 
+    the filter grows over its capacity, after which the share increases.
+    
+    :param refresh_interval: Minimum seconds between queries for new tweets.
+    :type refresh_interval: int
+    :param bloom_capacity: Capacity of the Bloom filter, or None to store the names in a set.
+    :type bloom_capacity: int
+    :param reload_interval: Seconds between reloading all the names.
+    :type reload_interval: int
+    :param pk_window: Amount of primary keys below the highest seen one, which are queried again on each refresh.
+    :type pk_window: int
+    '''
+    def __init__(self, refresh_interval = 60, bloom_capacity = None, reload_interval = 24 * 3600, pk_window = 100):
+        self.refresh_interval = refresh_interval
+        self.bloom_capacity = bloom_capacity
+        self.reload_interval = reload_interval
+        self.pk_window = pk_window
+        self._names = None
+        self._last_pk = 0
+        self._refreshed = 0.0
+        self._loaded = 0.0
+        self._over_capacity = False
+        self._lock = threading.RLock()
+        
+    def __contains__(self, name):
+        self.refresh()
+        return name in self._names
+    
+    def __len__(self):
+        self.refresh()
+        return len(self._names)
+    
+    def add(self, name):
+        '''Add tweeted name into the index, if it has been loaded.'''
+        with self._lock:
+            if self._names is not None:
+                self._names.add(name)
+                self._check_capacity()
+    
+    def refresh(self, force = False):
+        '''Load the names, or add names of the new tweets if the refresh interval 
+        has passed. All the names are loaded again if the reload interval has passed.'''
+        with self._lock:
+            now = time.time()
+            if self._names is None or now - self._loaded >= self.reload_interval:
+                self._names = BloomFilter(self.bloom_capacity) if self.bloom_capacity else set()
+                self._last_pk = 0
+                self._over_capacity = False
+                self._loaded = now
+                since = 0
+            elif not force and now - self._refreshed < self.refresh_interval:
+                return
+            else:
+                since = max(0, self._last_pk - self.pk_window)
+            new = Tweet.objects.filter(pk__gte = since).order_by().values_list('pk', 'color_name')
+            for pk, name in new:
+                self._names.add(name)
+                self._last_pk = max(self._last_pk, pk)
+            self._refreshed = now
+            self._check_capacity()
+            
+    def _check_capacity(self):
+        if self.bloom_capacity and not self._over_capacity and len(self._names) > self.bloom_capacity:
+            self._over_capacity = True
+            logger.warning("Tweeted names exceed the Bloom filter's capacity of {}, increase TWEETED_NAMES_BLOOM_CAPACITY.".format(self.bloom_capacity))
+            
+    def reset(self):
+        '''Forget the names, they are loaded again on next use.'''
+        with self._lock:
+            self._names = None
+            
+            
+def tweeted_names_index():
+    '''Get process wide :py:class:`TweetedNames` index configured in Django settings.'''
+    global _tweeted_names
+    with _tweeted_names_lock:
+        if _tweeted_names is None:
+            _tweeted_names = TweetedNames(refresh_interval = getattr(settings, 'TWEETED_NAMES_REFRESH_INTERVAL', 60),
+                                          bloom_capacity = getattr(settings, 'TWEETED_NAMES_BLOOM_CAPACITY', None),
+                                          reload_interval = getattr(settings, 'TWEETED_NAMES_RELOAD_INTERVAL', 24 * 3600))
+    return _tweeted_names
+
+
+@receiver(post_save, dispatch_uid = 'tweets.memory.tweet_saved')
+def _tweet_saved(sender, instance, **kwargs):
+    if isinstance(instance, Tweet) and _tweeted_names is not None:
+        _tweeted_names.add(instance.color_name)
+
+
+class Memory():
+    '''Snapshot of the bot's recent tweets.
+
+    :param tweets: Latest tweets, newest first.
+    :type tweets: list
+    :param tweeted_names: Color names of all the tweets, defaults to :py:func:`tweeted_names_index`.
+    :type tweeted_names: set or :py:class:`TweetedNames`
+    '''
+    def __init__(self, tweets, tweeted_names = None):
+        self.tweets = list(tweets)
+        if tweeted_names is None:
+            tweeted_names = tweeted_names_index()
+        self.tweeted_names = tweeted_names
+        self._labs = None
+        self._word_sets = None
+
+    @classmethod
+    def load(cls, size = SNAPSHOT_SIZE):
+        '''Load memory of the latest ``size`` tweets from the database.
+        
+        The tweeted names index is refreshed too, so that processes forked
+        inside a :py:func:`snapshot` inherit it up to date.
+        '''
+        names = tweeted_names_index()
+        names.refresh()
+        return cls(Tweet.objects.all()[:size], names)
+
+    def __len__(self):
+        return len(self.tweets)
+
+    def recent(self, n):
+        '''Latest n tweets, newest first.'''
+        return self.tweets[:n]
+
+    def is_tweeted(self, color_name):
+        '''Has the color name been tweeted.'''
+        return color_name in self.tweeted_names
+
+    def color_atoms(self, n):
+        '''Words in the color names of the latest n tweets.
+
+        :returns: set
+        '''
+        atoms = set()
+        for t in self.tweets[:n]:
+            atoms.update(t.color_name.split(" "))
+        return atoms
+
+    @property
+    def labs(self):
+        '''N x 3 array of the tweets' colors in Lab, ``nan`` for invalid color codes.'''
+        if self._labs is None:
+            from tweets.utils import color as cu
+            labs = np.empty((len(self.tweets), 3))
+            for i, t in enumerate(self.tweets):
+                try:
+                    labs[i] = cu.to_lab_array([t.color_code])[0]
+                except (TypeError, ValueError):
+                    labs[i] = np.nan
+            self._labs = labs
+        return self._labs
+
+    def color_distances(self, color_code, n):
+        '''Distances from the color code to the colors of the latest n tweets.
+
+        :returns: Array of distances in Lab, newest tweet first.
+        '''
+        from tweets.utils import color as cu
+        labs = self.labs[:n]
+        q = cu.to_lab_array([color_code])[0]
+        return np.sqrt(((labs - q)**2).sum(axis = 1))
+
+    def word_sets(self, n):
+        '''Word sets of the latest n tweets' messages, see :py:func:`text.word_set`.'''
+        if self._word_sets is None:
+            self._word_sets = []
+        if len(self._word_sets) < min(n, len(self.tweets)):
+            from tweets.utils import text
+            for t in self.tweets[len(self._word_sets):n]:
+                self._word_sets.append(text.word_set(t.message))
+        return self._word_sets[:n]
+
+
+def current():
+    '''Get the memory of the thread's current snapshot, or load a new one if not inside a snapshot.'''
+    mem = getattr(_local, 'snapshot', None)
+    if mem is not None:
+        return mem
+    return Memory.load()
+
+
+def of(reasoning):
+    '''Get the memory attached to the reasoning, attaching :py:func:`current` memory first if needed.'''
+    if getattr(reasoning, 'memory', None) is None:
+        reasoning.memory = current()
+    return reasoning.memory
+
+
+@contextmanager
+def snapshot():
+    '''Context manager, inside which all reasonings of the thread share one 
+    memory loaded when entering the context. Other threads are not affected.
+
+    Snapshots can be nested, the outermost one is used.
+    '''
+    mem = getattr(_local, 'snapshot', None)
+    if mem is not None:
+        yield mem
+        return
+    _local.snapshot = Memory.load()
+    try:
+        yield _local.snapshot
+    finally:
+        _local.snapshot = None
@@ -212,6 +212,7 @@ class EveryColorBotTweet(models.Model):
         | url (URLField): URL for the tweet.
         | added (DateTimeField): Time when tweet was added to the database.
         | tweet_id (CharField): Tweet's id_str from Twitter
+        | tweet_num (BigIntegerField): Tweet's id as a number, the highest one is the next ``since_id``.
          
     Sample entries:    
      
@@ -227,8 +228,9 @@ class EveryColorBotTweet(models.Model):
     url = models.URLField(unique = True)
     color = models.ForeignKey(Color)
     tweeted = models.BooleanField(default = False)
-    added = models.DateTimeField(auto_now_add = True, null = True)
+    added = models.DateTimeField(auto_now_add = True, null = True, db_index = True)
     tweet_id = models.CharField(max_length = 200, null = True)
+    tweet_num = models.BigIntegerField(null = True, db_index = True)
     objects = GetOrNoneManager()
     
     def __str__(self):
@@ -236,6 +238,8 @@ class EveryColorBotTweet(models.Model):
     
     class Meta:
         ordering = ['-added', 'color', 'url', 'tweeted']
+        # Muses browse untweeted tweets added after given time.
+        index_together = [['tweeted', 'added']]
     
 
 class PluralColorBigram(models.Model):
@@ -321,7 +325,7 @@ class TweetImage(models.Model):
     
 class URLTweetImage(TweetImage):
     # URL to original image.
-    url = models.URLField()
+    url = models.URLField(db_index = True)
     
     objects = GetOrNoneManager()
     
@@ -329,7 +333,7 @@ class URLTweetImage(TweetImage):
 class FlickrTweetImage(TweetImage):
     ''' Tweet image from Flickr.'''
     # Flickr ID of the image
-    flickr_id = models.CharField(max_length = 200)
+    flickr_id = models.CharField(max_length = 200, db_index = True)
     # Flick user id
     flickr_user_id = models.CharField(max_length = 200)
     # Screen name of Flickr user.
@@ -370,8 +374,8 @@ class Tweet(models.Model):
         | reasoning (TextField): Varying reasoning arguments.
         
     """
-    tweeted = models.DateTimeField(auto_now_add = True)
-    message = models.CharField(max_length = 160)
+    tweeted = models.DateTimeField(auto_now_add = True, db_index = True)
+    message = models.CharField(max_length = 160, db_index = True)
     muse = models.CharField(max_length = 100, default = "None")
     context = models.CharField(max_length = 100, default = "None")
     color_code = models.CharField(max_length = 10, default = "0xffffff")
@@ -389,7 +393,7 @@ class Tweet(models.Model):
 
 class ArticleTweet(Tweet):
     image = models.ForeignKey(FlickrTweetImage)
-    article = models.URLField()
+    article = models.URLField(db_index = True)
     objects = GetOrNoneManager()
      
         
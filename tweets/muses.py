@@ -28,17 +28,16 @@ from abc import ABCMeta
 if 'DJANGO_SETTINGS_MODULE' not in os.environ:
     sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
     os.environ['DJANGO_SETTINGS_MODULE'] = 'TwatBot.settings'
-from django.conf import settings
 from django.utils import timezone
 
 from reasoning import Reasoning
 from new_age import NewAgePersonality
 from models import EveryColorBotTweet
-from models import Tweet
 from models import ArticleTweet
 
 from tweets.web import rss
 from tweets.utils import color
+from tweets import registry, memory
 
 logger = logging.getLogger("tweets.default")
 
@@ -110,7 +109,7 @@ class EveryColorBotMuse(Muse):
         """
         choices = self.get_choices()
         reasoning = Reasoning()
-        if len(choices) == 0: 
+        if not choices.exists(): 
             logger.info("EveryColorBotMuse could not find untweeted colors from its current choices. Tweet generation halted.")
             return reasoning 
         mood = NewAgePersonality().get_mood()
@@ -120,13 +119,13 @@ class EveryColorBotMuse(Muse):
             logger.info("EveryColorBot could not find color close (closest:  ) enough its aura. Tweet generation halted".format(dist))
             return reasoning
         
-        chtml = choice.color.html
+        chtml = choice['html']
         logger.info("EveryColorBotMuse choose color {} because it was closest to aura color {}, distance: {}".format(chtml, color.rgb2html(aura), dist))
-        if not self.approve_color(chtml):  
+        if not self.approve_color(chtml, memory.of(reasoning)):  
             return reasoning
          
-        chex = choice.color.hex
-        d = {'color_code': chtml, 'retweet':True, 'retweet_url':choice.url,\
+        chex = choice['hex']
+        d = {'color_code': chtml, 'retweet':True, 'retweet_url':choice['url'],\
              'screen_name': 'everycolorbot', 'original_tweet': chex,\
              'muse': self, 'values': {'muse': dist / 100},\
              'mood': mood,  'media': None}
@@ -136,14 +135,28 @@ class EveryColorBotMuse(Muse):
         
         
     def choose_color(self, aura_color, choices):
-        """Choose EveryColorBotTweet which is closest to the given aura color."""
-        color_list = []
-        map(lambda ch: color_list.append(ch.color.html), choices)
-        dist, color_code = color.get_closest(aura_color, color_list)
-        choice = choices.filter(color__html = color_code)[0]
+        """Choose EveryColorBotTweet which is closest to the given aura color.
+        
+        Colors' stored Lab-values are fetched for all the choices with one 
+        query and their distances to the aura color are calculated at once.
+        If several choices are equally close, the first one is chosen.
+        
+        **Returns:**
+            Tuple, (distance, choice), where choice is a dict with keys *id*, 
+            *url*, *html* and *hex*. Choice is None if there are no choices or 
+            the closest one is not close enough to the aura color.
+        """
+        rows = list(choices.values_list('id', 'url', 'color__html', 'color__hex', 'color__l', 'color__a', 'color__b'))
+        if len(rows) == 0:
+            return (0, None)
+        index = color.LabIndex(range(len(rows)), [r[4:] for r in rows])
+        dists = index.distances(aura_color)
+        i = int(dists.argmin())
+        dist = float(dists[i])
         if dist > self.color_threshold:
             return (0, None)
-        return (dist, choice)
+        pk, url, html, chex = rows[i][:4]
+        return (dist, {'id': pk, 'url': url, 'html': html, 'hex': chex})
             
         
     def get_choices(self):
@@ -169,12 +182,12 @@ class EveryColorBotMuse(Muse):
         return choices
     
     
-    def approve_color(self, chtml):
+    def approve_color(self, chtml, mem = None):
         """Confirm that not too similar color has been tweeted in recent
-        tweets."""
-        last_tweets = Tweet.objects.all()[:5]
-        for t in last_tweets:
-            dist = color.ed(t.color_code, chtml)
+        tweets of the memory."""
+        if mem is None: mem = memory.current()
+        dists = mem.color_distances(chtml, 5)
+        for t, dist in zip(mem.recent(5), dists):
             if  dist < 15:
                 logger.info("Similar color {} (distance: {}) was Tweeted recently. Tweet generation halted.".format(t.color_code, dist))
                 return False
@@ -182,6 +195,16 @@ class EveryColorBotMuse(Muse):
             
             
 class RSSMuse(Muse):
+    '''Muse reacting to news articles read from RSS feeds.
+    
+    :param lazy: Download only the article chosen from the untweeted feed entries, instead of all of them.
+    :type lazy: bool
+    '''
+    #: RSS feed the articles are read from.
+    feed_url = rss.REUTERS_RSS_FEEDS['arts & culture']
+    
+    def __init__(self, lazy = True):
+        self.lazy = lazy
     
     def inspire(self):
         from contexts import MonkeyImageContext
@@ -194,7 +217,7 @@ class RSSMuse(Muse):
             
         nap = NewAgePersonality()
         mood = nap.get_mood()
-        em, nn, vec = nap.react(a['text'], settings.WORD2VEC_MODEL)
+        em, nn, vec = nap.react(a['text'], registry.get('word2vec'))
         logger.info("Developed reaction '{}' for article '{}...'".format(em, a['title'][:30]))
         vlen = math.sqrt(vec[0]**2 + vec[1]**2 + vec[2]**2)
         d = {'color_code': '#ffffff', 'retweet':False, 'muse': self,\
@@ -204,18 +227,34 @@ class RSSMuse(Muse):
         return reasoning
         
     def select_article(self):
-                # Read articles
-        logging.info("RSSMuse is reading articles from top news") 
-        articles = rss.get_articles(rss.REUTERS_RSS_FEEDS['arts & culture'], amount = 10)
-        untweeted = []
-        for ar in articles:
-            mar = ArticleTweet.objects.get_or_none(article = ar['url'])
-            if mar is None:
-                untweeted.append(ar)
-                
-        if len(untweeted) == 0: return None
-        a = random.choice(untweeted)
-        return a
+        '''Select random untweeted article from the feed.
+        
+        In lazy mode feed entries are first filtered against already tweeted
+        articles, and then the chosen entry's article is downloaded and parsed. 
+        If that fails, the next random entry is tried.
+        
+        :returns: dict -- Article in the format of :py:func:`rss.get_articles`, or None if no untweeted article could be read.
+        '''
+        logger.info("RSSMuse is reading articles from {}".format(self.feed_url))
+        if not self.lazy:
+            articles = rss.get_articles(self.feed_url, amount = 10)
+            untweeted = self._untweeted(articles, lambda a: a['url'])
+            return random.choice(untweeted) if len(untweeted) > 0 else None
+        
+        entries = self._untweeted(rss.get_feed(self.feed_url, max_items = 10), lambda e: e['link'])
+        random.shuffle(entries)
+        for entry in entries:
+            a = rss.get_article(entry)
+            if a is not None:
+                return a
+        return None
+    
+    
+    def _untweeted(self, items, get_url):
+        '''Filter items whose URL has been tweeted with one query.'''
+        urls = [get_url(i) for i in items]
+        tweeted = set(ArticleTweet.objects.filter(article__in = urls).values_list('article', flat = True))
+        return [i for i in items if get_url(i) not in tweeted]
         
         
         
\ No newline at end of file
@@ -18,6 +18,7 @@ from colormath.color_objects import sRGBColor, LabColor
 from tweets.utils import color as cu
 from tweets.utils.text import bag_of_words, sentiment
 from web import therex, uclass
+from tweets import word2vec
 import loevheim_cube
 
 # Precision used when describing the moon's phase in textual format,
@@ -230,16 +231,24 @@ TOPIC_VECTORS = {
 }
 
 
+# Mood colors and their stereotype emotions in fixed order for the similarity index.
+_MOOD_MAPPINGS = [(v['stereotype'][0], k) for k,v in mood_colors.items()]
+
+
 def get_closest_mood_color(emotion, model):
-    mappings = [(v['stereotype'][0], k) for k,v in mood_colors.items()]
-    closest = mappings[0][0]
-    sim = model.similarity(emotion, mappings[0][0])
-    for m in mappings:
-        s = model.similarity(emotion, m[0])
-        if s > sim:
-            sim = s
-            closest = m[1]
-    return closest
+    '''Get mood color whose stereotype emotion is most similar to the emotion.
+    
+    :param emotion: Emotion
+    :type emotion: str or unicode
+    :param model: Model to calculate similarities
+    :type model: Word2Vec or similar
+    :returns: str -- Mood color's html code, or None if none of the stereotype emotions are in the model.
+    '''
+    index = word2vec.similarity_index(model, 'mood_colors', [(m[0],) for m in _MOOD_MAPPINGS])
+    sims = index.similarities(emotion)
+    if np.all(np.isnan(sims)):
+        return None
+    return _MOOD_MAPPINGS[int(np.nanargmax(sims))][1]
         
     
 
@@ -294,15 +303,21 @@ class NewAgePersonality():
         :type model: Word2Vec or similar
         :returns: str -- Reaction.
         '''
+        topic_vector, bow = self._reaction_vector(text, model)
+        em = loevheim_cube.get_closest(topic_vector, vector = True)[0]
+        return (em, bow[:3], topic_vector)
+    
+    
+    def _reaction_vector(self, text, model):
+        '''Reaction vector and bag of words for the text, see :py:func:`react`.'''
         point = loevheim_cube.map_stimulation(self.emotion, model)
         bow = bag_of_words(text, counts = True)
         words = map(lambda x: x[0], bow)
-        ret = uclass.mood([text])
-        mood = ret[0][2]
+        ret = uclass.classify_many([text], ['mood', 'values'])
+        mood = ret['mood'][0][2]
         topic_vector = self.topic_reaction_vector(model, words, mood)
-        values = uclass.values([text])[0][2]
-        em = loevheim_cube.get_closest(topic_vector, vector = True)[0]
-        return (em, bow[:3], topic_vector)
+        values = ret['values'][0][2]
+        return topic_vector, bow
         
     
     def get_mood(self):
@@ -487,9 +502,15 @@ class NewAgePersonality():
             sys.stdout.flush()
             ret = rss.get_articles(url, amount = 3)
             for r in ret:
-                em, nn, vector = self.react(r['text'], model)
-                article_maps[feed.upper() + ": " + r['title']] = (em, nn, vector)
+                vector, bow = self._reaction_vector(r['text'], model)
+                article_maps[feed.upper() + ": " + r['title']] = (bow[:3], vector)
         print "done."
+        # Reactions for all articles at once.
+        keys = article_maps.keys()
+        closest = loevheim_cube.get_closest_many([article_maps[k][1] for k in keys], vector = True)
+        for k, c in zip(keys, closest):
+            nn, vector = article_maps[k]
+            article_maps[k] = (c[0], nn, vector)
         titles = []
         X = []
         Y = []
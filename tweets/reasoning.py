@@ -29,6 +29,7 @@ class Reasoning():
     * context: class instance of the used Context
     * color_semantics: class instance of the used ColorSemantics.
     * values (dict): dictionary of the appreciation values generated during the tweet's construction.   
+    * memory: :py:class:`memory.Memory` of the recent tweets, shared by the muse, context and color semantics. 
     '''
     def __init__(self, **kwargs):
         self.color_code = ""
@@ -47,6 +48,7 @@ class Reasoning():
         self.values = {}
         self.media = None
         self.appreciation = 0.0
+        self.memory = None
         
     
         
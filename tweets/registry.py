@@ -0,0 +1,174 @@
+'''
+.. py:module:: registry
+    :platform: Unix
+
+Lazy loading of the app's heavy resources.
+
+Resources, e.g. color semantics tables, WordNet and Word2Vec model, are
+registered with a loader function and loaded only when they are first used,
+so that importing the app's modules (e.g. for ``manage.py`` commands, migrations
+or the admin) does not load them. Loading times are logged and can be listed
+with :py:func:`report` or with ``python manage.py resource_report``.
+
+Intended usage::
+
+    >>>from tweets import registry
+    >>>registry.register('wordnet', load_wordnet)
+    >>>WORDNET = registry.lazy('wordnet')   # Nothing is loaded yet.
+    >>>WORDNET.synsets('color')            # Loaded on first use.
+'''
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from django.utils.functional import SimpleLazyObject
+
+logger = logging.getLogger('tweets.default')
+
+_resources = OrderedDict()
+_lock = threading.RLock()
+
+
+class Resource():
+    '''Registered resource and its loading information.'''
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.value = None
+        self.loaded = False
+        self.load_time = 0.0
+        self.loaded_at = None
+
+
+def register(name, loader):
+    '''Register new resource with given name.
+
+    Registering a resource again with the same name replaces the old one
+    (and its loaded value).
+
+    :param name: Name of the resource
+    :type name: str
+    :param loader: Function without arguments, which loads and returns the resource.
+    :type loader: callable
+    '''
+    with _lock:
+        _resources[name] = Resource(name, loader)
+
+
+def unregister(name):
+    '''Remove resource with given name, e.g. one registered in tests. Unknown
+    names are ignored.'''
+    with _lock:
+        _resources.pop(name, None)
+
+
+def get(name):
+    '''Get resource with given name, loading it first if needed.
+
+    :param name: Name of a registered resource
+    :type name: str
+    :returns: Loaded resource
+    :raises: KeyError if no resource with the name has been registered.
+    '''
+    res = _resources[name]
+    if res.loaded:
+        return res.value
+    with _lock:
+        if not res.loaded:
+            logger.info("Loading resource '{}'".format(name))
+            start = time.time()
+            res.value = res.loader()
+            res.load_time = time.time() - start
+            res.loaded_at = time.time()
+            res.loaded = True
+            logger.info("Loaded resource '{}' in {:.2f} seconds.".format(name, res.load_time))
+    return res.value
+
+
+def lazy(name):
+    '''Get proxy object for the resource, which loads the resource on first use.
+
+    :param name: Name of the resource, the resource does not have to be registered yet.
+    :type name: str
+    :returns: SimpleLazyObject -- proxy for the resource.
+    '''
+    return SimpleLazyObject(lambda: get(name))
+
+
+def is_loaded(name):
+    '''Has resource with given name been loaded.'''
+    return name in _resources and _resources[name].loaded
+
+
+def load_all():
+    '''Load all registered resources.'''
+    for name in _resources.keys():
+        get(name)
+
+
+def report():
+    '''Loading report of the registered resources.
+
+    :returns: list -- (name, loaded, load time in seconds)-tuples in registration order.
+    '''
+    return [(r.name, r.loaded, r.load_time) for r in _resources.values()]
+
+
+def format_report():
+    '''Loading report of the registered resources as human readable string.'''
+    lines = ["{:<20}{:<10}{}".format('Resource', 'Loaded', 'Time (s)')]
+    total = 0.0
+    for name, loaded, load_time in report():
+        lines.append("{:<20}{:<10}{:.2f}".format(name, 'yes' if loaded else 'no', load_time))
+        total += load_time
+    lines.append("{:<30}{:.2f}".format('Total', total))
+    return "\n".join(lines)
+
+
+def _load_wordnet():
+    from nltk.corpus import wordnet
+    # WordNet corpus reader is loaded on first access.
+    wordnet.synsets('color')
+    return wordnet
+
+
+def _load_word_tokenize():
+    from nltk import word_tokenize
+    return word_tokenize
+
+
+def _load_pos_tag():
+    from nltk import pos_tag
+    return pos_tag
+
+
+def _load_word2vec():
+    from django.conf import settings
+    from tweets import word2vec
+    path = getattr(settings, 'WORD2VEC_VECTORS_PATH', '')
+    if path and word2vec.exists(path):
+        return word2vec.VectorModel.load(path)
+    if len(settings.WORD2VEC_MODEL_PATH) == 0:
+        return None
+    logger.warning("Word2Vec vectors have not been exported, loading the whole gensim model. Run 'manage.py export_word2vec' to use memory-mapped vectors.")
+    import gensim
+    return gensim.models.Word2Vec.load(settings.WORD2VEC_MODEL_PATH)
+
+
+def _load_wordnet_cache():
+    from tweets import wordnet
+    return wordnet.load()
+
+
+def _load_wisdom_pool():
+    from tweets import wisdom_pool
+    return wisdom_pool.load_pool()
+
+
+register('wordnet', _load_wordnet)
+register('wordnet_cache', _load_wordnet_cache)
+register('word_tokenize', _load_word_tokenize)
+register('pos_tag', _load_pos_tag)
+register('word2vec', _load_word2vec)
+register('wisdom_pool', _load_wisdom_pool)
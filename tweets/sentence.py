@@ -1,60 +1,140 @@
 '''
 .. py:module:: sentence
     :platform: Unix
-    
+
 Text generation for new age context.
+
+The templates in :py:mod:`vocab` are compiled once into lists of literal
+words and vocabulary slots (see :py:class:`Template`), and vocabulary items are
+formatted beforehand, so that generating a sentence only picks random words
+and joins them. Sentences are formatted the same way as before compiling the
+templates: the first letter is capitalized, a period is added if the sentence
+does not end in punctuation, there are no spaces before punctuation or after
+prefixes (e.g. 'ultra-') and 'a' is changed into 'an' before vowels.
+
+:py:func:`generate_batch` generates reproducible batches of sentences with its
+own random generator.
 '''
 import random
 import re
 from vocab import *
 
+PUNCTUATION = '.,;?!'
+_VOWELS = frozenset('aeiou')
 
-def _random_word(pos):
-    r = random.randint(0, len(vocabs[pos]) - 1)
-    return vocabs[pos][r]
-
-
-def _fix_format(sentence):
-    sentence = sentence.strip()
-    # Capitalize
-    sentence = sentence[0].upper() + sentence[1:]
-    # Add last punctuation if missing.
-    if sentence[-1] not in '.!?':
-        sentence += '.';
-    
-    # Strip possible spaces before punctuation
-    result = re.sub('( [,.;\?!])', lambda x: x.group(0)[-1], sentence);
-    # Try to fix 'a epic' to 'an epic'. Not fool proof as naively only considers
-    # if the next word starts with a vowel or not.
-    result = re.sub('(^|\W)([Aa]) ([aeiou])', lambda x: x.group(1)+x.group(2)+"n "+x.group(3), result)
-    # take care of prefixes (delete the space after the hyphen)
-    result = re.sub('([^- ])- ', lambda x: x.group(1)+'-', result);
-    return result
-
-
-def generate_sentence():
-    template = random.choice(templates)
-    template = re.sub('[.,;?!]', lambda x: " "+x.group(0), template)
-    template = template.split(" ")
-    result = ""
-    
-    for s in template:
-        if s in vocabs:
-            result += _random_word(s)
-        else:
-            result += s;
-        result += ' ';
-    
-    return _fix_format(result)
-
-
-def generate_text(ns):
-    text = reduce(lambda x,y: " ".join([x, generate_sentence()]), xrange(ns), "")
-    return text.strip()
+_SPACED = re.compile('( [,.;\?!])')
+_ARTICLE = re.compile('(^|\W)([Aa]) ([aeiou])')
+_PREFIX = re.compile('([^- ])- ')
 
 
-if __name__ == '__main__':
-    print generate_sentence()
+def tokenize_template(template):
+    '''Split template into words, separating punctuation into their own tokens.'''
+    return re.sub('[.,;?!]', lambda x: " "+x.group(0), template).split(" ")
+
+
+def _format_item(item):
+    item = _SPACED.sub(lambda x: x.group(0)[-1], item)
+    item = _ARTICLE.sub(lambda x: x.group(1)+x.group(2)+"n "+x.group(3), item)
+    return _PREFIX.sub(lambda x: x.group(1)+'-', item)
+
+
+def _glues(word):
+    '''Is the next word written without a space after the word, i.e. is the word a prefix.'''
+    return len(word) > 1 and word[-1] == '-' and word[-2] not in '- '
+
+
+class Template():
+    '''Sentence template compiled into literal words and vocabulary slots.
+
+    **Args:**
+        | template (str): Template with vocabulary names, e.g. ``'Nothing is impossible for <> nPerson'``.
+        | vocabs (dict): Vocabulary name -> list of words.
+    '''
+    def __init__(self, template, vocabs = vocabs):
+        self.template = template
+        #: Words of the sentence, vocabulary slots are None.
+        self.tokens = []
+        #: (token index, words)-pairs for each vocabulary slot.
+        self.slots = []
+        #: Indices of the articles, which are changed into 'an' before vowels.
+        self.articles = []
+        for token in tokenize_template(template):
+            if token in vocabs:
+                self.slots.append((len(self.tokens), [_format_item(w) for w in vocabs[token]]))
+                self.tokens.append(None)
+            else:
+                if token in ('a', 'A'):
+                    self.articles.append(len(self.tokens))
+                self.tokens.append(token)
+
+    def fill(self, rng = random):
+        '''Fill the slots with random words from their vocabularies.
+
+        **Returns:**
+            str, formatted sentence.
+        '''
+        words = list(self.tokens)
+        for i, vocab in self.slots:
+            words[i] = rng.choice(vocab)
+        for i in self.articles:
+            if i + 1 < len(words) and words[i + 1][:1] in _VOWELS:
+                words[i] += 'n'
+        parts = []
+        glue = True
+        for w in words:
+            if not glue and not (len(w) == 1 and w in PUNCTUATION):
+                parts.append(' ')
+            parts.append(w)
+            glue = _glues(w)
+        sentence = ''.join(parts).strip()
+        if sentence[-1] not in '.!?':
+            sentence += '.'
+        return sentence[0].upper() + sentence[1:]
+
 
+#: Templates of :py:mod:`vocab` compiled once.
+TEMPLATES = [Template(t) for t in templates]
 
 
+def generate_sentence(rng = random):
+    '''Generate one sentence from a random template.
+
+    **Args:**
+        | rng: Random generator, defaults to :py:mod:`random`-module.
+    '''
+    return rng.choice(TEMPLATES).fill(rng)
+
+
+def generate_text(ns = None, rng = random):
+    '''Generate sentences.
+
+    **Args:**
+        | ns (int): Amount of sentences, or None to generate sentences until the generator is closed.
+        | rng: Random generator, defaults to :py:mod:`random`-module.
+
+    **Yields:**
+        str, sentence.
+    '''
+    i = 0
+    while ns is None or i < ns:
+        yield generate_sentence(rng)
+        i += 1
+
+
+def generate_batch(k, seed = None):
+    '''Generate a batch of sentences, the same seed gives the same sentences.
+
+    **Args:**
+        | k (int): Amount of sentences.
+        | seed: Seed of the batch's own random generator, None seeds it randomly.
+
+    **Returns:**
+        list of sentences.
+    '''
+    rng = random.Random(seed)
+    return [generate_sentence(rng) for _ in xrange(k)]
+
+
+if __name__ == '__main__':
+    print generate_sentence()
+
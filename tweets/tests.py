@@ -4,16 +4,50 @@
     
 Some tests for app's core functionalities, i.e. color manipulations.
 """
+import os
+import time
+import base64
+import threading
+import shutil
+import tempfile
+from contextlib import contextmanager
+from StringIO import StringIO
+from xml.etree import ElementTree as ET
+import numpy as np
+from django.db import connection
 from django.utils import unittest
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
 
 from tweets.utils import color as cu
+from tweets import registry, memory
+from tweets import word2vec, wisdom_pool, wordnet, sentence
+from tweets import emotions, loevheim_cube
+from tweets.web import therex, twitter, uclass, rss
+from tweets.utils.cache import DiskCache, BloomFilter
+from tweets.utils import resources
 from color_semantics import ColorSemantics
 
+class QueryBudgetMixin():
+    """Mixin for test cases which check that a code path does not exceed its 
+    database query budget, e.g. when the tables grow."""
+    
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        """Fail if more than ``budget`` queries are made inside the with-block."""
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        queries = context.captured_queries
+        self.assertTrue(len(queries) <= budget, "{} queries exceed the budget of {}:\n{}".format(
+                        len(queries), budget, "\n".join(q['sql'] for q in queries)))
+
+
 class ColorUtilsTestCase(TestCase):
     """Test case for color_utils-module."""
     
     def setUp(self):
+        # Compare against exact values, not the ones in precomputed lookup table.
+        self.lab_table = cu.unload_lab_table()
         #TODO: randomize colors for some of the tests.
         self.html1 = "#ffffff"
         self.html2 = u'#000000'
@@ -27,6 +61,9 @@ class ColorUtilsTestCase(TestCase):
         self.rrgb = (255, 0, 0);
         self.lab1 = (1.0, 1.0, 1.0)
         self.lab2 = (0.0, 0.0, 0.0)
+        
+    def tearDown(self):
+        cu.restore_lab_table(self.lab_table)
     
     
     def test_color_validations(self):
@@ -74,18 +111,788 @@ class ColorUtilsTestCase(TestCase):
         self.assertEquals(cu.blend(self.hex1, self.rgb2, a_head = 0.0), (0, 0, 0), "color_utils.blend broken")
         self.assertEquals(cu.blend(self.html1, self.hex2), (119, 119, 119), "color_utils.blend broken")
         self.assertEquals(cu.blend(self.rrgb, self.brgb), (202, 0, 137), "color_utils.blend broken")
+
+
+    def test_batch_color_math(self):
+        """Test batch color functions against colormath's values."""
+        colors = [self.html1, self.hex2, self.brgb, self.rrgb]
+        labs = cu.to_lab_array(colors)
+        self.assertEquals(labs.shape, (4, 3), "color_utils.to_lab_array broken")
+        # Lab-values (D65) given by colormath's convert_color(sRGBColor, LabColor).
+        reference = [(99.99998453333127, -0.0004593894083471106, -0.008561457924405325),
+                     (0.0, 0.0, 0.0),
+                     (32.299375201436156, 79.1913962872024, -107.86546414496824),
+                     (53.23896002513146, 80.09045298802708, 67.2013836595967)]
+        for i, ref in enumerate(reference):
+            for j, v in enumerate(ref):
+                self.assertAlmostEqual(labs[i][j], v, places = 6, msg = "color_utils.to_lab_array broken")
+        self.assertEquals(cu.lab_to_rgb_array(reference, illuminant = 'd65').tolist(), 
+                          [[255, 255, 255], [0, 0, 0], [0, 0, 255], [255, 0, 0]], "color_utils.lab_to_rgb_array broken")
+        self.assertRaises(ValueError, cu.lab_to_rgb_array, reference, illuminant = 'a')
+        dists = cu.pairwise_ed(colors, [self.rgb2])
+        self.assertEquals(dists[0][0], 99.99998490087933, "color_utils.pairwise_ed broken")
+        self.assertEquals(dists[1][0], 0.0, "color_utils.pairwise_ed broken")
+        blends = cu.blend_many([self.rrgb, self.html1], [self.brgb, self.hex2])
+        self.assertEquals([tuple(b) for b in blends], [(202, 0, 137), (119, 119, 119)], "color_utils.blend_many broken")
+        closest = cu.closest_many([self.rgb1, (10, 0, 250)], [self.rrgb, self.brgb, self.html1])
+        self.assertEquals(closest[0], (0.0, self.html1), "color_utils.closest_many broken")
+        self.assertEquals(closest[1][1], self.brgb, "color_utils.closest_many broken")
+        
+    def test_lab_table_lookup(self):
+        """Test that table lookups round fractional and calculate out of range rgb-values."""
+        cu.restore_lab_table((FakeLabTable(), True))
+        labs = cu.to_lab_array(np.array([(0.0, 0.0, 1.6), (0.0, 1.0, 0.4), (-3.0, 0.0, 0.0)]))
+        self.assertEquals(labs[:2, 0].tolist(), [2.0, 256.0], "color_utils.to_lab_array table lookup broken")
+        self.assertEquals(labs[2].tolist(), cu._rgb2lab(np.array([(-3.0, 0.0, 0.0)]))[0].tolist(), "out of range color was looked up from the table")
+        
+        
+class FakeLabTable():
+    """Lookup table whose 'Lab-values' are the table indices."""
+    def __getitem__(self, i):
+        return np.column_stack((i, i, i))
+
+
+class RegistryTestCase(TestCase):
+    """Test case for registry-module."""
+    
+    def tearDown(self):
+        registry.unregister('_test')
+        
+    def test_lazy_loading(self):
+        """Test that resources are loaded only on first use."""
+        calls = []
+        registry.register('_test', lambda: calls.append(1) or [u'loaded'])
+        res = registry.lazy('_test')
+        self.assertFalse(registry.is_loaded('_test'), "registry.lazy broken")
+        self.assertEquals(res.index(u'loaded'), 0, "registry.lazy broken")
+        self.assertEquals(registry.get('_test'), [u'loaded'], "registry.get broken")
+        self.assertTrue(registry.is_loaded('_test'), "registry.get broken")
+        self.assertEquals(len(calls), 1, "registry.get broken")
+        self.assertTrue('_test' in [r[0] for r in registry.report()], "registry.report broken")
+        registry.unregister('_test')
+        self.assertFalse('_test' in [r[0] for r in registry.report()], "registry.unregister broken")
+
+
+class EmotionsTestCase(TestCase):
+    """Test case for emotions- and loevheim_cube-modules."""
     
+    def test_closest_emotions(self):
+        """Test that emotions' own points are closest to them."""
+        names = emotions.EMOTION_NAMES[:10]
+        points = [emotions.get_point(e) for e in names]
+        self.assertEquals(points[0], emotions.EMOTIONS[0][1], "emotions.get_point broken")
+        self.assertEquals(emotions.get_point('isupposethisisnotanemotion'), None, "emotions.get_point broken")
+        closest = loevheim_cube.get_closest_many(points)
+        self.assertEquals([c[0] for c in closest], names, "loevheim_cube.get_closest_many broken")
+        scaled = np.array(points[1]) * 3
+        self.assertEquals(loevheim_cube.get_closest(scaled), closest[1], "loevheim_cube.get_closest broken")
+
+
+class TherexTestCase(TestCase):
+    """Test case for therex-module with recorded responses."""
+    
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = DiskCache(os.path.join(self.folder, 'therex.sqlite'))
+        therex.set_cache(self.cache)
+        self.response = '<Result><Members><Member weight="12">joy</Member><Member weight="40">hope</Member></Members>'\
+                        '<Modifiers><Modifier weight="3">great</Modifier></Modifiers><CategoryHeads></CategoryHeads></Result>'
+        
+    def tearDown(self):
+        therex.set_cache(None)
+        shutil.rmtree(self.folder)
+        
+    def test_cached_categories(self):
+        """Test that cached responses and failures are used."""
+        self.cache.put(therex._build_url('positive', 'emotion', category = True), self.response)
+        self.cache.put_failure(therex._build_url('isupposethisisnotaword'))
+        ret = therex.categories('positive:emotion')
+        self.assertEquals(ret['Members'], [('hope', 40), ('joy', 12)], "therex.categories broken")
+        self.assertEquals(ret['Modifiers'], [('great', 3)], "therex.categories broken")
+        many = therex.categories_many(['positive:emotion', 'isupposethisisnotaword'], workers = 2)
+        self.assertEquals(many['positive:emotion'], ret, "therex.categories_many broken")
+        self.assertEquals(many['isupposethisisnotaword'], None, "therex.categories_many broken")
+        self.assertEquals(self.cache.get('isnotcached'), (False, None), "DiskCache.get broken")
+
+
+class RSSTestCase(TestCase):
+    """Test case for rss-module with faked downloads."""
+    
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.feed_cache = rss._feed_cache
+        rss._feed_cache = DiskCache(os.path.join(self.folder, 'rss.sqlite'))
+        self.urlopen = rss.urllib2.urlopen
+        rss.urllib2.urlopen = self.fake_urlopen
+        self.opened = []
+        entries = [{'title': 'Article {}'.format(i), 'link': 'http://example.com/{}'.format(i)} for i in range(4)]
+        rss._feed_cache.put('feed', {'etag': None, 'modified': None, 'entries': entries, 'refreshed': time.time()})
+        
+    def tearDown(self):
+        rss.close_parse_pool()
+        rss.PARSE_PROCESSES = None
+        rss.urllib2.urlopen = self.urlopen
+        rss._feed_cache = self.feed_cache
+        shutil.rmtree(self.folder)
+        
+    def fake_urlopen(self, url, timeout = None):
+        """Article 2 can not be downloaded, others have their URL as text."""
+        self.opened.append(url)
+        if url.endswith('/2'):
+            raise IOError("Connection refused")
+        html = '<html><body><div id="articleText"><p>Text of\n{}</p><p>Reporter</p></div></body></html>'.format(url)
+        return StringIO(html)
+        
+    def test_get_articles(self):
+        """Test that articles are downloaded and parsed in the feed's order."""
+        articles = rss.get_articles('feed', amount = 3, bow = False)
+        self.assertEquals(sorted(self.opened), ['http://example.com/0', 'http://example.com/1', 'http://example.com/2'])
+        self.assertEquals([a['title'] for a in articles], ['Article 0', 'Article 1'], "rss.get_articles broken")
+        self.assertEquals(articles[1]['text'], 'Text of http://example.com/1', "rss.get_articles broken")
+        pool = rss.get_parse_pool()
+        self.assertTrue(pool is not None, "rss.get_parse_pool broken")
+        self.assertEquals(len(rss.get_articles('feed', bow = False)), 3, "rss.get_articles broken")
+        self.assertTrue(rss.get_parse_pool() is pool, "parse pool was not reused")
+        rss.PARSE_PROCESSES = 0
+        self.assertEquals(rss.get_articles('feed', amount = 3, bow = False), articles, "parsing in the calling process broken")
+        first = next(rss.iter_articles('feed', bow = False, workers = 2))
+        self.assertTrue(first['url'] in ('http://example.com/0', 'http://example.com/1', 'http://example.com/3'))
+        self.assertRaises(ValueError, rss.get_articles, 'feed', url_type = 'isnotaformat')
+
+
+class UClassifyTestCase(TestCase):
+    """Test case for uclass-module's client with faked requests."""
+    
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.client = uclass.Client('key', cache = DiskCache(os.path.join(self.folder, 'uclass.sqlite')))
+        self.client._post = self.fake_post
+        self.bodies = []
+        self.response = None
+        
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        
+    def fake_post(self, body):
+        """Answer each classify call of the request with the text's length as the probability."""
+        self.bodies.append(body)
+        if self.response is not None:
+            return self.response
+        ns = '{http://api.uclassify.com/1/RequestSchema}'
+        root = ET.fromstring(body)
+        texts = dict((e.attrib['id'], base64.b64decode(e.text)) for e in root.iter(ns + 'textBase64'))
+        xml = ['<uclassify xmlns="http://api.uclassify.com/1/ResponseSchema" version="1.01">',
+               '<status success="true" statusCode="2000"/>', '<readCalls>']
+        for e in root.iter(ns + 'classify'):
+            xml.append('<classify id="{}"><classification textCoverage="1">'.format(e.attrib['id']))
+            xml.append('<class className="{}" p="{}"/>'.format(e.attrib['classifierName'], len(texts[e.attrib['textId']])))
+            xml.append('</classification></classify>')
+        xml.append('</readCalls></uclassify>')
+        return "".join(xml)
+        
+    def test_classify_many(self):
+        """Test that texts are classified with all classifiers in one request."""
+        ret = self.client.classify_many([u'joy', u'sorrow', u'joy'], ['mood', 'values'])
+        self.assertEquals(len(self.bodies), 1, "uclass.Client sent more than one request")
+        self.assertEquals(self.bodies[0].count('<textBase64'), 2, "uclass.Client sent duplicate texts")
+        self.assertEquals(self.bodies[0].count('<classify '), 4, "uclass.Client broken")
+        self.assertEquals(ret['mood'], [('joy', '1', [('Mood', '3')]), ('sorrow', '1', [('Mood', '6')]),
+                                        ('joy', '1', [('Mood', '3')])], "uclass.Client broken")
+        self.assertEquals(ret['values'][1], ('sorrow', '1', [('Values', '6')]), "uclass.Client broken")
+        
+    def test_cached_classifications(self):
+        """Test that cached classifications are not requested again."""
+        first = self.client.classify([u'joy', u'sorrow'], 'mood')
+        self.assertEquals(self.client.classify([u'sorrow', u'joy'], 'mood'), first[::-1], "uclass.Client cache broken")
+        self.assertEquals(len(self.bodies), 1, "uclass.Client did not use the cache")
+        self.client.classify_many([u'joy', u'hope'], ['mood', 'sentiment'])
+        self.assertEquals(len(self.bodies), 2, "uclass.Client broken")
+        self.assertEquals(self.bodies[1].count('<textBase64'), 2, "uclass.Client broken")
+        self.assertEquals(self.bodies[1].count('<classify '), 3, "uclass.Client requested cached classifications")
+        self.assertRaises(KeyError, self.client.classify, [u'joy'], 'isnotaclassifier')
+        
+    def test_errors(self):
+        """Test that failed and incomplete responses raise ClassifyError and are not cached."""
+        self.response = '<uclassify xmlns="http://api.uclassify.com/1/ResponseSchema" version="1.01">'\
+                        '<status success="false" statusCode="4000">Invalid key</status></uclassify>'
+        self.assertRaises(uclass.ClassifyError, self.client.classify, [u'joy'], 'mood')
+        self.response = '<uclassify xmlns="http://api.uclassify.com/1/ResponseSchema" version="1.01">'\
+                        '<status success="true" statusCode="2000"/><readCalls></readCalls></uclassify>'
+        self.assertRaises(uclass.ClassifyError, self.client.classify, [u'joy'], 'mood')
+        self.response = None
+        self.assertEquals(self.client.classify([u'joy'], 'mood'), [('joy', '1', [('Mood', '3')])], "uclass.Client broken")
+        self.assertEquals(len(self.bodies), 3, "uclass.Client cached a failure")
+
+
+class FakeTwitterTestCase(TestCase):
+    """Test case for the fake Twitter client."""
+    
+    def test_timelines(self):
+        """Test posting and reading the fake timelines."""
+        client = twitter.FakeClient(screen_name = 'bot')
+        first = client.add_status(u'0xffffff http://t.co/a', screen_name = 'everycolorbot')
+        client.update_status(u'First tweet')
+        ret = client.update_with_media('image.png', u'Second tweet')
+        self.assertTrue(ret.text.startswith(u'Second tweet http'), "FakeClient.update_with_media broken")
+        self.assertEquals([t.text for t in client.user_timeline('everycolorbot')], [first.text])
+        self.assertEquals(len(client.home_timeline()), 3, "FakeClient.home_timeline broken")
+        self.assertEquals(len(client.home_timeline(since_id = first.id_str)), 2, "FakeClient.home_timeline broken")
+        self.assertEquals(client.me().screen_name, 'bot', "FakeClient.me broken")
+        
+    def test_account_listener(self):
+        """Test that TwitterAccountListener fetches only the new tweets."""
+        from tweets.cron import TwitterAccountListener
+        from tweets.models import EveryColorBotTweet
+        client = twitter.FakeClient()
+        twitter.set_client(client)
+        listener = TwitterAccountListener()
+        listener.page_size = 2
+        try:
+            client.add_status(u'0xffffff http://t.co/a', screen_name = 'everycolorbot')
+            listener.do()
+            self.assertEquals(listener.last_tweet_id(), '1', "TwitterAccountListener broken")
+            for i in range(5):
+                client.add_status(u'0x{:06x} http://t.co/{}'.format(i, i), screen_name = 'everycolorbot')
+            client.add_status(u'Not a color', screen_name = 'someone')
+            listener.do()
+            listener.do()
+        finally:
+            twitter.set_client(None)
+        self.assertEquals(EveryColorBotTweet.objects.count(), 6, "TwitterAccountListener did not backfill the gap")
+        self.assertEquals(listener.last_tweet_id(), '6', "TwitterAccountListener broken")
+        # Colors loaded from color_map.tsv have uppercase html codes.
+        from tweets.models import Color
+        create_color_resources({'bud green': ((176, 191, 26), 'green')})
+        Color.objects.filter(rgb_r = 176, rgb_g = 191, rgb_b = 26).update(html = '#B0BF1A')
+        twitter.set_client(client)
+        try:
+            client.add_status(u'0xb0bf1a http://t.co/bud', screen_name = 'everycolorbot')
+            listener.do()
+        finally:
+            twitter.set_client(None)
+        self.assertEquals(listener.last_tweet_id(), '8', "TwitterAccountListener did not store a known color")
+        self.assertEquals(Color.objects.filter(rgb_r = 176, rgb_g = 191, rgb_b = 26).count(), 1, "TwitterAccountListener duplicated a color")
+        self.assertEquals(EveryColorBotTweet.objects.get(url = u'http://t.co/bud').color.html, '#b0bf1a', "html code was not normalised")
+        # Rows inserted later with lower tweet ids do not move the high-water mark.
+        color = EveryColorBotTweet.objects.all()[0].color
+        for i in range(25):
+            EveryColorBotTweet.objects.create(color = color, url = u'http://t.co/old{}'.format(i), tweet_id = '2', tweet_num = 2)
+        self.assertEquals(listener.last_tweet_id(), '8', "TwitterAccountListener broken")
+
+
+class ResourcesTestCase(TestCase):
+    """Test case for resources_utils-module."""
+    
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        
+    def _write(self, name, lines):
+        path = os.path.join(self.folder, name)
+        with open(path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+        
+    def test_upsert(self):
+        """Test that loading resources again updates the existing rows."""
+        from tweets.models import UnbracketedColorBigram, EveryColorBotTweet, Color
+        path = self._write('bigrams.tsv', ["Word-1\tWord-2\tFrequency", "lemon\ttree\t10", "summer\tstorm\t5", "broken line"])
+        stats = resources.populate_unbracketed_color_bigrams(path)
+        self.assertEquals((stats['read'], stats['created']), (2, 2), "populate_unbracketed_color_bigrams broken")
+        path = self._write('bigrams.tsv', ["Word-1\tWord-2\tFrequency", "lemon\ttree\t12", "summer\tstorm\t5"])
+        stats = resources.populate_unbracketed_color_bigrams(path)
+        self.assertEquals((stats['created'], stats['updated'], stats['unchanged']), (0, 1, 1), "bulk_upsert broken")
+        self.assertEquals(UnbracketedColorBigram.objects.get(w1 = 'lemon', w2 = 'tree').f, 12)
+        
+        path = self._write('tweets.tsv', ["RGB Code\tTwitter URL", "0xcb835d\thttp://t.co/a", "0xcb835d\thttp://t.co/b"])
+        resources.populate_everycolorbot_tweets(path)
+        resources.populate_everycolorbot_tweets(path)
+        self.assertEquals(EveryColorBotTweet.objects.count(), 2, "populate_everycolorbot_tweets created duplicates")
+        color = Color.objects.get(hex = '0xcb835d')
+        lab = cu._2lab(color.html).get_value_tuple()
+        self.assertAlmostEqual(color.l, lab[0], places = 6)
+        
+    def test_split_compounds(self):
+        """Test splitting solid compounds into color names."""
+        names = ['sea', 'seas', 'shell', 'hell', 'blue', '']
+        splits = list(resources.split_compounds(['seashell', 'blueblue', 'bluegreen'], names))
+        self.assertEquals(splits, [('seashell', 'sea', 'shell'), ('seashell', 'seas', 'hell'), ('blueblue', 'blue', 'blue')])
+        
+
+class FakeMuse():
+    """Muse inspiring random values, for testing the tweet core."""
+    def inspire(self):
+        from tweets.reasoning import Reasoning
+        reasoning = Reasoning(color_code = '#000000', media = self.media())
+        reasoning.values['muse'] = np.random.random()
+        reasoning.set_attr('pid', os.getpid())
+        return reasoning
+    
+    def media(self):
+        return FakeMedia()
+    
+    
+class FakeImageMuse(FakeMuse):
+    """Muse attaching temporary image files to its inspirations."""
+    def media(self):
+        return tempfile.NamedTemporaryFile(suffix = '.png')
+    
+    
+class FakeSemantics():
+    def name_color(self, reasoning):
+        reasoning.set_attr('color_name', 'test')
+        return True
+    
+    
+class FakeContext():
+    """Context reading the recent tweets like the real contexts."""
+    def build_tweet(self, reasoning):
+        from tweets import memory
+        memory.of(reasoning).recent(15)
+        reasoning.set_attr('tweet', 'Test tweet')
+        reasoning.values['context'] = 0.1
+        return True
+    
+    
+class FakeMedia():
+    name = 'image.png'
+    
+    
+class QueryBudgetTestCase(TestCase, QueryBudgetMixin):
+    """Test case for the database query budgets of the hot code paths."""
+    
+    def setUp(self):
+        self.twitter = twitter.FakeClient()
+        twitter.set_client(self.twitter)
+        
+    def tearDown(self):
+        twitter.set_client(None)
+        
+    def _add_colors(self, start, n):
+        for i in range(start, start + n):
+            self.twitter.add_status(u'0x{:06x} http://t.co/{}'.format(i, i), screen_name = 'everycolorbot')
+        
+    def test_account_listener(self):
+        """Test that TwitterAccountListener's queries do not grow with the tables."""
+        from tweets.cron import TwitterAccountListener
+        listener = TwitterAccountListener()
+        self._add_colors(0, 50)
+        listener.do()
+        self._add_colors(50, 50)
+        with self.assertQueryBudget(8):
+            listener.do()
+        with self.assertQueryBudget(2):
+            listener.do()
+            
+    def test_tweet(self):
+        """Test TweetCore.tweet's queries when the tweet is sent and saved."""
+        from tweets.core import TweetCore
+        from tweets.reasoning import Reasoning
+        from tweets.models import EveryColorBotTweet, Tweet
+        self._add_colors(0, 20)
+        from tweets.cron import TwitterAccountListener
+        TwitterAccountListener().do()
+        url = EveryColorBotTweet.objects.all()[0].url
+        
+        core = TweetCore(color_semantics = FakeSemantics(), muse = object(), context = FakeContext())
+        reasoning = Reasoning(color_code = '#000000', retweet = True, retweet_url = url, 
+                              screen_name = 'everycolorbot', media = FakeMedia())
+        with self.assertQueryBudget(6):
+            reasoning = core.tweet(send_to_twitter = True, reasoning = reasoning)
+        self.assertTrue(reasoning.tweeted, "TweetCore.tweet broken")
+        self.assertEquals(Tweet.objects.count(), 1)
+        self.assertTrue(EveryColorBotTweet.objects.get(url = url).tweeted)
+        
+    def test_tweet_many(self):
+        """Test that a batch of tweets loads the memory only once."""
+        from tweets.core import TweetCore
+        core = TweetCore(color_semantics = FakeSemantics(), muse = FakeMuse(), context = FakeContext())
+        with self.assertQueryBudget(2):
+            candidates = core.tweet_many(5, workers = 1)
+        self.assertEquals(len(candidates), 5, "TweetCore.tweet_many broken")
+        values = [c.appreciation for c in candidates]
+        self.assertEquals(values, sorted(values), "TweetCore.tweet_many did not rank the candidates")
+        # Workers are not forked inside the test case's transaction.
+        candidates = core.tweet_many(3, workers = 2)
+        self.assertEquals([c.pid for c in candidates], [os.getpid()] * 3, "TweetCore.tweet_many forked inside a transaction")
+        
+    def test_real_components(self):
+        """Test the queries of the real muse, color semantics and context, which must not grow with the tables."""
+        from tweets.models import Tweet, EveryColorBotTweet
+        from tweets.muses import EveryColorBotMuse
+        from tweets.contexts import NewAgeContext
+        from tweets.cron import TwitterAccountListener
+        cache_dir = tempfile.mkdtemp()
+        cache_settings = override_settings(CACHE_DIR = cache_dir)
+        cache_settings.enable()
+        try:
+            create_color_resources({'sea': ((0, 105, 148), 'blue'), 'shell': ((255, 245, 238), 'white'), 
+                                    'grass': ((124, 252, 0), 'green')}, [('sea', 'shell'), ('grass', 'shell'), ('sea', 'grass')])
+            semantics = ColorSemantics()
+        finally:
+            cache_settings.disable()
+            shutil.rmtree(cache_dir)
+        semantics.wn = NoColorWordNet()
+        context = NewAgeContext()
+        muse = EveryColorBotMuse()
+        memory.tweeted_names_index().reset()
+        listener = TwitterAccountListener()
+        for i in range(3):
+            Tweet(message = 'Test tweet {}'.format(i), color_code = '#00{:02x}00'.format(i), color_name = 'coal black').save()
+            self._add_colors(i * 100, 100)
+            listener.do()
+            with self.assertQueryBudget(2):
+                mem = memory.current()
+            with self.assertQueryBudget(1):
+                dist, choice = muse.choose_color((0, 0, 99), EveryColorBotTweet.objects.filter(tweeted = False))
+            self.assertEquals(choice['html'], '#000063', "EveryColorBotMuse.choose_color broken")
+            with self.assertQueryBudget(0):
+                names = semantics.get_knn_blended_unigrams('#006994', k = 2, mem = mem)
+                wisdoms = context._get_wisdoms('sea shell', wisdom_count = 5, mem = mem)
+            self.assertEquals((len(names), names[0][2]), (2, 'sea shell'), "ColorSemantics.get_knn_blended_unigrams broken")
+            self.assertEquals(len(wisdoms), 5, "NewAgeContext._get_wisdoms broken")
+        
+        
+class NoColorWordNet():
+    """WordNet which knows no colors."""
+    def is_color(self, word):
+        return False
+        
+        
+class TweetManyTestCase(TransactionTestCase):
+    """Test case for building candidate tweets in forked worker processes."""
+    
+    def test_forked_workers(self):
+        """Test that workers build different candidates, which are returned with their images."""
+        from tweets.core import TweetCore, remove_media
+        core = TweetCore(color_semantics = FakeSemantics(), muse = FakeImageMuse(), context = FakeContext(), resources = ())
+        candidates = core.tweet_many(6, workers = 2)
+        self.assertEquals(len(candidates), 6, "TweetCore.tweet_many broken")
+        self.assertFalse(os.getpid() in [c.pid for c in candidates], "candidates were not built in the workers")
+        self.assertEquals(len(set(c.values['muse'] for c in candidates)), 6, "workers were not reseeded")
+        self.assertTrue(all(c.memory is None and c.context is None for c in candidates), "candidates were not detached")
+        paths = [c.media for c in candidates]
+        self.assertTrue(all(os.path.isfile(p) for p in paths), "temporary images were removed by the workers")
+        remove_media(candidates)
+        self.assertFalse(any(os.path.isfile(p) for p in paths), "core.remove_media broken")
+        
+        
+class MemoryTestCase(TestCase):
+    """Test case for memory-module."""
+    
+    def setUp(self):
+        memory.tweeted_names_index().reset()
+        
+    def test_memory(self):
+        """Test memory of the recent tweets."""
+        from tweets.models import Tweet
+        from tweets.reasoning import Reasoning
+        Tweet(message = 'Old', color_code = '#000000', color_name = 'coal black').save()
+        Tweet(message = 'New', color_code = '#ffffff', color_name = 'snow white').save()
+        reasoning = Reasoning()
+        with memory.snapshot() as mem:
+            self.assertTrue(memory.of(reasoning) is mem, "memory.snapshot broken")
+            # Other threads do not see the snapshot, but load their own memory.
+            seen = []
+            load = memory.Memory.load
+            memory.Memory.load = classmethod(lambda cls: 'thread memory')
+            try:
+                thread = threading.Thread(target = lambda: seen.append(memory.current()))
+                thread.start()
+                thread.join()
+            finally:
+                memory.Memory.load = load
+            self.assertEquals(seen, ['thread memory'], "memory.snapshot is shared by threads")
+        self.assertEquals([t.message for t in mem.recent(1)], ['New'])
+        self.assertEquals(mem.color_atoms(1), set(['snow', 'white']))
+        self.assertTrue(mem.is_tweeted('coal black'))
+        self.assertFalse(mem.is_tweeted('coal'))
+        dists = mem.color_distances('#ffffff', 2)
+        self.assertAlmostEqual(dists[0], 0.0, places = 4)
+        self.assertAlmostEqual(dists[1], 100.0, places = 2)
+        
+    def test_tweeted_names(self):
+        """Test incremental updates of the tweeted color names index."""
+        from tweets.models import Tweet
+        Tweet(message = 'Old', color_code = '#000000', color_name = 'coal black').save()
+        names = memory.TweetedNames(refresh_interval = 3600)
+        self.assertTrue('coal black' in names)
+        memory.tweeted_names_index().refresh()
+        Tweet(message = 'New', color_code = '#ffffff', color_name = 'snow white').save()
+        with self.assertNumQueries(0):
+            self.assertTrue('snow white' in memory.tweeted_names_index(), "post_save index update broken")
+            self.assertFalse('snow white' in names)
+        names.refresh(force = True)
+        self.assertTrue('snow white' in names, "memory.TweetedNames.refresh broken")
+        
+    def test_late_tweets(self):
+        """Test that tweets committed late with lower primary keys are found."""
+        from tweets.models import Tweet
+        first = Tweet.objects.create(message = 'Old', color_code = '#000000', color_name = 'coal black')
+        Tweet.objects.create(message = 'New', color_code = '#ffffff', color_name = 'snow white')
+        names = memory.TweetedNames(refresh_interval = 0, pk_window = 1)
+        self.assertEquals(len(names), 2)
+        pk = first.pk
+        first.delete()
+        Tweet.objects.create(pk = pk, message = 'Late', color_code = '#ff0000', color_name = 'fire red')
+        self.assertTrue('fire red' in names, "memory.TweetedNames did not query the primary key window")
+        names = memory.TweetedNames(refresh_interval = 0, pk_window = 0, reload_interval = 0)
+        self.assertEquals(len(names), 2)
+        Tweet.objects.filter(pk = pk).update(color_name = 'ash grey')
+        self.assertTrue('ash grey' in names, "memory.TweetedNames did not reload the names")
+        
+    def test_bloom_filter(self):
+        """Test Bloom filter membership and error rate."""
+        bloom = BloomFilter(1000, error_rate = 0.01)
+        for i in xrange(1000):
+            bloom.add(u'color {}'.format(i))
+        self.assertTrue(990 <= len(bloom) <= 1000, "BloomFilter count broken")
+        self.assertTrue(all(u'color {}'.format(i) in bloom for i in xrange(1000)), "BloomFilter broken")
+        false_positives = sum(1 for i in xrange(1000, 11000) if u'color {}'.format(i) in bloom)
+        self.assertTrue(false_positives < 300, "BloomFilter error rate too high")
+        
+        
+class FakeSynset():
+    """Synset whose path similarity is the amount of shared letters."""
+    #: Synset name -> hypernym names.
+    hypernym_names = {'color.n.01': [], 'blue.n.01': ['color.n.01'], 'cerulean.n.01': ['blue.n.01']}
+    
+    def __init__(self, name):
+        self._name = name
+        
+    def name(self):
+        return self._name
+    
+    def path_similarity(self, other):
+        return len(set(self._name.split('.')[0]) & set(other._name.split('.')[0])) / 10.0
+    
+    def hypernyms(self):
+        return [FakeSynset(n) for n in self.hypernym_names.get(self._name, [])]
+    
+    def hyponyms(self):
+        return [FakeSynset(n) for n, hs in self.hypernym_names.items() if self._name in hs]
+    
+    def closure(self, rel):
+        ret = []
+        todo = rel(self)
+        while todo:
+            s = todo.pop()
+            ret.append(s)
+            todo += rel(s)
+        return ret
+    
+    def __eq__(self, other):
+        return self._name == other._name
+    
+    
+class FakeWordNet():
+    """WordNet giving one synset for each word, counting the lookups."""
+    def __init__(self):
+        self.lookups = 0
+        
+    def synsets(self, word):
+        self.lookups += 1
+        return [FakeSynset(word + '.n.01')]
+    
+    def synset(self, name):
+        self.lookups += 1
+        return FakeSynset(name)
+    
+    
+class WisdomPoolTestCase(TestCase):
+    """Test case for wisdom_pool-module."""
+    
+    def test_slot_words(self):
+        """Test words following the slots in the templates."""
+        words = wisdom_pool.slot_words(['<> nCosmos is <> nMass, of <> us'], {'nCosmos': ['quantum soup', 'grid'], 'nMass': ['life']})
+        self.assertEquals(words, set(['quantum', 'grid', 'life', 'life,', 'us', 'us.']))
+        
+    def test_similarities(self):
+        """Test that slot similarities are looked up from the saved pool."""
+        folder = tempfile.mkdtemp()
+        try:
+            path = os.path.join(folder, 'pool.pkl')
+            wisdom_pool.WisdomPool.build(wordnet = wordnet.WordNet(FakeWordNet())).save(path)
+            fake = FakeWordNet()
+            wn = wordnet.WordNet(fake)
+            pool = wisdom_pool.WisdomPool.load(path, wordnet = wn)
+            self.assertEquals(pool.digest, wisdom_pool.vocab_digest(), "wisdom_pool.WisdomPool.load broken")
+            self.assertAlmostEqual(pool.similarity('universe', 'blue'), 0.2)
+            self.assertEquals(fake.lookups, 3, "slot word synsets were not pre-resolved")
+            pool.similarity('universe', 'blue')
+            self.assertEquals(fake.lookups, 3, "similarities were not cached")
+            self.assertAlmostEqual(pool.similarity('bluish', 'blue'), 0.3)
+            self.assertEquals(wn.stats()['similarities']['size'], 2, "similarities were not computed with the WordNet cache")
+        finally:
+            shutil.rmtree(folder)
+        
+        
+class SentenceTestCase(TestCase):
+    """Test case for sentence-module."""
+    
+    def test_template(self):
+        """Test formatting of the compiled templates."""
+        template = sentence.Template('a nPrefix adj, <> nMass', {'nPrefix': ['ultra-'], 'adj': ['vivid'], 'nMass': ['a energy']})
+        self.assertEquals(template.fill(), 'An ultra-vivid, <> an energy.')
+        
+    def test_generate_batch(self):
+        """Test that batches with the same seed are the same."""
+        batch = sentence.generate_batch(50, seed = 1)
+        self.assertEquals(len(batch), 50)
+        self.assertEquals(batch, sentence.generate_batch(50, seed = 1), "sentence.generate_batch is not reproducible")
+        self.assertEquals(len(list(sentence.generate_text(3))), 3)
+        
+        
+class WordNetTestCase(TestCase):
+    """Test case for wordnet-module."""
+    
+    def test_cached_lookups(self):
+        """Test that repeated WordNet lookups are served from the caches."""
+        fake = FakeWordNet()
+        wn = wordnet.WordNet(fake)
+        blue = wn.synsets('blue')
+        for _ in xrange(3):
+            self.assertAlmostEqual(wn.max_similarity(wn.synsets('bluish'), blue), 0.3)
+        self.assertEquals(fake.lookups, 2, "wordnet.WordNet did not cache synsets")
+        stats = wn.stats()
+        self.assertEquals(stats['similarities']['misses'], 1)
+        self.assertAlmostEqual(stats['synsets']['hit_rate'], 0.5)
+        
+    def test_is_color(self):
+        """Test color checks with and without precomputed color synsets."""
+        wn = wordnet.WordNet(FakeWordNet())
+        checks = [wn.is_color(w) for w in ('cerulean', 'blue', 'color', 'bluish')]
+        self.assertEquals(checks, [True, True, False, False])
+        self.assertEquals(wn.precompute_colors(), 2)
+        self.assertEquals([wn.is_color(w) for w in ('cerulean', 'blue', 'color', 'bluish')], checks)
+        
+        
+class VectorModelTestCase(TestCase):
+    """Test case for word2vec-module."""
+    
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'vectors')
+        words = [u'sad', u'happy', u'joyful', u'caf\xe9']
+        vectors = [(-1.0, 0.0), (2.0, 0.0), (3.0, 3.0), (0.0, 1.0)]
+        word2vec.save(self.path, words, vectors)
+        self.model = word2vec.VectorModel.load(self.path)
+        
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        
+    def test_similarities(self):
+        """Test similarities of the memory-mapped vectors."""
+        self.assertEquals(len(self.model), 4, "word2vec.save broken")
+        self.assertTrue(u'caf\xe9' in self.model, "word2vec.VectorModel broken")
+        self.assertFalse('happ' in self.model, "word2vec.VectorModel broken")
+        self.assertAlmostEqual(self.model.similarity('happy', 'sad'), -1.0, places = 6)
+        self.assertAlmostEqual(self.model.similarity('happy', 'joyful'), np.sqrt(0.5), places = 6)
+        self.assertAlmostEqual(self.model.n_similarity(['happy', u'caf\xe9'], ['joyful']), 1.0, places = 6)
+        self.assertRaises(KeyError, self.model.similarity, 'happy', 'angry')
+        
+    def test_similarity_index(self):
+        """Test precomputed similarities against the model's own."""
+        index = word2vec.SimilarityIndex(self.model, [('happy', 'joyful'), ('angry',), ('sad',)])
+        sims = index.similarities('happy')
+        self.assertAlmostEqual(sims[0], self.model.n_similarity(['happy'], ['happy', 'joyful']), places = 6)
+        self.assertTrue(np.isnan(sims[1]), "word2vec.SimilarityIndex broken")
+        self.assertAlmostEqual(sims[2], -1.0, places = 6)
+        index.similarities('happy')
+        self.assertEquals(index.cache.stats()['hits'], 1, "word2vec.SimilarityIndex broken")
+        
+    def test_unknown_mood_emotions(self):
+        """Test that mood color is None when no stereotype emotion is in the model."""
+        from tweets.new_age import get_closest_mood_color
+        self.assertEquals(get_closest_mood_color('happy', self.model), None, "new_age.get_closest_mood_color broken")
+        
+    def test_concurrent_lru_cache(self):
+        """Test that threads can share a full LRUCache."""
+        from tweets.utils.cache import LRUCache
+        cache = LRUCache(8)
+        errors = []
+        def work():
+            try:
+                for i in xrange(5000):
+                    if cache.get(i % 16) is None:
+                        cache.put(i % 16, i)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target = work) for _ in xrange(4)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEquals(errors, [], "LRUCache broken")
+        self.assertEquals(len(cache), 8, "LRUCache broken")
+        stats = cache.stats()
+        self.assertEquals(stats['hits'] + stats['misses'], 20000, "LRUCache broken")
+
+        
+def create_color_resources(colors, splits = ()):
+    """Create colors and their color maps, and unigram splits of the color names.
+    
+    :param colors: Stereotype -> (rgb, base color)
+    :param splits: (w1, w2)-tuples
+    """
+    from tweets.models import ColorMap, ColorUnigram, ColorUnigramSplit
+    pks = resources.get_or_create_colors([rgb for rgb, base in colors.values()])
+    for name, (rgb, base) in colors.items():
+        ColorMap(stereotype = name, base_color = base, color_id = pks[rgb]).save()
+    for w1, w2 in splits:
+        original = ColorUnigram.objects.create(solid_compound = w1 + w2, f = 1)
+        ColorUnigramSplit(w1 = w1, w2 = w2, original = original).save()
+        
+        
+class BlendCacheTestCase(TestCase):
+    """Test case for color_semantics-module's blended unigram cache."""
+    
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_settings = override_settings(CACHE_DIR = self.cache_dir)
+        self.cache_settings.enable()
+        create_color_resources({'sea': ((0, 105, 148), 'blue'), 'shell': ((255, 245, 238), 'white'), 
+                                'grass': ((124, 252, 0), 'green')}, [('sea', 'shell'), ('grass', 'shell')])
+        
+    def tearDown(self):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir)
+        
+    def test_blend_cache(self):
+        """Test that only blends of changed unigram splits are recomputed."""
+        semantics = ColorSemantics()
+        self.assertEquals(semantics.blend_cache_stats, {'hits': 0, 'misses': 6})
+        self.assertTrue(semantics.blend_cache_path.startswith(self.cache_dir), "blend cache is not in CACHE_DIR")
+        self.assertEquals(os.listdir(self.cache_dir), ['blended_unigrams.pickle'])
+        blended = semantics.blended_unigram_splits
+        semantics = ColorSemantics()
+        self.assertEquals(semantics.blend_cache_stats, {'hits': 6, 'misses': 0})
+        self.assertEquals(semantics.blended_unigram_splits, blended, "cached blends differ from computed ones")
+        # New color code for 'grass' invalidates only the blends of ('grass', 'shell').
+        create_color_resources({'grass': ((0, 128, 0), 'green')})
+        semantics = ColorSemantics()
+        self.assertEquals(semantics.blend_cache_stats, {'hits': 3, 'misses': 3})
+        
         
 class ColorSemanticsTestCase(TestCase):
     """Test case for color_semantics-module."""
     fixtures = ['test_fixtures.json']
     
     def setUp(self):
+        self.lab_table = cu.unload_lab_table()
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_settings = override_settings(CACHE_DIR = self.cache_dir)
+        self.cache_settings.enable()
         self.semantics = ColorSemantics()
         self.green_codes = [u'#B0BF1A', u'#7FDD4C', u'#458B00', u'#C3C728', u'#64AC58', u'#8DB600', u'#69A577', u'#87A96B', u'#568203', u'#7EA660', u'#A1BEAE', u'#324F17', u'#839783', u'#8BA870', u'#6D7C4B', u'#93C460', u'#C0D9AF', u'#78866B', u'#7E8951', u'#ADFF2F', u'#2F847C', u'#9BD687', u'#7FFF00', u'#608341', u'#2A6241', u'#157D41', u'#9FA91F', u'#424D18', u'#B0D8CC', u'#2FBD78', u'#434F38', u'#4A5D23', u'#50C878', u'#6CB037', u'#4F7942', u'#228B22', u'#228B22', u'#228B22', u'#9AB78B', u'#006600', u'#D4D678', u'#A09238', u'#21422D', u'#58714A', u'#55C0A9', u'#243225', u'#29AB87', u'#9ACD32', u'#7CFC00', u'#008000', u'#76AA83', u'#C8E17B', u'#99A285', u'#BFFF00', u'#4FA93F', u'#73A55B', u'#3EB489', u'#4A5D23', u'#21421E', u'#6B8E23', u'#808000', u'#228B22', u'#6CA939', u'#7DB143', u'#E1E36E', u'#44743D', u'#01993D', u'#01796F', u'#CFB53B', u'#93C572', u'#87A96B', u'#9FC3A9', u'#4BA351', u'#507D2A', u'#228B22', u'#71EEB8', u'#5D7759', u'#009E60', u'#32CD32', u'#CFDBC5', u'#78AB46', u'#8BA870', u'#57A75B', u'#66BB66', u'#8EBD99', u'#008080', u'#8CBAA0', u'#228B22', u'#40E0D0', u'#43B3AE', u'#A2A415', u'#849137', u'#659D32', u'#CFCC8F', u'#A2C771', u'#516138']
         self.dists_html = [(0.0, u'#FFFFFF'), (0.34507772216326343, u'#FEFEFE'), (1.0360071048078772, u'#FCFCFC'), (1.2453575416990263, u'#FBFCFD')]
         self.dists_rgb = [(0.5798786270637373, (255, 8, 0)), (4.124449922053755, (255, 36, 0))]
         
+    def tearDown(self):
+        cu.restore_lab_table(self.lab_table)
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir)
+        
         
     def test_semantic_basics(self):
         self.assertEquals(self.semantics.get_color_code('aubergine'), [u'#370028'])
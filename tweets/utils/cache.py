@@ -0,0 +1,201 @@
+'''
+.. py:module:: cache_utils
+    :platform: Unix
+
+Small caches for expensive, repeatedly needed results: in-memory 
+:py:class:`LRUCache` and persistent :py:class:`DiskCache`, e.g. for web queries.
+:py:class:`BloomFilter` is a compact set for large amounts of keys.
+'''
+import os
+import math
+import time
+import struct
+import hashlib
+import sqlite3
+import threading
+import cPickle as pickle
+from contextlib import closing
+from collections import OrderedDict
+
+
+class LRUCache():
+    '''Least recently used cache with a fixed maximum size.
+
+    Keeps count of cache hits and misses, see :py:meth:`stats`. The cache can
+    be shared by threads.
+
+    :param maxsize: Maximum amount of stored items.
+    :type maxsize: int
+    '''
+    def __init__(self, maxsize = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default = None):
+        '''Get value for the key and mark it as the most recently used one.
+
+        :returns: Stored value, or default if key is not in the cache.
+        '''
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            value = self._data.pop(key)
+            self._data[key] = value
+            return value
+
+    def put(self, key, value):
+        '''Store value for the key, removing the least recently used item if
+        the cache is full.'''
+        with self._lock:
+            if key in self._data:
+                self._data.pop(key)
+            elif len(self._data) >= self.maxsize:
+                self._data.popitem(last = False)
+            self._data[key] = value
+
+    def clear(self):
+        '''Remove all items and reset the statistics.'''
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        '''Cache statistics.
+
+        :returns: dict -- with keys *hits*, *misses*, *size* and *maxsize*.
+        '''
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._data), 'maxsize': self.maxsize}
+
+
+class DiskCache():
+    '''Persistent key-value cache stored in a SQLite database.
+
+    Each item expires after its time-to-live. Failures can be cached with
+    :py:meth:`put_failure`, so that e.g. a failing web query is not retried on
+    every call; such items are returned as ``None``. Values are pickled, and 
+    each operation uses its own database connection, so the cache can be 
+    shared by threads and processes.
+
+    :param path: Path to the SQLite database, created if it does not exist.
+    :type path: str
+    :param ttl: Default time-to-live of the items in seconds.
+    :type ttl: int
+    :param negative_ttl: Time-to-live of the cached failures in seconds.
+    :type negative_ttl: int
+    '''
+    def __init__(self, path, ttl = 7 * 24 * 3600, negative_ttl = 3600):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        with closing(self._connect()) as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+            conn.commit()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout = 30)
+
+    def get(self, key):
+        '''Get item from the cache.
+
+        :returns: tuple -- (bool, value), where bool is True if a valid item was found. Value is None for cached failures.
+        '''
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return (False, None)
+        if row[0] is None:
+            return (True, None)
+        return (True, pickle.loads(str(row[0])))
+
+    def put(self, key, value, ttl = None):
+        '''Store item into the cache, ``ttl`` defaults to the cache's ``ttl``.'''
+        ttl = self.ttl if ttl is None else ttl
+        blob = sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        self._store(key, blob, ttl)
+
+    def put_failure(self, key, ttl = None):
+        '''Store failure for the key, ``ttl`` defaults to the cache's ``negative_ttl``.'''
+        ttl = self.negative_ttl if ttl is None else ttl
+        self._store(key, None, ttl)
+
+    def _store(self, key, blob, ttl):
+        with closing(self._connect()) as conn:
+            conn.execute('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)', 
+                         (key, blob, time.time() + ttl))
+            conn.commit()
+
+    def delete(self, key):
+        '''Remove item from the cache.'''
+        with closing(self._connect()) as conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            conn.commit()
+
+    def purge(self):
+        '''Remove expired items from the cache.'''
+        with closing(self._connect()) as conn:
+            conn.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+            conn.commit()
+
+
+class BloomFilter():
+    '''Set of keys stored in a fixed size bit array.
+    
+    Membership tests may give false positives with the given error rate (when
+    at most ``capacity`` keys have been added), but never false negatives. 
+    Keys can not be removed.
+    
+    :param capacity: Expected maximum amount of keys.
+    :type capacity: int
+    :param error_rate: False positive rate at full capacity.
+    :type error_rate: float
+    '''
+    def __init__(self, capacity, error_rate = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2)**2))
+        self.hashes = max(1, int(round(float(self.size) / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        
+    def _positions(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf8')
+        h1, h2 = struct.unpack('<QQ', hashlib.md5(key).digest())
+        return [(h1 + i * h2) % self.size for i in xrange(self.hashes)]
+        
+    def __len__(self):
+        '''Approximate amount of added keys, keys which were reported to be in the
+        filter already are not counted.'''
+        return self.count
+    
+    def __contains__(self, key):
+        for p in self._positions(key):
+            if not self._bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+        
+    def add(self, key):
+        '''Add key into the filter.'''
+        new = False
+        for p in self._positions(key):
+            if not self._bits[p >> 3] & (1 << (p & 7)):
+                self._bits[p >> 3] |= 1 << (p & 7)
+                new = True
+        if new:
+            self.count += 1
@@ -10,8 +10,12 @@ Functions defined in this module are ignorant of semantics, and you should do yo
 reasoning, e.g. what to blend and how to blend, before calling functions in 
 this module. 
 
-The module relies on ``colormath``-package's functionality.
-Furthermore, three light weight color definitions are supported for convenience:
+Color space conversions are done with NumPy using the same formulas and 
+constants as ``colormath``-package, so that the results match ``colormath``'s 
+sRGB (D65) - Lab conversions. Functions whose names end with ``_array`` or ``_many`` 
+work on whole batches of colors at once, and the scalar functions are thin 
+wrappers over them. Furthermore, three light weight color definitions are 
+supported for convenience:
 
 * hex: ``str`` or ``unicode`` in form of ``0xrrggbb``, where ``r``, ``g`` and ``b`` are hex codes.
 * html: ``str`` or ``unicode`` in form of ``#rrggbb``, where ``r``, ``g``, ``b`` are hex codes.
@@ -25,17 +29,52 @@ Furthermore, three light weight color definitions are supported for convenience:
     color spaces might (and will) cause some inaccuracies in colors due to needed floating 
     point operations.
 """
+import os
 import re
 from random import gauss
-from math import sqrt
-from colormath.color_objects import sRGBColor, LabColor 
-from colormath.color_conversions import convert_color
+import numpy as np
+from colormath.color_objects import LabColor 
 from PIL import Image
 import tempfile
 
 re_html = re.compile(r'^#[0-9a-fA-F]{6}$')
 re_hex = re.compile(r'^0x[0-9a-fA-F]{6}$')
 
+# Conversion constants, identical to the ones used by colormath. Matrices are
+# applied to row vectors, i.e. np.dot(colors, matrix).
+_CIE_E = 216.0 / 24389.0
+_RGB2XYZ = np.array((
+    (0.412424, 0.212656, 0.0193324),
+    (0.357579, 0.715158, 0.119193),
+    (0.180464, 0.0721856, 0.950444)))
+_XYZ2RGB = np.array((
+    (3.24071, -0.969258, 0.0556352),
+    (-1.53726, 1.87599, -0.203996),
+    (-0.498571, 0.0415557, 1.05707)))
+_ILLUMINANTS = {
+    'd50': np.array((0.96422, 1.00000, 0.82521)),
+    'd65': np.array((0.95047, 1.00000, 1.08883)),
+}
+_BRADFORD = np.array((
+    (0.8951, -0.7502, 0.0389),
+    (0.2664, 1.7135, -0.0685),
+    (-0.1614, 0.0367, 1.0296)))
+
+
+def _adaptation_matrix(orig_illum, targ_illum):
+    """Bradford chromatic adaptation matrix between illuminants."""
+    src = np.dot(_ILLUMINANTS[orig_illum], _BRADFORD)
+    dst = np.dot(_ILLUMINANTS[targ_illum], _BRADFORD)
+    return np.dot(np.dot(_BRADFORD, np.diag(dst / src)), np.linalg.pinv(_BRADFORD))
+
+# sRGB's native illuminant is D65, Lab colors are D50 unless told otherwise.
+_ADAPT2D65 = {'d50': _adaptation_matrix('d50', 'd65')}
+
+# Memory-mapped rgb -> Lab lookup table, see load_lab_table(). The table is 
+# opened lazily on first conversion. 
+_lab_table = None
+_lab_table_checked = False
+
 def is_rgb(rgb):
     """Verify that color variable is in accepted rgb-format.
     
@@ -101,10 +140,8 @@ def _lab2rgb(c):
     """
     if not type(c) is LabColor:
         raise TypeError("Variable not an instance of LabColor.")
-    rgb = convert_color(c, sRGBColor).get_value_tuple()
-    # Clamp out of gamut colors into [0, 1] since colormath package does not do it
-    r, g, b = [(0.0 if a < 0.0 else 1.0 if a > 1.0 else a) for a in rgb]
-    return (int(round(r * 255)), int(round(g * 255)), int(round(b * 255)))
+    rgb = lab_to_rgb_array([c.get_value_tuple()], illuminant = c.illuminant)[0]
+    return (int(rgb[0]), int(rgb[1]), int(rgb[2]))
 
 
 def _2lab(c):
@@ -116,10 +153,170 @@ def _2lab(c):
     **Returns:**
         LabColor object for given color.
     """
-    r, g, b = _2rgb(c)
-    return convert_color(sRGBColor(r, g, b, is_upscaled = True), LabColor)
+    l, a, b = to_lab_array([_2rgb(c)])[0]
+    return LabColor(float(l), float(a), float(b), illuminant = 'd65')
+    
+    
+def _rgb_array(colors):
+    """Convert colors into N x 3 float array of rgb-values in [0, 255]."""
+    if isinstance(colors, np.ndarray):
+        return colors.reshape(-1, 3).astype(float)
+    return np.array([_2rgb(c) for c in colors], dtype = float).reshape(-1, 3)
+
+
+def to_lab_array(colors):
+    """Convert colors into Lab color space (D65 reference white).
+    
+    If precomputed lookup table is available (see :py:func:`load_lab_table`), 
+    the Lab-values are read from it, otherwise they are calculated. Fractional
+    rgb-values are rounded to the nearest integer for the table lookup, and 
+    Lab-values of colors outside [0, 255] are always calculated.
+    
+    **Args:**
+        colors: N x 3 array of rgb-values in [0, 255] (e.g. ``uint8``), or an iterable of colors in any supported format.
+        
+    **Returns:**
+        N x 3 float array of Lab-values.
+    """
+    rgb = _rgb_array(colors)
+    table = _get_lab_table()
+    if table is None:
+        return _rgb2lab(rgb)
+    i = np.rint(rgb)
+    in_range = ((i >= 0) & (i <= 255)).all(axis = 1)
+    i = np.clip(i, 0, 255).astype(np.int64)
+    labs = table[(i[:, 0] << 16) | (i[:, 1] << 8) | i[:, 2]].astype(float)
+    if not in_range.all():
+        labs[~in_range] = _rgb2lab(rgb[~in_range])
+    return labs
+
+
+def _rgb2lab(rgb):
+    """Calculate Lab-values for N x 3 float array of rgb-values in [0, 255]."""
+    v = rgb / 255.0
+    # Remove sRGB's gamma
+    linear = np.where(v <= 0.04045, v / 12.92, np.power((v + 0.055) / 1.055, 2.4))
+    t = np.dot(linear, _RGB2XYZ) / _ILLUMINANTS['d65']
+    t = np.where(t > _CIE_E, np.power(t, 1.0 / 3.0), (7.787 * t) + (16.0 / 116.0))
+    lab = np.empty(t.shape)
+    lab[:, 0] = (116.0 * t[:, 1]) - 16.0
+    lab[:, 1] = 500.0 * (t[:, 0] - t[:, 1])
+    lab[:, 2] = 200.0 * (t[:, 1] - t[:, 2])
+    return lab
+
+
+def load_lab_table(path = None):
+    """Open precomputed rgb -> Lab lookup table.
+    
+    The table is a ``.npy``-file with Lab-values for all 2^24 rgb-colors, 
+    indexed by ``(r << 16) | (g << 8) | b``, and created with :py:func:`build_lab_table`.
+    It is opened as a read-only memory map, so that all the processes using 
+    the table share the same pages from the operating system's page cache.
+    
+    If the table is not found, Lab-values are calculated on demand instead.
+    
+    **Args:**
+        path (str): Path to the table, defaults to ``LAB_TABLE_PATH`` in Django settings.
+        
+    **Returns:**
+        Memory-mapped table, or ``None`` if the table could not be found.
+    """
+    global _lab_table, _lab_table_checked
+    _lab_table_checked = True
+    _lab_table = None
+    if path is None:
+        try:
+            from django.conf import settings
+            path = getattr(settings, 'LAB_TABLE_PATH', None)
+        except Exception:
+            # Django is not available or not configured.
+            path = None
+    if path and os.path.isfile(path):
+        _lab_table = np.load(path, mmap_mode = 'r')
+    return _lab_table
+
+
+def unload_lab_table():
+    """Stop using the rgb -> Lab lookup table and calculate Lab-values instead.
     
+    **Returns:**
+        Previous state of the table, which can be given to :py:func:`restore_lab_table`.
+    """
+    global _lab_table, _lab_table_checked
+    state = (_lab_table, _lab_table_checked)
+    _lab_table = None
+    _lab_table_checked = True
+    return state
 
+
+def restore_lab_table(state):
+    """Restore the state of the lookup table returned by :py:func:`unload_lab_table`."""
+    global _lab_table, _lab_table_checked
+    _lab_table, _lab_table_checked = state
+
+
+def _get_lab_table():
+    if not _lab_table_checked:
+        load_lab_table()
+    return _lab_table
+
+
+def build_lab_table(path, dtype = np.float32, chunk_size = 2**20):
+    """Precompute Lab-values for all 2^24 rgb-colors into a ``.npy``-file.
+    
+    The table is first written into a temporary file, which is then renamed,
+    so that processes using the old table are not disturbed.
+    
+    **Args:**
+        | path (str): Path to the created table.
+        | dtype: NumPy type for the stored values, e.g. ``np.float32`` or ``np.float16``.
+        | chunk_size (int): Amount of colors calculated at once.
+    """
+    size = 2**24
+    tmp_path = path + '.tmp'
+    table = np.lib.format.open_memmap(tmp_path, mode = 'w+', dtype = dtype, shape = (size, 3))
+    for start in xrange(0, size, chunk_size):
+        i = np.arange(start, min(start + chunk_size, size))
+        rgb = np.column_stack(((i >> 16) & 255, (i >> 8) & 255, i & 255)).astype(float)
+        table[start:start + len(i)] = _rgb2lab(rgb)
+    table.flush()
+    del table
+    os.rename(tmp_path, path)
+    
+    
+def lab_to_rgb_array(labs, illuminant = 'd50'):
+    """Convert Lab-values into rgb-values.
+    
+    Out of gamut colors are clamped into the valid rgb-range.
+    
+    **Args:**
+        | labs: N x 3 array-like of Lab-values.
+        | illuminant (str): Reference white of the Lab-values, either ``d50`` (``LabColor``'s default) or ``d65``.
+        
+    **Returns:**
+        N x 3 integer array of rgb-values in [0, 255].
+        
+    **Raises:**
+        ValueError for unsupported illuminants.
+    """
+    if illuminant != 'd65' and illuminant not in _ADAPT2D65:
+        raise ValueError("Unsupported illuminant '{}', supported illuminants are {}.".format(
+                         illuminant, ", ".join(sorted(['d65'] + _ADAPT2D65.keys()))))
+    labs = np.asarray(labs, dtype = float).reshape(-1, 3)
+    y = (labs[:, 0] + 16.0) / 116.0
+    t = np.column_stack((labs[:, 1] / 500.0 + y, y, y - labs[:, 2] / 200.0))
+    t = np.where(t**3 > _CIE_E, t**3, (t - 16.0 / 116.0) / 7.787)
+    xyz = t * _ILLUMINANTS[illuminant]
+    if illuminant != 'd65':
+        xyz = np.dot(xyz, _ADAPT2D65[illuminant])
+    linear = np.dot(xyz, _XYZ2RGB)
+    # Apply sRGB's gamma, avoid warnings from negative values in power.
+    v = np.where(linear <= 0.0031308, linear * 12.92, 1.055 * np.power(np.abs(linear), 1 / 2.4) - 0.055)
+    # Clamp out of gamut colors into [0, 1] and round half up as round() does.
+    v = np.clip(v, 0.0, 1.0)
+    return np.floor(v * 255 + 0.5).astype(int)
+    
+    
 def _2rgb(c):
     if not is_rgb(c):
         if is_html(c):
@@ -214,8 +411,6 @@ def blend(head, modifier, **kwargs):
     **Returns:**
         Blended color as rgb-tuple.
     """
-    h = _2lab(head).get_value_tuple()
-    m = _2lab(modifier).get_value_tuple()  
     a_lab = (0.5, 0.5, 0.5)
     if kwargs:
         if 'a_lab' in kwargs:
@@ -223,11 +418,62 @@ def blend(head, modifier, **kwargs):
         elif 'a_head' in kwargs:
             a_head = kwargs['a_head']
             a_lab = (a_head, a_head, a_head)
-            
-    l = (a_lab[0] * h[0] + (1 - a_lab[0]) * m[0])
-    a = (a_lab[1] * h[1] + (1 - a_lab[1]) * m[1])
-    b = (a_lab[2] * h[2] + (1 - a_lab[2]) * m[2])
-    return _2rgb(LabColor(l, a, b))
+    r, g, b = blend_many([head], [modifier], a_lab = a_lab)[0]
+    return (int(r), int(g), int(b))
+
+
+def blend_many(heads, modifiers, a_lab = (0.5, 0.5, 0.5)):
+    """Blend pairs of colors in Lab color space.
+    
+    See :py:func:`blend` for the blending details.
+    
+    **Args:** 
+        | heads: N head colors, either N x 3 rgb-array or iterable of colors in any supported format.    
+        | modifiers: N modifier colors in the same formats as heads.
+        | a_lab: Amount of each head color component to mix, either a 3-tuple for all pairs or N x 3 array.
+    
+    **Returns:**
+        N x 3 integer array of blended rgb-values.
+    """
+    h = to_lab_array(heads)
+    m = to_lab_array(modifiers)
+    a_lab = np.asarray(a_lab, dtype = float)
+    return lab_to_rgb_array(a_lab * h + (1 - a_lab) * m)
+    
+
+def pairwise_ed(A, B):
+    """Euclidean distances between all color pairs from two sets of colors.
+    
+    The distance calculation is done in CIE Lab color space.
+    
+    **Args:**
+        | A: N colors, either N x 3 rgb-array or iterable of colors in any supported format.
+        | B: M colors in the same formats as A.
+        
+    **Returns:**
+        N x M float array of distances.
+    """
+    a = to_lab_array(A)
+    b = to_lab_array(B)
+    return np.sqrt(((a[:, np.newaxis, :] - b[np.newaxis, :, :])**2).sum(axis = 2))
+    
+    
+def closest_many(queries, palette):
+    """Get the closest palette color for each of the query colors.
+    
+    If there are many equally close colors, the one appearing first in the 
+    palette is selected.
+    
+    **Args:**
+        | queries: N query colors, either N x 3 rgb-array or iterable of colors in any supported format.
+        | palette: Palette colors in the same formats as queries.
+        
+    **Returns:**
+        List of (distance, palette color)-tuples, one for each query.
+    """
+    dists = pairwise_ed(queries, palette)
+    closest = dists.argmin(axis = 1)
+    return [(float(dists[i, j]), palette[j]) for i, j in enumerate(closest)]
 
 
 def ed(color1, color2):
@@ -243,9 +489,7 @@ def ed(color1, color2):
     **Returns:**
         Distance between colors as ``float``.
     """
-    l1, a1, b1 = _2lab(color1).get_value_tuple()
-    l2, a2, b2 = _2lab(color2).get_value_tuple()
-    return sqrt((l1 - l2)**2 + (a1 - a2)**2 + (b1 - b2)**2)
+    return float(pairwise_ed([color1], [color2])[0, 0])
 
 
 def get_closest(color_code, color_list):
@@ -256,24 +500,104 @@ def get_closest(color_code, color_list):
     """
     if type(color_list) is not list or len(color_list) == 0:
         raise ValueError("Color list should be non-empty list.")
-    min_ed = ed(color_code, color_list[0])
-    cur = color_list[0]
-    for c in color_list[1:]:
-        cur_ed = ed(color_code, c)
-        if cur_ed < min_ed:
-            min_ed = cur_ed
-            cur = c
-    return (min_ed, cur)
+    return closest_many([color_code], color_list)[0]
 
 
+class LabIndex():
+    """Nearest neighbour index for colors in Lab color space.
+    
+    Lab-values of the indexed colors are stored into a single NumPy-matrix 
+    when the index is created, so that querying for nearest colors needs only 
+    one conversion (for the query color) and one vectorized distance 
+    calculation. 
+    
+    **Args:**
+        | keys (list): Indexed colors (or other hashable objects) in any format, returned as is from queries.
+        | labs (list): Lab-values for each key as 3-tuples, in the same order as keys.
+    """
+    def __init__(self, keys, labs):
+        self.keys = list(keys)
+        self.labs = np.array(labs, dtype = float).reshape(len(self.keys), 3)
+        
+        
+    def __len__(self):
+        return len(self.keys)
+        
+        
+    def distances(self, color_code):
+        """Euclidean distances from color code to all the indexed colors.
+        
+        **Args:**
+            | color_code: Color in any supported format.
+            
+        **Returns:**
+            NumPy-array of distances, in the same order as the index's keys.
+        """
+        q = to_lab_array([_2rgb(color_code)])[0]
+        return np.sqrt(((self.labs - q)**2).sum(axis = 1))
+    
+    
+    def nearest(self, color_code, batch = 32):
+        """Iterate indexed colors in the order of ascending distance to the color code.
+        
+        Colors are sorted lazily in batches, i.e. only as many colors are sorted 
+        as are consumed from the iterator. Equally distant colors are ordered 
+        by their keys.
+        
+        **Args:**
+            | color_code: Color in any supported format.
+            | batch (int): Amount of colors sorted at once.
+            
+        **Returns:**
+            Iterator of (distance, key)-tuples.
+        """
+        if len(self.keys) == 0:
+            return
+        dists = self.distances(color_code)
+        remaining = np.arange(len(self.keys))
+        while len(remaining) > 0:
+            if len(remaining) > batch:
+                part = np.argpartition(dists[remaining], batch - 1)
+                # Include all the colors equally distant as the farthest one 
+                # in the batch so that ties are ordered consistently.
+                limit = dists[remaining[part[batch - 1]]]
+                mask = dists[remaining] <= limit
+                current = remaining[mask]
+                remaining = remaining[~mask]
+            else:
+                current = remaining
+                remaining = remaining[:0]
+            for d, key in sorted((float(dists[i]), self.keys[i]) for i in current):
+                yield (d, key)
+            batch *= 2
+            
+            
+    def knn(self, color_code, k = 1, approve = None):
+        """Retrieve k-nearest indexed colors for the color code.
+        
+        **Args:**
+            | color_code: Color in any supported format.
+            | k (int): Amount of nearest neighbors to return.
+            | approve (callable): Optional filter, called with (distance, key) and should return ``True`` for accepted colors.
+            
+        **Returns:**
+            List of (distance, key)-tuples in ascending distance order.
+        """
+        ret = []
+        for item in self.nearest(color_code, batch = max(k, 8)):
+            if approve is None or approve(*item):
+                ret.append(item)
+            if len(ret) == k:
+                break
+        return ret
+    
+    
 def add_noise(color_code):
     '''Add some noise to the given color.'''
-    lab_color = _2lab(color_code).get_value_tuple()
-    nc = []
-    for c in lab_color:
-        nc.append(c + gauss(0, 10)) 
-    labc = LabColor(nc[0], nc[1], nc[2])
-    return _lab2rgb(labc)
+    lab_color = to_lab_array([_2rgb(color_code)])[0]
+    nc = [c + gauss(0, 10) for c in lab_color]
+    r, g, b = lab_to_rgb_array([nc])[0]
+    return (int(r), int(g), int(b))
     
     
     
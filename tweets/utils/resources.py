@@ -5,16 +5,22 @@
     
 Utility functions to populate Django models with given resources. 
 
-.. warning:: 
-    As these functions don't restrict multiple instances of the same entry to be 
-    added to the database, they should be used with caution. The basic resources
-    from ``project_root/resources/`` have already been converted into 
-    json-fixture, which is available in ``project_root/tweets/fixtures/fixtures.json``.
-    
-    It is advised to use the fixture in order to repopulate the database after 
-    migrations and to use functions defined here only to add new content afterwards.
-    
-    After adding the content, new database fixture can then be created as::
+Each ``populate_*`` function streams its file and inserts the rows with chunked
+``bulk_create`` inside one transaction. Rows are upserted on the model's 
+natural key (e.g. ``w1`` and ``w2`` for ``UnbracketedColorBigram``): existing 
+rows are updated only if their values have changed, so the functions can be 
+run again without creating duplicates. Lab-values for new colors are 
+calculated in one vectorized pass. All resources can be loaded with::
+
+    $> python manage.py load_resources [--path=/path/to/resources] [resource ...]
+
+which also reports the loading speed of each resource.
+
+.. note:: 
+    The basic resources from ``project_root/resources/`` have already been 
+    converted into json-fixture, which is available in 
+    ``project_root/tweets/fixtures/fixtures.json``. After adding new content, 
+    new database fixture can be created as::
     
     $> cd project_root/
     $> python manage.py dumpdata --format=json --indent=4 tweets > tweets/fixtures/fixtures.json
@@ -25,247 +31,476 @@ Utility functions to populate Django models with given resources.
 """
 import os
 import sys
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger('tweets.default')
+
+#: Amount of rows inserted with one query.
+CHUNK_SIZE = 500
 
 def __set_django():
     if not 'DJANGO_SETTINGS_MODULE' in os.environ:
         sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
         os.environ['DJANGO_SETTINGS_MODULE'] = 'TwatBot.settings'
+        
+        
+def read_tsv(filepath, fields):
+    """Stream rows from tab separated file.
+    
+    The first line of the file is thought to contain field names and is omitted,
+    as are the lines which do not have ``fields`` values.
+    
+    **Args**
+        | filepath (str): Path to the file.
+        | fields (int): Amount of values on each line.
+        
+    **Yields**
+        tuple -- Stripped unicode values of each line.
+    """
+    with open(filepath, 'r') as filehandle:
+        next(filehandle, None)
+        for i, line in enumerate(filehandle, 2):
+            values = tuple(v.strip().decode('utf8') for v in line.rstrip("\r\n").split("\t"))
+            if len(values) != fields:
+                logger.warning("Skipping line {} in {}: expected {} fields, got {}.".format(i, filepath, fields, len(values)))
+                continue
+            yield values
+            
+            
+def bulk_upsert(model, rows, key_fields, chunk_size = CHUNK_SIZE):
+    """Insert or update rows on model's natural key.
+    
+    Existing keys are read with one query, new rows are inserted with chunked
+    ``bulk_create`` and existing rows whose values differ are updated. If the
+    same key occurs several times in ``rows``, the last one is used. Should be 
+    called inside a transaction.
+    
+    **Args**
+        | model: Django model class.
+        | rows (iterable): dicts of model field values (``<fk>_id`` for foreign keys).
+        | key_fields (tuple): Names of the fields forming the natural key.
+        | chunk_size (int): Amount of rows inserted with one query.
+        
+    **Returns**
+        dict -- with keys *read*, *created*, *updated* and *unchanged*.
+    """
+    stats = {'read': 0, 'created': 0, 'updated': 0, 'unchanged': 0}
+    new = {}
+    for row in rows:
+        stats['read'] += 1
+        new[tuple(row[f] for f in key_fields)] = row
+    if len(new) == 0:
+        return stats
+        
+    value_fields = sorted(set(f for row in new.values() for f in row) - set(key_fields))
+    existing = {}
+    for values in model.objects.values_list('pk', *(tuple(key_fields) + tuple(value_fields))):
+        existing[values[1:len(key_fields) + 1]] = (values[0], values[len(key_fields) + 1:])
+        
+    to_create = []
+    for key, row in new.items():
+        if key not in existing:
+            to_create.append(model(**row))
+            continue
+        pk, old_values = existing[key]
+        values = tuple(row.get(f) for f in value_fields)
+        if values == old_values:
+            stats['unchanged'] += 1
+        else:
+            model.objects.filter(pk = pk).update(**dict(zip(value_fields, values)))
+            stats['updated'] += 1
+            
+    for i in xrange(0, len(to_create), chunk_size):
+        model.objects.bulk_create(to_create[i:i + chunk_size])
+    stats['created'] = len(to_create)
+    return stats
+
+
+def get_or_create_colors(rgbs, chunk_size = CHUNK_SIZE):
+    """Get primary keys of ``Color``-instances for rgb-colors, creating the missing ones.
+    
+    Colors are matched by their rgb-values, not by html codes, whose case 
+    differs between old and new rows and whose comparison depends on the 
+    database's collation. New colors are stored with lowercase html codes 
+    (see ``color_utils.rgb2html``) and matched colors with uppercase html codes
+    are normalised into lowercase. Lab-values of the new colors are calculated
+    in one vectorized pass. Should be called inside a transaction.
+    
+    **Args**
+        | rgbs (iterable): Colors as rgb-tuples.
+        | chunk_size (int): Amount of colors inserted with one query.
+        
+    **Returns**
+        dict -- rgb-tuple -> primary key of the ``Color``-instance.
+    """
+    __set_django()
+    from tweets.models import Color
+    import color as cu
+    
+    rgbs = set(tuple(rgb) for rgb in rgbs)
+    if len(rgbs) == 0:
+        return {}
+    pks = _find_colors(rgbs)
+    missing = sorted(rgbs - set(pks))
+    if len(missing) == 0:
+        return pks
+    
+    labs = cu.to_lab_array(missing)
+    colors = []
+    for (R, G, B), (l, a, b) in zip(missing, labs):
+        colors.append(Color(html = cu.rgb2html((R, G, B)), hex = cu.rgb2hex((R, G, B)), 
+                            rgb_r = R, rgb_g = G, rgb_b = B, l = float(l), a = float(a), b = float(b)))
+    for i in xrange(0, len(colors), chunk_size):
+        Color.objects.bulk_create(colors[i:i + chunk_size])
+    # bulk_create does not set primary keys, fetch the created colors.
+    pks.update(_find_colors(set(missing)))
+    logger.info("Created {} new colors.".format(len(colors)))
+    return pks
+
+
+def _find_colors(rgbs):
+    """Primary keys of the stored colors with given rgb-values, normalising their html codes."""
+    from tweets.models import Color
+    import color as cu
+    
+    pks = {}
+    rows = Color.objects.filter(rgb_r__in = set(r for r, g, b in rgbs), rgb_g__in = set(g for r, g, b in rgbs), 
+                                rgb_b__in = set(b for r, g, b in rgbs))
+    found = {}
+    for pk, html, R, G, B in rows.order_by('pk').values_list('pk', 'html', 'rgb_r', 'rgb_g', 'rgb_b'):
+        if (R, G, B) in rgbs:
+            found.setdefault((R, G, B), []).append((pk, html))
+    for rgb, colors in found.items():
+        html = cu.rgb2html(rgb)
+        normalised = [pk for pk, h in colors if h == html]
+        if len(normalised) > 0:
+            # Case sensitive databases may have both cases of the same color.
+            pks[rgb] = normalised[0]
+        else:
+            pks[rgb] = colors[0][0]
+            Color.objects.filter(pk = pks[rgb]).update(html = html)
+    return pks
+
 
 def populate_bracketed_color_bigrams(filepath = "../resources/bracketed_color_bigrams.tsv"):
     """Populate BracketedColorBigrams model with entries found from file.
     
     File should be in tab separated format, where each line has model fields
-    in the following order: *start_bracket, w1, w2, end_bracket, f*. 
+    in the following order: *start_bracket, w1, w2, end_bracket, f*. Natural
+    key is *start_bracket, w1, w2, end_bracket*.
     
     .. note::
         The first line of the file is though to contain field names and is omitted.
     
     **Args**
         | filepath (str): Path to the file with entries.
+        
+    **Returns**
+        dict -- Loading statistics, see :py:func:`bulk_upsert`.
     """
     __set_django()
+    from django.db import transaction
     from tweets.models import BracketedColorBigram
     
-    with open(filepath, 'r') as filehandle:
-        entries = filehandle.readlines()
-        
-    for e in entries[1:]:
-        try:
-            sb, w1, w2, eb, f = e.strip().split("\t")
-            print "Reading: ", sb, w1, w2, eb, f
-            instance = BracketedColorBigram(start_bracket = sb, w1 = w1, w2 = w2,\
-                                             end_bracket = eb, f = int(f))
-            instance.save()
-        except:
-            pass
+    rows = ({'start_bracket': sb, 'w1': w1, 'w2': w2, 'end_bracket': eb, 'f': int(f)}
+            for sb, w1, w2, eb, f in read_tsv(filepath, 5))
+    with transaction.atomic():
+        return bulk_upsert(BracketedColorBigram, rows, ('start_bracket', 'w1', 'w2', 'end_bracket'))
 
 
 def populate_colormap(filepath = "../resources/color_map.tsv"):
     """Populate ColorMap model with entries found from file.
     
     File should be in tab separated format, where each line has model fields
-    in the following order: *stereotype, color, html*. 
+    in the following order: *stereotype, color, html*. Natural key is 
+    *stereotype, color*. Missing colors are added into ``Color``-model.
     
     .. note::
         The first line of the file is though to contain field names and is omitted.
     
     **Args**
         | filepath (str): Path to the file with entries.
+        
+    **Returns**
+        dict -- Loading statistics, see :py:func:`bulk_upsert`.
     """
     __set_django()
-    from tweets.models import ColorMap, Color
+    from django.db import transaction
+    from tweets.models import ColorMap
     import color as cu
     
-    with open(filepath, 'r') as filehandle:
-        entries = filehandle.readlines()
-        
-    for e in entries[1:]:
+    entries = []
+    for s, c, html in read_tsv(filepath, 3):
         try:
-            s, c, html = e.strip().split("\t")
-            print "Reading: ", s, c, html
-            html = html.strip()
-            R, G, B = cu.html2rgb(html)
-            chex = cu.rgb2hex((R, G, B))
-            l, a, b = (cu._2lab((R, G, B))).get_value_tuple()
-            color_inst = Color.objects.get_or_none(html = html)                                                   
-            if color_inst is None:
-                color_inst = Color(html = html, hex = chex, rgb_r = R, rgb_g = G, rgb_b = B, l = l, a = a, b = b)
-                color_inst.save()
-            instance = ColorMap(stereotype = s, base_color = c, color = color_inst)
-            instance.save()
-        except:
-            pass
+            entries.append((s, c, cu.html2rgb(html)))
+        except TypeError:
+            logger.warning("Skipping stereotype '{}' with invalid color '{}'.".format(s, html))
+            
+    with transaction.atomic():
+        colors = get_or_create_colors(rgb for s, c, rgb in entries)
+        rows = ({'stereotype': s, 'base_color': c, 'color_id': colors[rgb]} for s, c, rgb in entries)
+        return bulk_upsert(ColorMap, rows, ('stereotype', 'base_color'))
         
         
 def populate_color_unigrams(filepath = "../resources/color_unigrams.tsv"):
     """Populate ColorUnigrams model with entries found from file.
     
     File should be in tab separated format, where each line has model fields
-    in the following order: *solid_compound, f*. 
+    in the following order: *solid_compound, f*. Natural key is *solid_compound*,
+    frequencies of the solid compounds occurring several times are summed.
     
     .. note::
         The first line of the file is though to contain field names and is omitted.
     
     **Args**
         | filepath (str): Path to the file with entries.
+        
+    **Returns**
+        dict -- Loading statistics, see :py:func:`bulk_upsert`.
     """
     __set_django()
+    from django.db import transaction
     from tweets.models import ColorUnigram
     
-    with open(filepath, 'r') as filehandle:
-        entries = filehandle.readlines()
-        
-    for e in entries[1:]:
-        try:
-            s, f = e.strip().split("\t")
-            print "Reading: ", s, f
-            instance = ColorUnigram(solid_compound = s, f = int(f))
-            instance.save()
-        except:
-            pass
+    freqs = OrderedDict()
+    for s, f in read_tsv(filepath, 2):
+        freqs[s] = freqs.get(s, 0) + int(f)
+    rows = ({'solid_compound': s, 'f': f} for s, f in freqs.items())
+    with transaction.atomic():
+        return bulk_upsert(ColorUnigram, rows, ('solid_compound',))
             
         
 def populate_everycolorbot_tweets(filepath = "../resources/everycolorbot_tweets.tsv"):
     """Populate EveryColorBotTweets model with entries found from file.
     
     File should be in tab separated format, where each line has model fields
-    in the following order: *hex, url*. 
+    in the following order: *hex, url*. Natural key is *url*, and existing 
+    tweets keep their ``tweeted`` status. Missing colors are added into 
+    ``Color``-model.
     
     .. note::
         The first line of the file is though to contain field names and is omitted.
     
     **Args**
         | filepath (str): Path to the file with entries.
+        
+    **Returns**
+        dict -- Loading statistics, see :py:func:`bulk_upsert`.
     """
     __set_django()
-    from tweets.models import EveryColorBotTweet, Color
+    from django.db import transaction
+    from tweets.models import EveryColorBotTweet
     import color as cu
     
-    with open(filepath, 'r') as filehandle:
-        entries = filehandle.readlines()
-        
-    for e in entries[1:]:
-        try: 
-            chex, u = e.strip().split("\t")
-            print "Reading: ", chex, u
-            R, G, B = cu.hex2rgb(chex)
-            html = cu.rgb2html((R, G, B))
-            l, a, b = (cu._2lab((R, G, B))).get_value_tuple()
-            color_inst = Color.objects.get_or_none(html = html)                                                   
-            if color_inst is None:
-                color_inst = Color(html = html, hex = chex, rgb_r = R, rgb_g = G, rgb_b = B, l = l, a = a, b = b)
-                color_inst.save()
-            instance = EveryColorBotTweet(url = u, color = color_inst, tweeted = False)
-            instance.save()
-        except:
-            pass
+    entries = []
+    for chex, u in read_tsv(filepath, 2):
+        try:
+            entries.append((cu.hex2rgb(chex), u))
+        except TypeError:
+            logger.warning("Skipping tweet {} with invalid color '{}'.".format(u, chex))
+    
+    with transaction.atomic():
+        colors = get_or_create_colors(rgb for rgb, u in entries)
+        rows = ({'url': u, 'color_id': colors[rgb]} for rgb, u in entries)
+        return bulk_upsert(EveryColorBotTweet, rows, ('url',))
         
         
 def populate_plural_color_bigrams(filepath = "../resources/plural_color_bigrams.tsv"):
     """Populate PluralColorBigrams model with entries found from file.
     
     File should be in tab separated format, where each line has model fields
-    in the following order: *w1, w2, f, singular*. 
+    in the following order: *w1, w2, f, singular*. Natural key is 
+    *w1, w2, singular*.
     
     .. note::
         The first line of the file is though to contain field names and is omitted.
     
     **Args**
         | filepath (str): Path to the file with entries.
+        
+    **Returns**
+        dict -- Loading statistics, see :py:func:`bulk_upsert`.
     """
     __set_django()
+    from django.db import transaction
     from tweets.models import PluralColorBigram
     
-    with open(filepath, 'r') as filehandle:
-        entries = filehandle.readlines()
-        
-    for e in entries[1:]:
-        try:
-            w1, w2, f, s = e.strip().split("\t")
-            print "Reading: ", w1, w2, f, s
-            instance = PluralColorBigram(w1 = w1, w2 = w2,\
-                                             singular = s, f = int(f))
-            instance.save()
-        except:
-            pass
+    rows = ({'w1': w1, 'w2': w2, 'singular': s, 'f': int(f)} for w1, w2, f, s in read_tsv(filepath, 4))
+    with transaction.atomic():
+        return bulk_upsert(PluralColorBigram, rows, ('w1', 'w2', 'singular'))
 
 
 def populate_unbracketed_color_bigrams(filepath = "../resources/unbracketed_color_bigrams.tsv"):
     """Populate UnnracketedColorBigrams model with entries found from file.
     
     File should be in tab separated format, where each line has model fields
-    in the following order: *w1, w2, f*. 
+    in the following order: *w1, w2, f*. Natural key is *w1, w2*.
     
     .. note::
         The first line of the file is though to contain field names and is omitted.
     
     **Args**
         | filepath (``str``): Path to the file with entries.
+        
+    **Returns**
+        dict -- Loading statistics, see :py:func:`bulk_upsert`.
     """
     __set_django()
+    from django.db import transaction
     from tweets.models import UnbracketedColorBigram
     
-    with open(filepath, 'r') as filehandle:
-        entries = filehandle.readlines()
+    rows = ({'w1': w1, 'w2': w2, 'f': int(f)} for w1, w2, f in read_tsv(filepath, 3))
+    with transaction.atomic():
+        return bulk_upsert(UnbracketedColorBigram, rows, ('w1', 'w2'))
+
+
+class PrefixTrie():
+    """Prefix trie of words for finding the words a string starts with.
+    
+    **Args**
+        | words (iterable): Words stored in the trie.
+    """
+    _END = None
+    
+    def __init__(self, words = ()):
+        self.root = {}
+        self.words = set()
+        for w in words:
+            self.add(w)
+            
+    def __contains__(self, word):
+        return word in self.words
+    
+    def __len__(self):
+        return len(self.words)
+            
+    def add(self, word):
+        """Add word into the trie."""
+        if len(word) == 0:
+            return
+        node = self.root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[self._END] = True
+        self.words.add(word)
+        
+    def prefixes(self, text):
+        """Lengths of the words in the trie which are prefixes of the text.
+        
+        **Returns**
+            list -- Prefix lengths in ascending order.
+        """
+        ret = []
+        node = self.root
+        for i, ch in enumerate(text):
+            node = node.get(ch)
+            if node is None:
+                break
+            if self._END in node:
+                ret.append(i + 1)
+        return ret
+    
+    def splits(self, text):
+        """All splits of the text into two words in the trie.
+        
+        **Returns**
+            list -- (w1, w2)-tuples, shortest w1 first.
+        """
+        return [(text[:i], text[i:]) for i in self.prefixes(text) if text[i:] in self.words]
+    
+    
+def split_compounds(compounds, colornames):
+    """Split solid compounds into two color names.
+    
+    Each compound is handled in time linear to its length, independent of
+    the amount of color names.
+    
+    **Args**
+        | compounds (iterable): Solid compounds, e.g. ``'amberdawn'``.
+        | colornames (iterable): Color names the compounds are split into.
         
-    for e in entries[1:]:
-        w1, w2, f = e.strip().split("\t")
-        print "Reading: ", w1, w2, f
-        try: 
-            instance = UnbracketedColorBigram(w1 = w1, w2 = w2, f = int(f))
-            instance.save()
-        except:
-            pass
+    **Yields**
+        tuple -- (compound, w1, w2) for all splits of each compound.
+    """
+    trie = PrefixTrie(colornames)
+    for compound in compounds:
+        for w1, w2 in trie.splits(compound):
+            yield (compound, w1, w2)
 
 
-def split_unigrams():
+def split_unigrams(chunk_size = CHUNK_SIZE):
     """Split ``ColorUnigram``-instances from database into two words and save them into
     ``ColorUnigramSplit``-model.
     
     Splitting is done by looking for color names from ``ColorMap``-model's ``stereotype``
-    and ``base_color`` fields. Unigrams which can not be splitted into two parts 
-    based on these color names are omitted.
+    and ``base_color`` fields with :py:func:`split_compounds`. All splits of 
+    each unigram are saved, and unigrams which can not be splitted into two 
+    parts based on these color names are omitted. Already saved splits are
+    skipped and new splits are inserted with chunked ``bulk_create``.
+    
+    **Args**
+        | chunk_size (int): Amount of splits inserted with one query.
+        
+    **Returns**
+        int -- Amount of saved new splits.
     """
     __set_django()
+    from django.db import transaction
     from tweets.models import ColorUnigram, ColorUnigramSplit, ColorMap
-    colormaps = ColorMap.objects.all()
     colornames = set()
-    for c in colormaps:
-        colornames.add(c.stereotype)
-        colornames.add(c.base_color)
+    for stereotype, base_color in ColorMap.objects.values_list('stereotype', 'base_color'):
+        colornames.add(stereotype)
+        colornames.add(base_color)
         
-    colornames = sorted(colornames)
-    unigrams = ColorUnigram.objects.all()
-    splits = []
-    for u in unigrams:
-        solid = u.solid_compound
-        for c in colornames:
-            if solid.startswith(c):
-                if solid[len(c):] in colornames:
-                    w1 = solid[:len(c)]
-                    w2 = solid[len(c):] 
-                    print w1, w2
-                    splits.append((w1, w2))
-                    if ColorUnigramSplit.objects.get_or_none(w1 = w1, w2 = w2) is None:
-                        cus = ColorUnigramSplit(w1 = w1, w2 = w2, original = u)
-                        cus.save()
-                    break    
-    
-    print "Found", len(splits), "splits from original", len(unigrams), "unigrams."
+    pks = {}
+    for pk, solid in ColorUnigram.objects.order_by('pk').values_list('pk', 'solid_compound').iterator():
+        pks.setdefault(solid, pk)
+    
+    with transaction.atomic():
+        existing = set(ColorUnigramSplit.objects.values_list('w1', 'w2'))
+        found = 0
+        new = []
+        for solid, w1, w2 in split_compounds(pks.keys(), colornames):
+            found += 1
+            if (w1, w2) not in existing:
+                existing.add((w1, w2))
+                new.append(ColorUnigramSplit(w1 = w1, w2 = w2, original_id = pks[solid]))
+        for i in xrange(0, len(new), chunk_size):
+            ColorUnigramSplit.objects.bulk_create(new[i:i + chunk_size])
+    
+    logger.info("Found {} splits from original {} unigrams, saved {} new splits.".format(found, len(pks), len(new)))
+    return len(new)
 
 
-def populate_default():
+#: Resources loaded by :py:func:`populate_default` in loading order, name -> (function, file name).
+RESOURCES = OrderedDict((
+    ('plural_color_bigrams', (populate_plural_color_bigrams, 'plural_color_bigrams.tsv')),
+    ('color_unigrams', (populate_color_unigrams, 'color_unigrams.tsv')),
+    ('colormap', (populate_colormap, 'color_map.tsv')),
+    ('unbracketed_color_bigrams', (populate_unbracketed_color_bigrams, 'unbracketed_color_bigrams.tsv')),
+    ('bracketed_color_bigrams', (populate_bracketed_color_bigrams, 'bracketed_color_bigrams.tsv')),
+    ('everycolorbot_tweets', (populate_everycolorbot_tweets, 'everycolorbot_tweets.tsv')),
+))
+
+
+def populate_default(folder = "../resources"):
     """Call all distinct populate functions with default parameters.
     
     Default parameter for each model points into `../resources/<relevant_file_name>.tsv`.
+    
+    **Args**
+        | folder (str): Folder with the resource files.
+        
+    **Returns**
+        OrderedDict -- resource name -> loading statistics, see :py:func:`bulk_upsert`.
     """
-    populate_plural_color_bigrams("../resources/plural_color_bigrams.tsv") 
-    populate_color_unigrams("../resources/color_unigrams.tsv")
-    populate_colormap("../resources/color_map.tsv")
-    populate_unbracketed_color_bigrams("../resources/unbracketed_color_bigrams.tsv")
-    populate_bracketed_color_bigrams("../resources/bracketed_color_bigrams.tsv")
-    populate_everycolorbot_tweets("../resources/everycolorbot_tweets.tsv")
+    stats = OrderedDict()
+    for name, (populate, filename) in RESOURCES.items():
+        stats[name] = populate(os.path.join(folder, filename))
+        logger.info("Loaded {}: {}".format(name, stats[name]))
     split_unigrams()
+    return stats
     
     
 if __name__ == "__main__":
@@ -45,15 +45,20 @@ def prettify(words):
     return pretty_sentence[0].upper() + pretty_sentence[1:]
 
 
+_STOPS = {'a', 'an', 'the', 'of', 'in'}
+
+
+def word_set(sentence):
+    '''Set of lower cased words in the sentence, excluding some stop words.'''
+    return set(TextBlob(sentence.lower()).words) - _STOPS
+
+
 def same_words(sentence1, sentence2):
     '''Amount of same words in sentences. 
     
     Some stop words are excluded from the count.
     '''
-    stops = {'a', 'an', 'the', 'of', 'in'}
-    A = set(TextBlob(sentence1.lower()).words) - stops
-    B = set(TextBlob(sentence2.lower()).words) - stops
-    return len(A & B)
+    return len(word_set(sentence1) & word_set(sentence2))
     
 
 def sentiment(text):
@@ -10,7 +10,8 @@ import random
 from django.http import HttpResponse
 from django.shortcuts import render_to_response
 from django.template import RequestContext
-from tweets.core import TWEET_CORE
+from tweets.core import TWEET_CORE, remove_media
+from tweets import registry, memory
 
 
 def home(request):
@@ -40,8 +41,9 @@ def names(request):
     objects = EveryColorBotTweet.objects.all()
     names = []
     samples = random.sample(objects, 10)
+    mem = memory.current()
     for o in samples:
-        n = semantics.get_knn_blended_unigrams(o.color.html, k = 4)
+        n = semantics.get_knn_blended_unigrams(o.color.html, k = 4, mem = mem)
         names.append({'color': o.color.html, 'url': o.url, 
                       'c1': n[0][1], 'n1': n[0][2][0] + n[0][2][1],
                       'c2': n[1][1], 'n2': n[1][2][0] + n[1][2][1],
@@ -56,13 +58,11 @@ def names(request):
 def tweets(request, num = 1):
     """Test tweeting functionality."""   
     tweets = []
-    for i in xrange(int(num)):
-        ret = TWEET_CORE.tweet(send_to_twitter = False)
-        if ret.tweet:
-            tweet = ret.tweet
-            color_code = ret.color_code
-            value = ret.appreciation
-            tweets.append({'tweet': tweet, 'color_code': color_code, 'value': value})
+    # Forking worker processes inside a web request would break its database connection.
+    candidates = TWEET_CORE.tweet_many(int(num), workers = 1)
+    remove_media(candidates)
+    for ret in candidates:
+        tweets.append({'tweet': ret.tweet, 'color_code': ret.color_code, 'value': ret.appreciation})
         
     context = RequestContext(request, {'tweets': tweets})
     return render_to_response('tweets_test.html', context)
@@ -90,10 +90,9 @@ def aura_color(request):
 
 
 def mood_color_test(request, category = 'negative'):
-    import gensim
     import new_age
     from web import therex
-    model = gensim.models.Word2Vec.load('../../nltk_data/gensim/googlenews_gensim_v2w.model')
+    model = registry.get('word2vec')
     mc = new_age.mood_colors.items()
     ret = therex.categories('{}:emotion'.format(category))['Members']
     negemo = []
@@ -122,11 +121,10 @@ def mood_color_test(request, category = 'negative'):
 
 
 def interjection_test(request, category = 'negative'):
-    import gensim
     import new_age
     import interjections
     from web import therex
-    model = gensim.models.Word2Vec.load('../../nltk_data/gensim/googlenews_gensim_v2w.model')
+    model = registry.get('word2vec')
     mc = new_age.mood_colors.items()
     ret = therex.categories('{}:emotion'.format(category))['Members']
     emotions = []
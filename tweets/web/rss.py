@@ -3,13 +3,48 @@
     :platform: Unix
 
 Interface for reading RSS feeds and extracting plain text articles from them.
+
+Articles are downloaded concurrently by a thread pool, and parsed (and their 
+bag-of-words extracted) in a process pool, see :py:func:`iter_articles`. The 
+process pool is created on first use and reused by later calls, see 
+:py:data:`PARSE_PROCESSES`.
+
+Feeds' entries are stored in a persistent :py:class:`~tweets.utils.cache.DiskCache`
+(``RSS_CACHE_PATH`` in Django settings) together with their ETag and 
+Last-Modified headers, which are used to make conditional requests when the
+feeds are refreshed. :py:class:`tweets.cron.RSSFeedRefresher` refreshes all 
+:py:data:`REUTERS_RSS_FEEDS` regularly, so that reading them does not usually
+need a web request.
 '''
 import re
-import urllib
+import time
+import Queue
+import logging
+import threading
+import traceback
+import urllib2
 import feedparser
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 from bs4 import BeautifulSoup as BS
 
 from ..utils import text
+from ..utils.cache import DiskCache
+
+logger = logging.getLogger('tweets.default')
+
+#: HTML parser used by BeautifulSoup, lxml is notably faster than Python's own.
+HTML_PARSER = 'lxml'
+#: Timeout for downloading and for parsing an article in seconds.
+TIMEOUT = 10
+#: Amount of article parsing processes, None for the amount of CPUs. If 0, 
+#: articles are parsed in the calling process.
+PARSE_PROCESSES = None
+#: Feed entries' fields stored in the feed cache.
+ENTRY_FIELDS = ('title', 'link', 'id', 'published', 'summary')
+_feed_cache = None
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
 
 REUTERS_RSS_FEEDS = {
     'politics': 'http://feeds.reuters.com/Reuters/PoliticsNews',
@@ -30,19 +65,88 @@ environment_topic = ['environment', 'climate', 'vegetation', 'animal', 'organism
 politics_topic = ['politics', 'legislation', 'government', 'party', 'president']
 topics = {'war': war_topic, 'arts': arts_topic, 'environment': environment_topic, 'politics': politics_topic}
 
-def get_feed(rss_url, max_items = 10):
+def get_feed(rss_url, max_items = 10, max_age = None):
     '''Get most recent entries from the given RSS feed.
     
-    The returned entries are in the same format as created by `feedparser <http://pythonhosted.org/feedparser/>`_.
+    The entries are read from the feed cache, if they have been refreshed in
+    last ``max_age`` seconds. Otherwise the feed is refreshed first, see 
+    :py:func:`refresh_feed`. The returned entries are dictionaries with the 
+    keys in :py:data:`ENTRY_FIELDS`, named as in 
+    `feedparser <http://pythonhosted.org/feedparser/>`_.
     
     :param rss_url: URL to the RSS feed
     :type rss_url: str
     :param max_items: Maximum amount of items returned from feed
     :type max_items: int
+    :param max_age: Maximum age of the cached entries in seconds, defaults to ``RSS_FEED_MAX_AGE`` in Django settings.
+    :type max_age: int
     :returns: list - feed's last entries
     '''
-    feed = feedparser.parse(rss_url)
-    return feed['entries'] if len(feed['entries']) < max_items else feed['entries'][:max_items]
+    if max_age is None:
+        from django.conf import settings
+        max_age = settings.RSS_FEED_MAX_AGE
+    found, cached = _get_feed_cache().get(rss_url)
+    if found and cached is not None and time.time() - cached['refreshed'] < max_age:
+        entries = cached['entries']
+    else:
+        entries = refresh_feed(rss_url)
+    return entries[:max_items]
+
+
+def refresh_feed(rss_url):
+    '''Refresh feed's entries in the feed cache.
+    
+    Makes a conditional request with the cached ETag and Last-Modified values. 
+    If the feed has not been modified, or the request fails, the cached entries
+    are kept.
+    
+    :param rss_url: URL to the RSS feed
+    :type rss_url: str
+    :returns: list -- feed's entries
+    '''
+    cache = _get_feed_cache()
+    found, cached = cache.get(rss_url)
+    if not found or cached is None:
+        cached = {'etag': None, 'modified': None, 'entries': [], 'refreshed': 0}
+    try:
+        feed = feedparser.parse(rss_url, etag = cached['etag'], modified = cached['modified'])
+    except Exception:
+        logger.error("Could not refresh RSS feed {}: {}".format(rss_url, traceback.format_exc()))
+        return cached['entries']
+        
+    status = feed.get('status')
+    if status == 304:
+        logger.info("RSS feed {} has not been modified.".format(rss_url))
+    elif len(feed['entries']) > 0:
+        cached['entries'] = [dict((k, e.get(k)) for k in ENTRY_FIELDS) for e in feed['entries']]
+        cached['etag'] = feed.get('etag')
+        cached['modified'] = feed.get('modified')
+    else:
+        logger.error("RSS feed {} returned no entries (status: {}).".format(rss_url, status))
+        return cached['entries']
+    cached['refreshed'] = time.time()
+    cache.put(rss_url, cached)
+    return cached['entries']
+
+
+def refresh_feeds(feeds = None):
+    '''Refresh all given feeds, see :py:func:`refresh_feed`.
+    
+    :param feeds: URLs of the RSS feeds, defaults to :py:data:`REUTERS_RSS_FEEDS`.
+    :type feeds: list
+    :returns: dict -- URL -> amount of entries in the feed.
+    '''
+    if feeds is None:
+        feeds = REUTERS_RSS_FEEDS.values()
+    return dict((url, len(refresh_feed(url))) for url in feeds)
+
+
+def _get_feed_cache():
+    global _feed_cache
+    if _feed_cache is None:
+        from django.conf import settings
+        _feed_cache = DiskCache(settings.RSS_CACHE_PATH, ttl = settings.RSS_CACHE_TTL)
+    return _feed_cache
 
 
 def get_articles(rss_url, url_type='reuters', amount = 10, bow = True):
@@ -59,6 +163,10 @@ def get_articles(rss_url, url_type='reuters', amount = 10, bow = True):
     bow      Optional, bag-of-words extracted from the article
     =====    =================================================
     
+    Articles are downloaded and parsed concurrently, see :py:func:`iter_articles`,
+    and returned in the feed's order. Articles which could not be downloaded or
+    parsed are left out.
+    
     :param rss_url: URL to the RSS feed
     :type rss_url: str
     :param url_type: Format of the html-pages to parse for plain text article. See :py:SUPPORTED_FORMATS.
@@ -69,27 +177,152 @@ def get_articles(rss_url, url_type='reuters', amount = 10, bow = True):
     :type bow: bool
     :returns: list -- Parsed articles  
     '''
+    articles = sorted(_iter_articles(rss_url, url_type, amount, bow), key = lambda x: x[0])
+    return [a for i, a in articles]
+
+
+def get_article(entry, url_type = 'reuters', bow = True):
+    '''Download and parse single feed entry's article in the calling thread.
+    
+    :param entry: Feed entry, see :py:func:`get_feed`.
+    :type entry: dict
+    :param url_type: Format of the html-page to parse for plain text article. See :py:SUPPORTED_FORMATS.
+    :type url_type: str
+    :param bow: Get also bag-of-words for the article.
+    :type bow: bool
+    :returns: dict -- Article in the format of :py:func:`get_articles`, or None if it could not be downloaded or parsed. 
+    '''
+    if url_type not in SUPPORTED_FORMATS:
+        raise ValueError('Given url_type: {} not in supported formats.'.format(url_type))
+    ret = _process_article(_fetch_article((0, entry['title'], entry['link'], url_type, bow)))
+    return ret[1] if ret is not None else None
+
+
+def iter_articles(rss_url, url_type = 'reuters', amount = 10, bow = True, workers = 8):
+    '''Iterate over most recent articles from the given RSS feed as soon as 
+    they are ready.
+    
+    Articles are downloaded concurrently with at most ``workers`` threads, and
+    each downloaded article is parsed in the shared process pool (see 
+    :py:func:`get_parse_pool`). The articles are yielded in the order they are 
+    ready, in the same format as in :py:func:`get_articles`. Articles which can
+    not be downloaded or parsed (in :py:data:`TIMEOUT` seconds) are logged and 
+    skipped. The download threads are terminated when the iteration is 
+    stopped, so it is cheap to stop after the first suitable article. 
+    
+    :param rss_url: URL to the RSS feed
+    :type rss_url: str
+    :param url_type: Format of the html-pages to parse for plain text article. See :py:SUPPORTED_FORMATS.
+    :type url_type: str
+    :param amount: Maximum amount of articles to retrieve. For safety, should be in [1, 25].
+    :type amount: int
+    :param bow: Get also bag-of-words for each article.
+    :type bow: bool
+    :param workers: Maximum amount of concurrent downloads.
+    :type workers: int
+    :returns: generator -- Parsed articles 
+    '''
+    for i, article in _iter_articles(rss_url, url_type, amount, bow, workers):
+        yield article
+        
+        
+def _iter_articles(rss_url, url_type, amount, bow, workers = 8):
+    '''Generate (entry index, article)-tuples for the feed's entries.'''
     if url_type not in SUPPORTED_FORMATS:
         raise ValueError('Given url_type: {} not in supported formats.'.format(url_type))
         
     entries = get_feed(rss_url, max_items = amount)
-    ret = []
-    for entry in entries:
-        article = {}
-        article['title'] = entry['title']
-        article['url'] = entry['link']
-        soup = _get_soup(entry['link'])
-        article['text'] = _parse_article(soup, url_type = url_type)
+    if len(entries) == 0:
+        return
+    jobs = [(i, e['title'], e['link'], url_type, bow) for i, e in enumerate(entries)]
+    # Fork the parsing processes before starting any threads.
+    procs = get_parse_pool()
+    threads = ThreadPool(min(workers, len(jobs)))
+    try:
+        if procs is None:
+            for fetched in threads.imap_unordered(_fetch_article, jobs):
+                ret = _process_article(fetched)
+                if ret is not None:
+                    yield ret
+            return
+        
+        parsed = Queue.Queue()
+        pending = 0
+        for fetched in threads.imap_unordered(_fetch_article, jobs):
+            if fetched[-1] is None:
+                continue
+            procs.apply_async(_process_article, (fetched,), callback = parsed.put)
+            pending += 1
+            # Yield the articles parsed while downloading the rest.
+            while True:
+                try:
+                    ret = parsed.get_nowait()
+                except Queue.Empty:
+                    break
+                pending -= 1
+                if ret is not None:
+                    yield ret
+        while pending > 0:
+            try:
+                ret = parsed.get(timeout = TIMEOUT)
+            except Queue.Empty:
+                logger.error("Parsing {} articles of {} timed out.".format(pending, rss_url))
+                return
+            pending -= 1
+            if ret is not None:
+                yield ret
+    finally:
+        threads.terminate()
+        
+        
+def get_parse_pool():
+    '''Get the process pool parsing the articles, created on first call.
+    
+    :returns: multiprocessing.Pool -- or None if articles are parsed in the calling process, i.e. :py:data:`PARSE_PROCESSES` is 0 or this is a daemonic process (e.g. a pool worker), which can not have children.
+    '''
+    global _parse_pool
+    if PARSE_PROCESSES == 0 or multiprocessing.current_process().daemon:
+        return None
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = multiprocessing.Pool(PARSE_PROCESSES)
+    return _parse_pool
+
+
+def close_parse_pool():
+    '''Terminate the process pool parsing the articles, it is created again when needed.'''
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.terminate()
+            _parse_pool = None
+        
+        
+def _fetch_article(job):
+    '''Download article's html, executed in a thread pool.'''
+    try:
+        html = urllib2.urlopen(job[2], timeout = TIMEOUT).read()
+    except Exception:
+        logger.error("Could not download article {}: {}".format(job[2], traceback.format_exc()))
+        html = None
+    return job + (html,)
+
+
+def _process_article(job):
+    '''Parse downloaded article and extract its bag-of-words, executed in a process pool.'''
+    i, title, url, url_type, bow, html = job
+    if html is None:
+        return None
+    try:
+        article = {'title': title, 'url': url}
+        article['text'] = _parse_article(BS(html, HTML_PARSER), url_type = url_type)
         if bow:
             article['bow_counts'] = text.bow(article['text'], counts = True)
             article['bow'] = [w[0] for w in article['bow_counts']]
-        ret.append(article)
-    return ret
-        
-        
-def _get_soup(url):
-    html = urllib.urlopen(url).read()
-    return BS(html)
+    except Exception:
+        logger.error("Could not parse article {}: {}".format(url, traceback.format_exc()))
+        return None
+    return (i, article)
      
         
 def _parse_article(soup, url_type = None): 
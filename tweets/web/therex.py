@@ -3,15 +3,27 @@
     :platform: Unix
     
 Interface for accessing `Thesaurus Rex <http://ngrams.ucd.ie/therex2/>`_. 
+
+Responses are stored in a persistent :py:class:`~tweets.utils.cache.DiskCache`
+keyed by the query URL, see ``THEREX_CACHE_PATH``, ``THEREX_CACHE_TTL`` and 
+``THEREX_NEGATIVE_TTL`` in Django settings. Failed queries are cached for the 
+shorter ``THEREX_NEGATIVE_TTL``. Tests, or anyone wanting to work offline, can 
+use a cache with recorded responses with :py:func:`set_cache`.
 '''
 import urllib2
 import logging
 import traceback
 import operator
+from multiprocessing.pool import ThreadPool
 from unidecode import unidecode
 from xml.etree import ElementTree as ET
 
+from tweets.utils.cache import DiskCache
+
 logger = logging.getLogger('tweets.default')
+#: Timeout for the web queries in seconds.
+TIMEOUT = 10
+_cache = None
 THESAURUS_REX_MEMBER_URL = "http://ngrams.ucd.ie/therex2/common-nouns/member.action?member={0}&kw={0}&needDisamb=true&xml=true"
 THESAURUS_REX_SHARE_URL = "http://ngrams.ucd.ie/therex2/common-nouns/share.action?word1={0}&word2={1}&xml=true"
 THESAURUS_REX_CATEGORY_URL= "http://ngrams.ucd.ie/therex2/common-nouns/category.action?cate={0}%3A{1}&xml=true"
@@ -92,11 +104,77 @@ def categories(word1, word2 = None):
         category = True
     try:
         url = _build_url(word1, word2, category = category)
-        logging.info("Requesting Thesaurus Rex URL: {}".format(url))
-        response = urllib2.urlopen(url).read()
+        response = _fetch(url)
+        if response is None:
+            return None
         et = ET.fromstring(response)
     except Exception:
         e = traceback.format_exc()
         logger.error("Could not get Thesaurus Rex categories, because of error: {}".format(e))
         return None 
-    return _get_dict(et, word1, word2, category = category)
\ No newline at end of file
+    return _get_dict(et, word1, word2, category = category)
+
+
+def categories_many(words, workers = 8):
+    '''Query for Thesaurus Rex categories of multiple words, see :py:func:`categories`.
+    
+    Words not in the cache are queried concurrently.
+    
+    :param words: Words in any format accepted by :py:func:`categories` as ``word1``.
+    :type words: list
+    :param workers: Maximum amount of concurrent web queries.
+    :type workers: int
+    :returns: dict -- word -> :py:func:`categories`'s return value for the word.
+    '''
+    words = list(set(words))
+    if len(words) == 0:
+        return {}
+    pool = ThreadPool(min(workers, len(words)))
+    try:
+        results = pool.map(categories, words)
+    finally:
+        pool.close()
+        pool.join()
+    return dict(zip(words, results))
+
+
+def set_cache(cache):
+    '''Set cache used for the responses, e.g. one with recorded responses.
+    
+    :param cache: Cache to use, or None to use the default cache.
+    :type cache: :py:class:`~tweets.utils.cache.DiskCache`
+    '''
+    global _cache
+    _cache = cache
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        from django.conf import settings
+        _cache = DiskCache(settings.THEREX_CACHE_PATH, ttl = settings.THEREX_CACHE_TTL, 
+                           negative_ttl = settings.THEREX_NEGATIVE_TTL)
+    return _cache
+
+
+def _fetch(url):
+    '''Get response for the URL from the cache, or from the web if it is not cached.
+    
+    :returns: str -- Response, or None if the query failed (now or recently).
+    '''
+    cache = _get_cache()
+    found, response = cache.get(url)
+    if found:
+        return response
+    try:
+        logger.info("Requesting Thesaurus Rex URL: {}".format(url))
+        response = urllib2.urlopen(url, timeout = TIMEOUT).read()
+        # Check that response is valid before caching it.
+        ET.fromstring(response)
+    except Exception:
+        e = traceback.format_exc()
+        logger.error("Thesaurus Rex query {} failed: {}".format(url, e))
+        cache.put_failure(url)
+        return None
+    cache.put(url, response)
+    return response
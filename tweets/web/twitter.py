@@ -0,0 +1,201 @@
+'''
+.. py:module:: twitter
+    :platform: Unix
+
+Shared Twitter client for the app.
+
+All Twitter requests go through the client returned by :py:func:`get_client`,
+which authenticates once per process and keeps track of the rate limits
+Twitter reports for each endpoint. Requests to an endpoint whose rate limit
+has been used up fail with :py:class:`RateLimitError` without contacting
+Twitter, until the limit resets.
+
+If ``TWITTER_FAKE`` is True in Django settings, :py:func:`get_client` returns a
+:py:class:`FakeClient` instead, which keeps the statuses in memory and does not
+use the network, e.g. for load testing the whole tweet pipeline.
+
+.. note::
+    tweepy 2.3 opens a new HTTPS connection for each request, so the
+    connection itself can not be kept alive before tweepy is upgraded to a
+    version using ``requests``-sessions. Only this module needs to change then.
+'''
+import time
+import logging
+import threading
+import itertools
+
+import tweepy
+
+logger = logging.getLogger('tweets.default')
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class RateLimitError(Exception):
+    '''Endpoint's rate limit has been used up.'''
+    pass
+
+
+class Client():
+    '''Twitter client using one authenticated tweepy API.
+
+    :param api_key: Twitter API key
+    :param api_secret: Twitter API secret
+    :param access_token: Twitter access token
+    :param access_token_secret: Twitter access token secret
+    '''
+    def __init__(self, api_key, api_secret, access_token, access_token_secret):
+        auth = tweepy.OAuthHandler(api_key, api_secret)
+        auth.set_access_token(access_token, access_token_secret)
+        self.api = tweepy.API(auth)
+        #: Endpoint -> dict with keys *limit*, *remaining* and *reset* (epoch seconds).
+        self.rate_limits = {}
+        self._lock = threading.Lock()
+
+    def _call(self, endpoint, *args, **kwargs):
+        limits = self.rate_limits.get(endpoint)
+        if limits is not None and limits['remaining'] <= 0 and limits['reset'] > time.time():
+            raise RateLimitError("Rate limit for {} used up until {}.".format(endpoint, time.ctime(limits['reset'])))
+        # tweepy's last_response is shared by the API, so calls are serialized.
+        with self._lock:
+            try:
+                return getattr(self.api, endpoint)(*args, **kwargs)
+            finally:
+                self._update_rate_limits(endpoint)
+
+    def _update_rate_limits(self, endpoint):
+        response = getattr(self.api, 'last_response', None)
+        if response is None:
+            return
+        try:
+            remaining = response.getheader('x-rate-limit-remaining')
+            if remaining is None:
+                return
+            self.rate_limits[endpoint] = {'limit': int(response.getheader('x-rate-limit-limit')),
+                                          'remaining': int(remaining),
+                                          'reset': int(response.getheader('x-rate-limit-reset'))}
+        except (AttributeError, TypeError, ValueError):
+            logger.warning("Could not read rate limits for {} from Twitter's response.".format(endpoint))
+
+    def update_status(self, status):
+        '''Post new status.
+
+        :returns: Status object returned by Twitter.
+        '''
+        return self._call('update_status', status = status)
+
+    def update_with_media(self, filename, status):
+        '''Post new status with an image.
+
+        :returns: Status object returned by Twitter, its text contains the image's URL.
+        '''
+        return self._call('update_with_media', filename = filename, status = status)
+
+    def user_timeline(self, screen_name, **kwargs):
+        '''Get user's recent statuses, keyword arguments are passed to tweepy.'''
+        return self._call('user_timeline', screen_name = screen_name, **kwargs)
+
+    def home_timeline(self, **kwargs):
+        '''Get statuses in the authenticated user's home timeline.'''
+        return self._call('home_timeline', **kwargs)
+
+    def me(self):
+        '''Get the authenticated user.'''
+        return self._call('me')
+
+
+class FakeUser():
+    def __init__(self, screen_name):
+        self.screen_name = screen_name
+
+
+class FakeStatus():
+    '''Status in the same format as tweepy's, for :py:class:`FakeClient`.'''
+    def __init__(self, id_str, text, screen_name):
+        self.id = int(id_str)
+        self.id_str = id_str
+        self.text = text
+        self.user = FakeUser(screen_name)
+        self.author = self.user
+
+
+class FakeClient():
+    '''In-memory Twitter client with the same interface as :py:class:`Client`.
+
+    Posted statuses are stored in :py:attr:`statuses`, newest first, and form
+    the home timeline. Other users' statuses can be added with :py:meth:`add_status`.
+
+    :param screen_name: Screen name of the fake authenticated user.
+    :type screen_name: str
+    :param latency: Seconds each call waits, to simulate network latency.
+    :type latency: float
+    '''
+    def __init__(self, screen_name = 'fakebot', latency = 0.0):
+        self.screen_name = screen_name
+        self.latency = latency
+        self.statuses = []
+        self.rate_limits = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def add_status(self, text, screen_name = None):
+        '''Add status to the fake timelines.'''
+        with self._lock:
+            status = FakeStatus(str(next(self._ids)), text, screen_name or self.screen_name)
+            self.statuses.insert(0, status)
+        return status
+
+    def update_status(self, status):
+        self._wait()
+        return self.add_status(status)
+
+    def update_with_media(self, filename, status):
+        self._wait()
+        return self.add_status(u"{} http://t.co/fake{}".format(status, len(self.statuses)))
+
+    def user_timeline(self, screen_name, count = 20, since_id = None, max_id = None, **kwargs):
+        self._wait()
+        return self._timeline(lambda s: s.user.screen_name == screen_name, count, since_id, max_id)
+
+    def home_timeline(self, count = 20, since_id = None, max_id = None, **kwargs):
+        self._wait()
+        return self._timeline(lambda s: True, count, since_id, max_id)
+
+    def _timeline(self, accept, count, since_id, max_id):
+        ret = [s for s in self.statuses if accept(s) and
+               (since_id is None or s.id > int(since_id)) and
+               (max_id is None or s.id <= int(max_id))]
+        return ret[:count]
+
+    def me(self):
+        self._wait()
+        return FakeUser(self.screen_name)
+
+
+def get_client():
+    '''Get shared Twitter client configured in Django settings.
+
+    :returns: :py:class:`Client`, or :py:class:`FakeClient` if ``TWITTER_FAKE`` is True.
+    '''
+    global _client
+    with _client_lock:
+        if _client is None:
+            from django.conf import settings
+            if getattr(settings, 'TWITTER_FAKE', False):
+                logger.info("Using fake Twitter client.")
+                _client = FakeClient()
+            else:
+                _client = Client(settings.TWITTER_API_KEY, settings.TWITTER_API_SECRET,
+                                 settings.TWITTER_ACCESS_TOKEN, settings.TWITTER_ACCESS_TOKEN_SECRET)
+    return _client
+
+
+def set_client(client):
+    '''Set the shared client, e.g. a :py:class:`FakeClient` in tests. None resets it.'''
+    global _client
+    _client = client
@@ -1,23 +1,58 @@
 '''
 .. py:module:: uclass
     :platform: Unix
-    
+
 Different text classification techniques using `uClassify <http://www.uclassify.com>`_.
 
 For each of the classifiers, the `texts` argument is a list of strings, which
-are classified separately.
+are classified separately. Each classifier returns a list of
+``(text, text coverage, [(class name, probability), ...])``-tuples in the same
+order as the texts.
+
+All classifications go through a shared :py:class:`Client`, which keeps its
+connection to uClassify open and sends classifications of several texts with
+several classifiers in one request, see :py:func:`classify_many`. Results are
+cached by text's hash and classifier name in a persistent
+:py:class:`~tweets.utils.cache.DiskCache` (``UCLASSIFY_CACHE_PATH`` in Django
+settings), so texts are classified with each classifier only once.
 '''
 import sys, os, logging
-from uclassify import uclassify as uc
+import base64
+import hashlib
+import httplib
+import threading
 import unidecode
+from xml.etree import ElementTree as ET
+from xml.sax.saxutils import quoteattr
 
 if 'DJANGO_SETTINGS_MODULE' not in os.environ:
     sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
     os.environ['DJANGO_SETTINGS_MODULE'] = 'TwatBot.settings'
 from django.conf import settings
 
+from tweets.utils.cache import DiskCache
+
 logger = logging.getLogger('tweets.default')
 
+#: Available classifiers, name -> (uClassify classifier name, username).
+CLASSIFIERS = {
+    'sentiment': ('Sentiment', 'uClassify'),
+    'mood': ('Mood', 'prfekt'),
+    'values': ('Values', 'prfekt'),
+    'mb_judging': ('Myers Briggs Judging Function', 'prfekt'),
+    'mb_attitude': ('Myers Briggs Attitude', 'prfekt'),
+    'mb_perceiving': ('Myers Briggs Perceiving Function', 'prfekt'),
+    'mb_lifestyle': ('Myers Briggs Lifestyle', 'prfekt'),
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class ClassifyError(Exception):
+    '''uClassify request failed.'''
+    pass
+
 
 def _parse(texts):
     t = []
@@ -25,74 +60,216 @@ def _parse(texts):
         t.append(unidecode.unidecode(txt))
     return t
 
+
+def _localname(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+class Client():
+    '''uClassify client, which reuses its connection and caches the results.
+
+    :param api_key: uClassify read API key.
+    :type api_key: str
+    :param cache: Cache for the results, or None to not cache them.
+    :type cache: :py:class:`~tweets.utils.cache.DiskCache`
+    :param batch_size: Maximum amount of texts sent in one request.
+    :type batch_size: int
+    :param timeout: Timeout for the requests in seconds.
+    :type timeout: int
+    '''
+    host = 'api.uclassify.com'
+
+    def __init__(self, api_key, cache = None, batch_size = 20, timeout = 30):
+        self.api_key = api_key
+        self.cache = cache
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.requests = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def classify(self, texts, classifier):
+        '''Classify texts with one classifier, see :py:func:`classify_many`.
+
+        :returns: list -- Classifications in the same order as the texts.
+        '''
+        return self.classify_many(texts, [classifier])[classifier]
+
+    def classify_many(self, texts, classifiers):
+        '''Classify texts with multiple classifiers.
+
+        Results missing from the cache are fetched with as few requests as
+        possible.
+
+        :param texts: Texts to classify
+        :type texts: list
+        :param classifiers: Names of the classifiers, keys of :py:data:`CLASSIFIERS`.
+        :type classifiers: list
+        :returns: dict -- classifier -> list of classifications in the same order as the texts.
+        :raises: KeyError for unknown classifiers, ClassifyError if the request fails.
+        '''
+        texts = _parse(texts)
+        hashes = [hashlib.sha1(t).hexdigest() for t in texts]
+        results = {}
+        missing = []
+        for c in classifiers:
+            if c not in CLASSIFIERS:
+                raise KeyError("Unknown classifier '{}'".format(c))
+            for h in set(hashes):
+                key = '{}:{}'.format(h, c)
+                found, value = self.cache.get(key) if self.cache is not None else (False, None)
+                if found:
+                    results[key] = value
+                else:
+                    missing.append((h, c))
+
+        if len(missing) > 0:
+            text_for_hash = dict(zip(hashes, texts))
+            missing_hashes = sorted(set(h for h, c in missing))
+            for i in xrange(0, len(missing_hashes), self.batch_size):
+                batch = set(missing_hashes[i:i + self.batch_size])
+                calls = [(h, c) for h, c in missing if h in batch]
+                fetched = self._request(text_for_hash, calls)
+                for (h, c), value in fetched.items():
+                    key = '{}:{}'.format(h, c)
+                    results[key] = value
+                    if self.cache is not None:
+                        self.cache.put(key, value)
+
+        ret = {}
+        for c in classifiers:
+            ret[c] = [(t, ) + results['{}:{}'.format(h, c)] for t, h in zip(texts, hashes)]
+        return ret
+
+    def _build_request(self, text_for_hash, calls):
+        hashes = sorted(set(h for h, c in calls))
+        text_ids = dict((h, 'text{}'.format(i)) for i, h in enumerate(hashes))
+        xml = ['<?xml version="1.0" encoding="utf-8" ?>',
+               '<uclassify xmlns="http://api.uclassify.com/1/RequestSchema" version="1.01">',
+               '<texts>']
+        for h in hashes:
+            xml.append('<textBase64 id="{}">{}</textBase64>'.format(text_ids[h], base64.b64encode(text_for_hash[h])))
+        xml.append('</texts>')
+        xml.append('<readCalls readApiKey={}>'.format(quoteattr(self.api_key)))
+        call_ids = {}
+        for i, (h, c) in enumerate(calls):
+            call_id = 'call{}'.format(i)
+            call_ids[call_id] = (h, c)
+            name, username = CLASSIFIERS[c]
+            xml.append('<classify id="{}" username={} classifierName={} textId="{}"/>'.format(
+                       call_id, quoteattr(username), quoteattr(name), text_ids[h]))
+        xml.append('</readCalls>')
+        xml.append('</uclassify>')
+        return "\n".join(xml), call_ids
+
+    def _post(self, body):
+        '''POST body to uClassify over the kept-alive connection.'''
+        with self._lock:
+            for attempt in (0, 1):
+                if self._conn is None:
+                    self._conn = httplib.HTTPConnection(self.host, timeout = self.timeout)
+                try:
+                    self._conn.request('POST', '/', body, {'Content-Type': 'text/xml; charset=utf-8'})
+                    response = self._conn.getresponse()
+                    content = response.read()
+                except (httplib.HTTPException, IOError):
+                    # Server may have closed the kept-alive connection, retry once with a new one.
+                    self._conn.close()
+                    self._conn = None
+                    if attempt == 1:
+                        raise
+                    continue
+                self.requests += 1
+                if response.status != 200:
+                    raise ClassifyError("uClassify returned HTTP status {}".format(response.status))
+                return content
+
+    def _request(self, text_for_hash, calls):
+        body, call_ids = self._build_request(text_for_hash, calls)
+        logger.info("Requesting {} uClassify classifications.".format(len(calls)))
+        root = ET.fromstring(self._post(body))
+        results = {}
+        for e in root.iter():
+            tag = _localname(e.tag)
+            if tag == 'status' and e.attrib.get('success') == 'false':
+                raise ClassifyError("uClassify request failed: {} ({})".format(e.text, e.attrib.get('statusCode')))
+            if tag == 'classify' and e.attrib.get('id') in call_ids:
+                for cl in e:
+                    if _localname(cl.tag) != 'classification':
+                        continue
+                    classes = [(c.attrib['className'], c.attrib['p']) for c in cl if _localname(c.tag) == 'class']
+                    results[call_ids[e.attrib['id']]] = (cl.attrib.get('textCoverage'), classes)
+        if len(results) != len(calls):
+            raise ClassifyError("uClassify response is missing classifications.")
+        return results
+
+
+def get_client():
+    '''Get shared :py:class:`Client` using the API key and cache from Django settings.'''
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Client(settings.UCLASSIFY_API_READ, cache = DiskCache(settings.UCLASSIFY_CACHE_PATH, ttl = settings.UCLASSIFY_CACHE_TTL))
+    return _client
+
+
+def classify_many(texts, classifiers):
+    '''Classify texts with multiple classifiers using as few requests as possible.
+
+    :param texts: Texts to classify
+    :type texts: list
+    :param classifiers: Names of the classifiers, e.g. ``['mood', 'values']``, see :py:data:`CLASSIFIERS`.
+    :type classifiers: list
+    :returns: dict -- classifier -> list of classifications in the same order as the texts.
+    '''
+    return get_client().classify_many(texts, classifiers)
+
+
 def sentiment(texts):
     '''uClassify Sentiment-classifier.'''
-    cl = uc()
-    cl.setReadApiKey(settings.UCLASSIFY_API_READ)
-    ret = cl.classify(_parse(texts), classifierName = 'Sentiment', username = 'uClassify')
-    return ret
-    
-    
+    return get_client().classify(texts, 'sentiment')
+
+
 def mood(texts):
     '''uClassify Mood-classifier.
-    
+
     :returns: tuple -- certainty, happiness percent
     '''
-    cl = uc()
-    cl.setReadApiKey(settings.UCLASSIFY_API_READ)
-    ret = cl.classify(_parse(texts), classifierName = 'Mood', username = 'prfekt')
-    return ret
+    return get_client().classify(texts, 'mood')
 
 
 def values(texts):
     '''uClassify Values-classifier.'''
-    cl = uc()
-    cl.setReadApiKey(settings.UCLASSIFY_API_READ)
-    ret = cl.classify(_parse(texts), classifierName = 'Values', username = 'prfekt')
-    return ret
+    return get_client().classify(texts, 'values')
 
 
 def mb_judging(texts):
     '''uClassify Myers Briggs Judging Function-classifier.
-    
+
     Determines the Thinking/Feeling dimension of the personality type according to Myers-Briggs personality model.
     '''
-    cl = uc()
-    cl.setReadApiKey(settings.UCLASSIFY_API_READ)
-    ret = cl.classify(_parse(texts), classifierName = 'Myers Briggs Judging Function', username = 'prfekt')
-    return ret
+    return get_client().classify(texts, 'mb_judging')
 
 
 def mb_attitude(texts):
     '''uClassify Myers Briggs Attitude-classifier.
-    
+
     Analyzes the Extraversion/Introversion dimension of the personality type according to Myers-Briggs personality model.
     '''
-    cl = uc()
-    cl.setReadApiKey(settings.UCLASSIFY_API_READ)
-    ret = cl.classify(_parse(texts), classifierName = 'Myers Briggs Attitude', username = 'prfekt')
-    return ret
+    return get_client().classify(texts, 'mb_attitude')
 
 
 def mb_perceiving(texts):
     '''uClassify Myers Briggs Perceiving Function-classifier.
-    
+
     Determines the Sensing/iNtuition dimension of the personality type according to Myers-Briggs personality model.
     '''
-    cl = uc()
-    cl.setReadApiKey(settings.UCLASSIFY_API_READ)
-    ret = cl.classify(_parse(texts), classifierName = 'Myers Briggs Perceiving Function', username = 'prfekt')
-    return ret
+    return get_client().classify(texts, 'mb_perceiving')
 
 
 def mb_lifestyle(texts):
     '''uClassify Myers Briggs Lifestyle-classifier.
-    
+
     Determines the Judging/Perceiving dimension of the personality type according to Myers-Briggs personality model.
     '''
-    cl = uc()
-    cl.setReadApiKey(settings.UCLASSIFY_API_READ)
-    ret = cl.classify(_parse(texts), classifierName = 'Myers Briggs Lifestyle', username = 'prfekt')
-    return ret
-
-    
+    return get_client().classify(texts, 'mb_lifestyle')
@@ -0,0 +1,161 @@
+'''
+.. py:module:: wisdom_pool
+    :platform: Unix
+
+Precomputed WordNet data for placing color names into new age wisdoms.
+
+:py:class:`~tweets.contexts.NewAgeContext` places the color name into one of the
+``<>``-slots of a wisdom generated by :py:mod:`sentence`, choosing the slot
+whose following word is the most similar to the color name's words in WordNet.
+The words which can follow a slot are known beforehand from the templates and
+vocabularies of :py:mod:`vocab`, so :py:class:`WisdomPool` resolves their
+synsets once, and caches the best path similarities between slot words and 
+color name's words when they are first needed. Synsets and their path 
+similarities are looked up through the shared ``wordnet_cache``-resource, see
+:py:mod:`wordnet`. Evaluating the slots is then mostly dictionary lookups 
+instead of walking the WordNet graph for each wisdom. The templates themselves 
+are compiled by :py:mod:`sentence`, the pool only keeps their digest.
+
+The pool is built and saved into ``WISDOM_POOL_PATH`` with::
+
+    $> python manage.py build_wisdom_pool [--path=/path/to/pool.pkl]
+
+If the pool has not been built, or :py:mod:`vocab` has changed after building
+it, the pool is built in memory when first used.
+'''
+import os
+import logging
+import hashlib
+import cPickle as pickle
+
+from tweets import registry
+from tweets.utils.cache import LRUCache
+from tweets.sentence import tokenize_template
+from tweets.vocab import templates, vocabs
+
+logger = logging.getLogger('tweets.default')
+
+VERSION = 2
+PUNCTUATION = '.,;?!'
+
+
+def vocab_digest(templates = templates, vocabs = vocabs):
+    '''Digest of the templates and vocabularies, used to detect outdated pools.'''
+    h = hashlib.md5()
+    h.update(repr(list(templates)))
+    for pos in sorted(vocabs.keys()):
+        h.update(repr((pos, list(vocabs[pos]))))
+    return h.hexdigest()
+
+
+def slot_words(templates = templates, vocabs = vocabs):
+    '''Words which can follow a ``<>``-slot in the generated wisdoms.
+
+    Words are as NewAgeContext sees them in the wisdom, i.e. the first word of
+    the vocabulary item, and for one word items also with the punctuation
+    attached to them.
+
+    :returns: set
+    '''
+    words = set()
+    for template in templates:
+        tokens = tokenize_template(template)
+        for i in xrange(len(tokens) - 1):
+            if tokens[i] != '<>':
+                continue
+            after = tokens[i + 2] if i + 2 < len(tokens) else '.'
+            for item in vocabs.get(tokens[i + 1], [tokens[i + 1]]):
+                split = item.split(" ")
+                words.add(split[0])
+                if len(split) == 1 and len(after) > 0 and after in PUNCTUATION:
+                    words.add(split[0] + after)
+    words.discard('')
+    return words
+
+
+class WisdomPool():
+    '''Slot words' synsets for new age wisdoms.
+
+    **Args:**
+        | synsets (dict): Slot word -> tuple of its synsets' names.
+        | digest (str): :py:func:`vocab_digest` of the templates and vocabularies.
+        | cache_size (int): Amount of cached slot word and color word similarities.
+        | wordnet: :py:class:`~tweets.wordnet.WordNet`, defaults to the registered ``wordnet_cache``-resource.
+    '''
+    def __init__(self, synsets, digest, cache_size = 65536, wordnet = None):
+        self.synsets = synsets
+        self.digest = digest
+        self.similarities = LRUCache(cache_size)
+        self._wordnet = wordnet
+
+    @classmethod
+    def build(cls, wordnet = None):
+        '''Build pool from :py:mod:`vocab`, resolving synsets of all slot words.'''
+        if wordnet is None:
+            wordnet = registry.get('wordnet_cache')
+        synsets = {}
+        for word in slot_words():
+            synsets[word] = tuple(s.name() for s in wordnet.synsets(word))
+        return cls(synsets, vocab_digest(), wordnet = wordnet)
+
+    @classmethod
+    def load(cls, path, wordnet = None):
+        '''Load pool saved with :py:meth:`save`.
+
+        **Returns:**
+            :py:class:`WisdomPool`, or None if the file is missing or outdated.
+        '''
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        if data.get('version') != VERSION or data.get('digest') != vocab_digest():
+            logger.warning("Wisdom pool {} is outdated, run 'manage.py build_wisdom_pool'.".format(path))
+            return None
+        return cls(data['synsets'], data['digest'], wordnet = wordnet)
+
+    def save(self, path):
+        '''Save pool into the path, replacing the old file only when done.'''
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        data = {'version': VERSION, 'digest': self.digest, 'synsets': self.synsets}
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(path + '.tmp', path)
+
+    @property
+    def wordnet(self):
+        if self._wordnet is None:
+            self._wordnet = registry.get('wordnet_cache')
+        return self._wordnet
+
+    def word_synsets(self, word):
+        '''Synsets of the word, resolved with WordNet if the word is not in the pool.'''
+        if word not in self.synsets:
+            self.synsets[word] = tuple(s.name() for s in self.wordnet.synsets(word))
+        return [self.wordnet.synset(name) for name in self.synsets[word]]
+
+    def similarity(self, slot_word, color_word):
+        '''Best path similarity between slot word's synsets and color word's first synset.
+
+        **Returns:**
+            float, 0.0 if either of the words has no synsets.
+        '''
+        key = (slot_word, color_word)
+        sim = self.similarities.get(key)
+        if sim is None:
+            sim = self.wordnet.max_similarity(self.word_synsets(slot_word), self.word_synsets(color_word)[:1])
+            self.similarities.put(key, sim)
+        return sim
+
+
+def load_pool():
+    '''Load pool from ``WISDOM_POOL_PATH`` in Django settings, or build it if needed.'''
+    from django.conf import settings
+    path = getattr(settings, 'WISDOM_POOL_PATH', '')
+    pool = WisdomPool.load(path) if path else None
+    if pool is None:
+        logger.info("Building wisdom pool in memory.")
+        pool = WisdomPool.build()
+    return pool
@@ -0,0 +1,234 @@
+'''
+.. py:module:: word2vec
+    :platform: Unix
+
+Light weight, read-only Word2Vec model.
+
+Loading the whole gensim Word2Vec model into each process takes gigabytes of
+memory, although the app only needs the model's normalized word vectors for
+calculating similarities. :py:class:`VectorModel` keeps the words and
+normalized vectors in two memory-mapped ``.npy``-files, which the operating
+system shares between all processes (cron jobs and web workers) using them. The
+files are created from a gensim model with::
+
+    $> python manage.py export_word2vec [--model=/path/to/gensim.model] [--path=/path/to/vectors]
+
+:py:class:`VectorModel` implements ``similarity`` and ``n_similarity`` with the
+same interface as gensim's Word2Vec, i.e. both raise ``KeyError`` for words
+which are not in the model's vocabulary.
+
+.. note::
+    Words are stored as sorted UTF-8 encoded byte strings and looked up with
+    binary search, so that the vocabulary does not have to be loaded into
+    memory either.
+
+:py:class:`SimilarityIndex` precomputes vectors for fixed word sets, e.g. 
+interjections' emotions, so that a word can be compared to all of them with 
+one matrix-vector product. It works with any model having ``__getitem__`` and 
+``__contains__``, i.e. also with gensim's Word2Vec.
+'''
+import os
+import weakref
+import numpy as np
+
+from tweets.utils.cache import LRUCache
+
+# Similarity indices built for each model, see similarity_index().
+_indices = weakref.WeakKeyDictionary()
+
+WORDS_SUFFIX = '.words.npy'
+VECTORS_SUFFIX = '.vectors.npy'
+
+
+def _encode(word):
+    if isinstance(word, unicode):
+        return word.encode('utf8')
+    return word
+
+
+def _unitvec(vec):
+    length = np.sqrt(np.dot(vec, vec))
+    if length > 0:
+        return vec / length
+    return vec
+
+
+class VectorModel():
+    '''Read-only word vector model.
+
+    **Args:**
+        | words: Sorted array of UTF-8 encoded words.
+        | vectors: N x D array of normalized word vectors in the same order as ``words``.
+    '''
+    def __init__(self, words, vectors):
+        self.words = words
+        self.vectors = vectors
+
+    @classmethod
+    def load(cls, path):
+        '''Load model saved with :py:func:`save` as read-only memory maps.
+
+        **Args:**
+            | path (str): Path of the saved model without suffixes.
+
+        **Returns:**
+            :py:class:`VectorModel`
+        '''
+        words = np.load(path + WORDS_SUFFIX, mmap_mode = 'r')
+        vectors = np.load(path + VECTORS_SUFFIX, mmap_mode = 'r')
+        return cls(words, vectors)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        try:
+            self._index(word)
+        except KeyError:
+            return False
+        return True
+
+    def __getitem__(self, word):
+        '''Normalized vector of the word.'''
+        return self.vectors[self._index(word)]
+
+    def _index(self, word):
+        w = _encode(word)
+        if len(w) == 0 or len(w) > self.words.dtype.itemsize:
+            raise KeyError(word)
+        i = int(np.searchsorted(self.words, w))
+        if i < len(self.words) and self.words[i] == w:
+            return i
+        raise KeyError(word)
+
+    def similarity(self, w1, w2):
+        '''Cosine similarity of two words.
+
+        **Raises:**
+            KeyError if either of the words is not in the vocabulary.
+        '''
+        return float(np.dot(self[w1], self[w2]))
+
+    def n_similarity(self, ws1, ws2):
+        '''Cosine similarity of the mean vectors of two word sets.
+
+        Returns 0.0 if either of the word sets is empty.
+
+        **Raises:**
+            KeyError if any of the words is not in the vocabulary.
+        '''
+        if len(ws1) == 0 or len(ws2) == 0:
+            return 0.0
+        v1 = _unitvec(np.mean([self[w] for w in ws1], axis = 0))
+        v2 = _unitvec(np.mean([self[w] for w in ws2], axis = 0))
+        return float(np.dot(v1, v2))
+
+
+class SimilarityIndex():
+    '''Precomputed unit vectors of fixed word sets.
+
+    Each word set is represented by the unit vector of its words' mean vector,
+    which makes :py:meth:`similarities` equal to calling model's 
+    ``n_similarity([word], word_set)`` for each word set. Words not in the 
+    model's vocabulary are left out of the sets. Similarities of the recently
+    compared words are kept in a LRU cache.
+
+    **Args:**
+        | model: Word2Vec, :py:class:`VectorModel` or similar.
+        | word_sets (list): Iterables of words.
+        | cache_size (int): Amount of words whose similarities are cached.
+    '''
+    def __init__(self, model, word_sets, cache_size = 1024):
+        self.model = model
+        self.word_sets = [tuple(ws) for ws in word_sets]
+        rows = []
+        known = []
+        for ws in self.word_sets:
+            vecs = [np.asarray(model[w], dtype = np.float32) for w in ws if w in model]
+            known.append(len(vecs) > 0)
+            rows.append(_unitvec(np.mean(vecs, axis = 0)) if len(vecs) > 0 else None)
+        dim = len(next(r for r in rows if r is not None)) if any(known) else 0
+        self.matrix = np.array([r if r is not None else np.zeros(dim, dtype = np.float32) for r in rows], dtype = np.float32)
+        self.known = np.array(known, dtype = bool)
+        self.cache = LRUCache(cache_size)
+
+    def similarities(self, word):
+        '''Similarities of the word to all word sets.
+
+        **Returns:**
+            Array of similarities in the order of the word sets, ``nan`` for word
+            sets having none of their words in the model's vocabulary.
+
+        **Raises:**
+            KeyError if the word is not in the model's vocabulary.
+        '''
+        sims = self.cache.get(word)
+        if sims is None:
+            vec = _unitvec(np.asarray(self.model[word], dtype = np.float32))
+            sims = np.dot(self.matrix, vec) if self.known.any() else np.zeros(len(self.matrix))
+            sims[~self.known] = np.nan
+            self.cache.put(word, sims)
+        return sims
+
+
+def similarity_index(model, name, word_sets, cache_size = 1024):
+    '''Get :py:class:`SimilarityIndex` with given name for the model.
+
+    The index is built on the first call for each model and name, later calls
+    return the same index (and ignore ``word_sets``).
+
+    **Args:**
+        | model: Word2Vec, :py:class:`VectorModel` or similar.
+        | name (str): Name of the index, e.g. module using it.
+        | word_sets (list): Iterables of words, see :py:class:`SimilarityIndex`.
+        | cache_size (int): Amount of words whose similarities are cached.
+    '''
+    indices = _indices.setdefault(model, {})
+    if name not in indices:
+        indices[name] = SimilarityIndex(model, word_sets, cache_size = cache_size)
+    return indices[name]
+
+
+def save(path, words, vectors, chunk_size = 2**16):
+    '''Save words and their normalized vectors for :py:meth:`VectorModel.load`.
+
+    Files are first written into temporary files, which are then renamed, so
+    that processes using the old files are not disturbed.
+
+    **Args:**
+        | path (str): Path of the saved model without suffixes.
+        | words (list): Words of the model.
+        | vectors: N x D array-like of word vectors in the same order as ``words``.
+        | chunk_size (int): Amount of vectors normalized at once.
+    '''
+    encoded = [_encode(w) for w in words]
+    order = sorted(xrange(len(encoded)), key = encoded.__getitem__)
+    sorted_words = np.array([encoded[i] for i in order])
+    words_tmp = path + WORDS_SUFFIX + '.tmp'
+    vectors_tmp = path + VECTORS_SUFFIX + '.tmp'
+    with open(words_tmp, 'wb') as f:
+        np.save(f, sorted_words)
+
+    vectors = np.asarray(vectors)
+    dim = vectors.shape[1]
+    out = np.lib.format.open_memmap(vectors_tmp, mode = 'w+', dtype = np.float32, shape = (len(order), dim))
+    order = np.array(order)
+    for start in xrange(0, len(order), chunk_size):
+        v = np.asarray(vectors[order[start:start + chunk_size]], dtype = np.float32)
+        lengths = np.sqrt((v ** 2).sum(axis = 1))
+        lengths[lengths == 0] = 1.0
+        out[start:start + len(v)] = v / lengths[:, np.newaxis]
+    out.flush()
+    del out
+    os.rename(words_tmp, path + WORDS_SUFFIX)
+    os.rename(vectors_tmp, path + VECTORS_SUFFIX)
+
+
+def export_gensim(model, path):
+    '''Save gensim Word2Vec model's normalized vectors with :py:func:`save`.'''
+    save(path, model.index2word, model.syn0)
+
+
+def exists(path):
+    '''Have model files been saved to the path.'''
+    return os.path.isfile(path + WORDS_SUFFIX) and os.path.isfile(path + VECTORS_SUFFIX)
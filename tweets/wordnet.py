@@ -0,0 +1,155 @@
+'''
+.. py:module:: wordnet
+    :platform: Unix
+
+Memoized access to WordNet.
+
+Color semantics and contexts look up synsets of the same color names and
+wisdoms' words, check whether words are colors, and compute path similarities
+between the same synsets over and over again. :py:class:`WordNet` wraps NLTK's
+WordNet corpus reader and keeps the results of these lookups in bounded
+:py:class:`~tweets.utils.cache.LRUCache`\ s. The shared instance is registered
+as ``wordnet_cache``-resource in :py:mod:`registry`::
+
+    >>>from tweets import registry
+    >>>wn = registry.get('wordnet_cache')
+    >>>wn.is_color('cerulean')
+    True
+    >>>wn.stats()['synsets']['hit_rate']
+
+If ``WORDNET_PRECOMPUTE_COLORS`` is True in Django settings, all hyponyms of
+the 'color' synset are collected when the resource is loaded (e.g. before
+:py:meth:`TweetCore.tweet_many` forks its workers), so that :py:meth:`WordNet.is_color`
+does not need to walk the hypernym closures at all. Cache sizes are set with
+``WORDNET_CACHE_SIZE``.
+'''
+import logging
+
+from tweets import registry
+from tweets.utils.cache import LRUCache
+
+logger = logging.getLogger('tweets.default')
+
+_missing = object()
+
+
+class WordNet():
+    '''WordNet corpus reader with cached synsets, color checks and path similarities.
+
+    **Args:**
+        | wordnet: NLTK's WordNet corpus reader, defaults to the registered ``wordnet``-resource.
+        | cache_size (int): Maximum amount of cached synset lookups and color checks. Four times as many path similarities are cached.
+    '''
+    ADJ = 'a'
+    NOUN = 'n'
+
+    def __init__(self, wordnet = None, cache_size = 8192):
+        self._wordnet = wordnet
+        self.synset_cache = LRUCache(cache_size)
+        self.color_cache = LRUCache(cache_size)
+        self.similarity_cache = LRUCache(cache_size * 4)
+        self.color_synsets = None
+        self._color = None
+
+    @property
+    def wordnet(self):
+        if self._wordnet is None:
+            self._wordnet = registry.get('wordnet')
+        return self._wordnet
+
+    @property
+    def color(self):
+        '''The 'color' synset, i.e. the first synset of word 'color'.'''
+        if self._color is None:
+            self._color = self.synsets('color')[0]
+        return self._color
+
+    def synsets(self, word, pos = None):
+        '''Synsets of the word, see NLTK's ``wordnet.synsets``.
+
+        **Returns:**
+            list, a new list on each call.
+        '''
+        key = (word, pos)
+        ss = self.synset_cache.get(key)
+        if ss is None:
+            ss = tuple(self.wordnet.synsets(word, pos = pos) if pos is not None else self.wordnet.synsets(word))
+            self.synset_cache.put(key, ss)
+        return list(ss)
+
+    def synset(self, name):
+        '''Synset with given name, e.g. 'blue.n.01'.'''
+        key = ('.synset', name)
+        s = self.synset_cache.get(key)
+        if s is None:
+            s = self.wordnet.synset(name)
+            self.synset_cache.put(key, s)
+        return s
+
+    def path_similarity(self, s1, s2):
+        '''Path similarity of two synsets, None if there is no path between them.'''
+        key = (s1.name(), s2.name())
+        sim = self.similarity_cache.get(key, _missing)
+        if sim is _missing:
+            sim = s1.path_similarity(s2)
+            self.similarity_cache.put(key, sim)
+        return sim
+
+    def max_similarity(self, synsets1, synsets2):
+        '''Greatest path similarity between any two synsets of the lists.
+
+        **Returns:**
+            float, 0.0 if either of the lists is empty or the synsets are not connected.
+        '''
+        best = 0.0
+        for s1 in synsets1:
+            for s2 in synsets2:
+                sim = self.path_similarity(s1, s2)
+                if sim > best:
+                    best = sim
+        return best
+
+    def is_color(self, word):
+        '''Does the word's first synset have the 'color' synset in its hypernym closure.'''
+        if self.color_synsets is not None:
+            ss = self.synsets(word)
+            return len(ss) > 0 and ss[0].name() in self.color_synsets
+        ret = self.color_cache.get(word)
+        if ret is None:
+            ss = self.synsets(word)
+            ret = len(ss) > 0 and self.color in ss[0].closure(lambda s: s.hypernyms())
+            self.color_cache.put(word, ret)
+        return ret
+
+    def precompute_colors(self):
+        '''Collect names of all hyponyms of the 'color' synset for :py:meth:`is_color`.
+
+        **Returns:**
+            int, amount of color synsets.
+        '''
+        self.color_synsets = frozenset(s.name() for s in self.color.closure(lambda s: s.hyponyms()))
+        return len(self.color_synsets)
+
+    def stats(self):
+        '''Statistics of the caches.
+
+        **Returns:**
+            dict, cache name -> dict with keys *hits*, *misses*, *hit_rate*, *size* and *maxsize*.
+        '''
+        ret = {}
+        for name, cache in (('synsets', self.synset_cache), ('colors', self.color_cache),
+                            ('similarities', self.similarity_cache)):
+            s = cache.stats()
+            lookups = s['hits'] + s['misses']
+            s['hit_rate'] = float(s['hits']) / lookups if lookups > 0 else 0.0
+            ret[name] = s
+        return ret
+
+
+def load():
+    '''Create :py:class:`WordNet` configured in Django settings.'''
+    from django.conf import settings
+    wn = WordNet(cache_size = getattr(settings, 'WORDNET_CACHE_SIZE', 8192))
+    if getattr(settings, 'WORDNET_PRECOMPUTE_COLORS', False):
+        logger.info("Precomputed {} color synsets.".format(wn.precompute_colors()))
+    return wn